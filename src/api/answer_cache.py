@@ -0,0 +1,156 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from ..utils.config import SEMANTIC_CACHE_SETTINGS, EMBEDDING_BATCH_SETTINGS
+from ..utils.logger import default_logger
+from ..utils.metrics import MetricsRegistry, default_metrics
+from ..utils.text import normalize_text
+
+LOOKUP_METRIC = "voice_answer_cache_lookups_total"
+ENTRIES_METRIC = "voice_answer_cache_entries"
+
+
+class SemanticAnswerCache:
+    """LLM answers keyed by question meaning, checked before /process_text.
+
+    A normalized-text dict serves exact repeats without embedding. Otherwise the question is
+    embedded and compared against all cached questions in one matrix product (the cache is
+    small, so exact search over it is cheaper than maintaining an approximate index);
+    a cosine similarity of at least `threshold` returns the stored answer. Entries expire
+    after ttl_seconds and the least recently used one is evicted when max_entries is reached.
+    Answers are replayed through the TTS cache, so their audio is reused as well.
+
+    A missed lookup keeps its question vector for a while, so storing the answer to that
+    question afterwards does not embed it a second time.
+    """
+    def __init__(self, encode: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 registry: MetricsRegistry = default_metrics):
+        self.logger = default_logger.getChild("SemanticAnswerCache")
+        self._encode = encode
+        self.registry = registry
+        self.threshold = SEMANTIC_CACHE_SETTINGS['threshold']
+        self.ttl = SEMANTIC_CACHE_SETTINGS['ttl_seconds']
+        self.max_entries = SEMANTIC_CACHE_SETTINGS['max_entries']
+        self._vectors = None
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._entries = OrderedDict()
+        self._slot_keys: List[Optional[str]] = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._missed: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def encode(self, text: str) -> np.ndarray:
+        if self._encode is None:
+            from ..rag.embeddings import load_embedding_backend
+            self._encode = load_embedding_backend().encode
+            if EMBEDDING_BATCH_SETTINGS['enabled']:
+                from ..rag.batcher import EmbeddingBatcher
+                self._encode = EmbeddingBatcher(self._encode, name="answer_cache").encode
+        return np.asarray(self._encode([text]), dtype=np.float32)[0]
+
+    def _drop(self, key: str):
+        slot, _, _ = self._entries.pop(key)
+        self._valid[slot] = False
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+
+    def _expired(self, created: float) -> bool:
+        return time.monotonic() - created > self.ttl
+
+    def _count(self, result: str):
+        self.registry.inc(LOOKUP_METRIC, result=result)
+
+    def _publish_size(self):
+        self.registry.set(ENTRIES_METRIC, len(self._entries))
+
+    def _remember_miss(self, key: str, vector: np.ndarray):
+        self._missed[key] = vector
+        self._missed.move_to_end(key)
+        while len(self._missed) > SEMANTIC_CACHE_SETTINGS['missed_vectors']:
+            self._missed.popitem(last=False)
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Return the cached answer for text or a close paraphrase of it"""
+        key = normalize_text(text)
+        if not key:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                self._drop(key)
+                self._publish_size()
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                self._count("exact")
+                return entry[1]
+            if not self._entries:
+                self.misses += 1
+                self._count("miss")
+                return None
+
+        vector = self.encode(key)
+        with self._lock:
+            if self._vectors is None or not self._valid.any():
+                self.misses += 1
+                self._count("miss")
+                self._remember_miss(key, vector)
+                return None
+            scores = self._vectors @ vector
+            scores[~self._valid] = -1.0
+            slot = int(np.argmax(scores))
+            if scores[slot] >= self.threshold:
+                cached_key = self._slot_keys[slot]
+                _, answer, created = self._entries[cached_key]
+                if self._expired(created):
+                    self._drop(cached_key)
+                    self._publish_size()
+                else:
+                    self._entries.move_to_end(cached_key)
+                    self.semantic_hits += 1
+                    self._count("semantic")
+                    self.logger.info(f"Semantic hit ({scores[slot]:.3f}): '{key}' ~ '{cached_key}'")
+                    return answer
+            self.misses += 1
+            self._count("miss")
+            self._remember_miss(key, vector)
+            return None
+
+    def store(self, text: str, answer: str):
+        key = normalize_text(text)
+        if not key or not answer:
+            return
+        with self._lock:
+            vector = self._missed.pop(key, None)
+        if vector is None:
+            vector = self.encode(key)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if key in self._entries:
+                self._drop(key)
+            if not self._free_slots:
+                self._drop(next(iter(self._entries)))
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._slot_keys[slot] = key
+            self._entries[key] = (slot, answer, time.monotonic())
+            self._publish_size()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
@@ -1,21 +1,124 @@
 import re
-from typing import Optional, List, Dict
+import json
+import threading
+from typing import Optional, List, Dict, Generator, Iterable
 from ..utils.logger import default_logger, timing_decorator
-from transformers import pipeline
-from ..utils.config import ISSAI_MODEL_SETTINGS, FASTAPI_SETTINGS
+from ..utils.config import FASTAPI_SETTINGS
 import httpx
+
+NO_CONTEXT = "NO_CONTEXT"
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
 class GPTHandler:
     def __init__(self):
         self.url = FASTAPI_SETTINGS['host']
-        
+        self.logger = default_logger.getChild("GPTHandler")
+        self.http2 = FASTAPI_SETTINGS['http2'] and _http2_available()
+        if FASTAPI_SETTINGS['http2'] and not self.http2:
+            self.logger.warning("h2 is not installed, falling back to HTTP/1.1")
+        self.limits = httpx.Limits(
+            max_connections=FASTAPI_SETTINGS['max_connections'],
+            max_keepalive_connections=FASTAPI_SETTINGS['max_keepalive_connections'],
+            keepalive_expiry=FASTAPI_SETTINGS['keepalive_expiry'],
+        )
+        self.timeout = httpx.Timeout(
+            connect=FASTAPI_SETTINGS['connect_timeout'],
+            read=FASTAPI_SETTINGS['read_timeout'],
+            write=FASTAPI_SETTINGS['write_timeout'],
+            pool=FASTAPI_SETTINGS['pool_timeout'],
+        )
+        self.client = httpx.Client(http2=self.http2, limits=self.limits, timeout=self.timeout)
+
+    def warm_up(self):
+        """Open a pooled connection (TCP + TLS) before the first call arrives"""
+        try:
+            self.client.head(self.url)
+        except httpx.HTTPError as e:
+            self.logger.warning(f"LLM endpoint warm-up failed: {e}")
+
     @timing_decorator(default_logger)
     def generate_response_from_text(self, text: str) -> Optional[str]:
-        response = httpx.post(self.url, json={"text": text}, timeout=60)
-        print(response.json())
-        return response.json()["response"]
-        
+        response = self.client.post(self.url, json={"text": text})
+        response.raise_for_status()
+        payload = response.json()
+        self.logger.debug(payload)
+        return payload["response"]
+
+    def close(self):
+        self.client.close()
+
+    def _iter_stream_tokens(self, response: httpx.Response) -> Generator:
+        """Yield text fragments from an SSE, chunked-text or plain JSON response"""
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            yield json.loads(response.read())["response"]
+            return
+        if not content_type.startswith("text/event-stream"):
+            yield from response.iter_text()
+            return
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                payload = json.loads(data)
+            except ValueError:
+                yield data
+                continue
+            if isinstance(payload, dict):
+                yield payload.get("token") or payload.get("delta") or payload.get("response") or ""
+            else:
+                yield str(payload)
+
+    def iter_sentences(self, tokens: Iterable[str], cancel_event: Optional[threading.Event] = None) -> Generator:
+        """Cut a token stream into sentences at the boundaries used by split_text_into_chunks.
+
+        Yields NO_CONTEXT alone as soon as the stream is known to be the sentinel.
+        """
+        buffer = ""
+        sentinel_checked = False
+        for token in tokens:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if not token:
+                continue
+            buffer += token
+            if not sentinel_checked:
+                stripped = buffer.lstrip()
+                if NO_CONTEXT.startswith(stripped):
+                    continue
+                if stripped.startswith(NO_CONTEXT):
+                    yield NO_CONTEXT
+                    return
+                sentinel_checked = True
+            parts = SENTENCE_BOUNDARY.split(buffer)
+            for sentence in parts[:-1]:
+                if sentence.strip():
+                    yield sentence.strip()
+            buffer = parts[-1]
+        if buffer.strip():
+            yield NO_CONTEXT if buffer.strip() == NO_CONTEXT else buffer.strip()
+
+    def generate_response_stream(self, text: str, cancel_event: Optional[threading.Event] = None) -> Generator:
+        """Stream the /process_text answer and yield it sentence by sentence as tokens arrive.
+
+        Setting cancel_event closes the response, aborting the LLM request.
+        """
+        with self.client.stream("POST", self.url, json={"text": text, "stream": True}) as response:
+            response.raise_for_status()
+            yield from self.iter_sentences(self._iter_stream_tokens(response), cancel_event)
+
     def split_text_into_chunks(self, text, max_chars=250):
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        sentences = SENTENCE_BOUNDARY.split(text)
         chunks = []
         current = ""
 
@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import mmap
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+from ..utils.config import ANSWER_PACK_SETTINGS, BASE_DIR, RAG_INDEX_SETTINGS
+from ..utils.logger import default_logger
+
+MAGIC = b"ANSPACK2"
+HEADER = struct.Struct("<8sQQ")
+SEGMENT = struct.Struct("<I")
+
+
+def answer_digest(answer: str) -> str:
+    """Short hash of an answer text, stored per entry so edited answers are not replayed"""
+    return hashlib.blake2b(answer.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def write_answer_pack(path: Union[str, Path], answers: Dict[str, Tuple[str, List[bytes]]],
+                      audio_format: str, generation: str = "") -> int:
+    """Write audio segments per document id.
+
+    Layout: header, JSON index (audio format, generation, [id, answer digest] per entry)
+    padded to 8 bytes, uint64 offsets, then the length-prefixed segments of each entry.
+    """
+    keys = sorted(answers)
+    index = json.dumps({
+        "audio_format": audio_format,
+        "generation": generation,
+        "entries": [[key, answers[key][0]] for key in keys],
+    }, ensure_ascii=False).encode("utf-8")
+    index += b" " * (-len(index) % 8)
+    blobs = [b"".join(SEGMENT.pack(len(s)) + s for s in answers[key][1]) for key in keys]
+    offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(blobs), len(index)))
+        f.write(index)
+        f.write(offsets.tobytes())
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+    return len(blobs)
+
+
+class AnswerPack:
+    """Memory-mapped pre-synthesized answer audio, looked up by QADocument id.
+
+    An entry is only served while the live answer text still has the digest it was
+    synthesized from, and the whole pack is refused when its audio format differs from
+    what the synthesizer produces.
+    """
+    def __init__(self, path: Union[str, Path], audio_format: Optional[str] = None):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, index_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not an answer pack of this version; rebuild it")
+        index = json.loads(self._mmap[HEADER.size:HEADER.size + index_size].decode("utf-8"))
+        self.audio_format = index["audio_format"]
+        self.generation = index["generation"]
+        if audio_format is not None and audio_format != self.audio_format:
+            self.close()
+            raise ValueError(f"{self.path} holds {self.audio_format} audio, the synthesizer produces {audio_format}")
+        self._entries = {key: (pos, digest) for pos, (key, digest) in enumerate(index["entries"])}
+        offsets_at = HEADER.size + index_size
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=offsets_at)
+        self._data_start = offsets_at + self._offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._entries
+
+    def digests(self) -> Dict[str, str]:
+        return {key: digest for key, (_, digest) in self._entries.items()}
+
+    def segments(self, doc_id: str, answer: Optional[str] = None) -> Optional[List[memoryview]]:
+        """Audio segments of the answer in playback order, as views into the mapped file.
+
+        With answer given, None is returned unless the entry was synthesized from that text.
+        """
+        entry = self._entries.get(doc_id)
+        if entry is None:
+            return None
+        pos, digest = entry
+        if answer is not None and answer_digest(answer) != digest:
+            return None
+        view = memoryview(self._mmap)
+        cursor = self._data_start + int(self._offsets[pos])
+        end = self._data_start + int(self._offsets[pos + 1])
+        segments = []
+        while cursor < end:
+            (length,) = SEGMENT.unpack_from(self._mmap, cursor)
+            cursor += SEGMENT.size
+            segments.append(view[cursor:cursor + length])
+            cursor += length
+        return segments
+
+    def close(self):
+        self._offsets = None
+        self._mmap.close()
+        self._file.close()
+
+
+def prune_answer_pack(path: Union[str, Path], answers: Dict[str, str], generation: str) -> Tuple[int, int]:
+    """Rewrite the pack without entries whose document is gone or whose answer digest changed.
+
+    answers maps the live document ids to their answer digests; returns (kept, dropped).
+    Processes that have the old pack mapped keep reading the replaced file.
+    """
+    pack = AnswerPack(path)
+    try:
+        kept = {
+            key: (digest, [bytes(segment) for segment in pack.segments(key)])
+            for key, digest in pack.digests().items() if answers.get(key) == digest
+        }
+        audio_format = pack.audio_format
+    finally:
+        pack.close()
+    write_answer_pack(path, kept, audio_format, generation)
+    return len(kept), len(pack) - len(kept)
+
+
+def build_answer_pack(output: Path, concurrency: int):
+    """Synthesize every QADocument answer with at most `concurrency` TTS calls in flight"""
+    from .synthesizer_v2 import SpeechSynthesizer
+    from ..api.gpt_handler import GPTHandler
+    from ..rag.index_manager import resolve_generation
+    from ..rag.local_loader_v1 import load_metadata
+    from ..rag.metadata_store import record_field, record_key
+
+    logger = default_logger.getChild("AnswerPack")
+    docs_dir = BASE_DIR / "data" / RAG_INDEX_SETTINGS['dir_name']
+    generation, generation_dir = resolve_generation(docs_dir)
+    metadata = load_metadata(generation_dir)
+    synthesizer = SpeechSynthesizer(connect_socket=False)
+    gpt_handler = GPTHandler()
+
+    jobs = []
+    digests = {}
+    for record in metadata:
+        doc_id = record_key(record)
+        answer = record_field(record, "answer")
+        if doc_id is not None and answer and record_field(record, "lang") in ANSWER_PACK_SETTINGS['langs']:
+            digests[doc_id] = answer_digest(answer)
+            jobs.append((doc_id, gpt_handler.split_text_into_chunks(answer)))
+
+    start = time.perf_counter()
+    answers = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            doc_id: [executor.submit(synthesizer._request_audio, chunk) for chunk in chunks]
+            for doc_id, chunks in jobs
+        }
+        for doc_id, chunk_futures in futures.items():
+            segments = [future.result() for future in chunk_futures]
+            if all(segments):
+                answers[doc_id] = (digests[doc_id], segments)
+            else:
+                logger.warning(f"Skipping answer {doc_id}: synthesis failed")
+    count = write_answer_pack(output, answers, synthesizer.output_format, generation)
+    logger.info(f"Wrote {count}/{len(jobs)} answers to {output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-synthesize the answer audio of every QADocument")
+    parser.add_argument("--output", type=Path,
+                        default=BASE_DIR / "data" / RAG_INDEX_SETTINGS['dir_name'] / ANSWER_PACK_SETTINGS['file'])
+    parser.add_argument("--concurrency", type=int, default=ANSWER_PACK_SETTINGS['concurrency'])
+    args = parser.parse_args()
+    build_answer_pack(args.output, args.concurrency)
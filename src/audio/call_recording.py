@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Optional
+from ..utils.config import AUDIO_DIR, RECORDING_SETTINGS
+from ..utils.logger import default_logger
+
+
+def recording_path(call_id: Optional[str] = None) -> Path:
+    """A fresh WAV path per call under AUDIO_DIR"""
+    recordings_dir = AUDIO_DIR / RECORDING_SETTINGS['dir_name']
+    recordings_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return recordings_dir / f"{stamp}_{call_id or int(time.time() * 1000)}.wav"
+
+
+class CallRecordingWriter:
+    """Streams call audio to a WAV file from a background thread.
+
+    write() only enqueues the chunk, so the recognition loop never waits on disk. The writer
+    thread copies chunks into a fixed-size buffer, flushes it to the file when full, and lets
+    wave patch the header with the final length on close. Memory stays bounded by the queue
+    and buffer sizes regardless of call length; chunks arriving while the queue is full are
+    dropped and counted.
+    """
+    def __init__(self, path: Path, channels: int, sample_width: int, rate: int):
+        self.logger = default_logger.getChild("CallRecordingWriter")
+        self.path = Path(path)
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rate = rate
+        self.buffer_bytes = RECORDING_SETTINGS['buffer_bytes']
+        self.queue = queue.Queue(maxsize=RECORDING_SETTINGS['queue_chunks'])
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f"recording-{self.path.stem}", daemon=True)
+        self.thread.start()
+
+    def write(self, data: bytes):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, wait: bool = False):
+        """Finish the file in the background; wait=True blocks until the header is written"""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+        if wait:
+            self.thread.join()
+
+    def _run(self):
+        wave_file = wave.open(str(self.path), 'wb')
+        wave_file.setnchannels(self.channels)
+        wave_file.setsampwidth(self.sample_width)
+        wave_file.setframerate(self.rate)
+        buffer = memoryview(bytearray(self.buffer_bytes))
+        filled = 0
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    break
+                data = memoryview(data).cast('B')
+                pos = 0
+                while pos < len(data):
+                    n = min(len(data) - pos, self.buffer_bytes - filled)
+                    buffer[filled:filled + n] = data[pos:pos + n]
+                    filled += n
+                    pos += n
+                    if filled == self.buffer_bytes:
+                        wave_file.writeframesraw(buffer)
+                        filled = 0
+            if filled:
+                wave_file.writeframesraw(buffer[:filled])
+        except Exception as e:
+            self.logger.error(f"Error writing recording {self.path}: {e}")
+        finally:
+            wave_file.close()
+            if self.dropped:
+                self.logger.warning(f"Dropped {self.dropped} chunks while recording {self.path}")
@@ -0,0 +1,143 @@
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Generator, List, Optional
+import grpc
+from ..utils.config import GRPC_SETTINGS
+from ..utils.logger import default_logger
+
+
+def channel_options() -> List[tuple]:
+    """Channel arguments shared by every Yandex SpeechKit channel"""
+    return [
+        ('grpc.keepalive_time_ms', GRPC_SETTINGS['keepalive_time_ms']),
+        ('grpc.keepalive_timeout_ms', GRPC_SETTINGS['keepalive_timeout_ms']),
+        ('grpc.keepalive_permit_without_calls', 1),
+        ('grpc.http2.max_pings_without_data', 0),
+        ('grpc.max_send_message_length', GRPC_SETTINGS['max_message_length']),
+        ('grpc.max_receive_message_length', GRPC_SETTINGS['max_message_length']),
+        # Give every channel its own subchannel so pooled channels really use separate connections
+        ('grpc.use_local_subchannel_pool', 1),
+    ]
+
+
+class ChannelPool:
+    """A fixed set of channels to one endpoint; each stream goes to the least busy channel.
+
+    max_concurrent_streams is a server-side setting, so the per-channel stream cap is
+    enforced here: when every channel is at the cap, a new lease waits for a stream to end.
+    """
+    def __init__(self, target: str, size: Optional[int] = None):
+        self.logger = default_logger.getChild("ChannelPool")
+        self.target = target
+        self.size = size or GRPC_SETTINGS['channels_per_endpoint']
+        self.max_streams_per_channel = GRPC_SETTINGS['max_streams_per_channel']
+        if GRPC_SETTINGS['secure']:
+            self.cred = grpc.ssl_channel_credentials()
+            self.channels = [
+                grpc.secure_channel(target, self.cred, options=channel_options())
+                for _ in range(self.size)
+            ]
+        else:
+            # Plaintext, for local stand-ins such as the benchmark fakes
+            self.cred = None
+            self.channels = [grpc.insecure_channel(target, options=channel_options()) for _ in range(self.size)]
+        self.in_flight = [0] * self.size
+        self._stubs = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def warm_up(self, timeout: Optional[float] = None) -> bool:
+        """Connect every channel now instead of on the first request"""
+        timeout = timeout or GRPC_SETTINGS['warmup_timeout']
+        futures = [grpc.channel_ready_future(channel) for channel in self.channels]
+        ready = True
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except grpc.FutureTimeoutError:
+                ready = False
+        if not ready:
+            self.logger.warning(f"Not all channels to {self.target} became ready within {timeout}s")
+        return ready
+
+    def _pick(self) -> int:
+        start = next(self._next)
+        order = [(start + i) % self.size for i in range(self.size)]
+        return min(order, key=lambda i: self.in_flight[i])
+
+    @contextmanager
+    def channel(self) -> Generator:
+        """Lease the least busy channel for the duration of one call"""
+        timeout = GRPC_SETTINGS['stream_wait_timeout']
+        with self._lock:
+            idx = self._pick()
+            if self.in_flight[idx] >= self.max_streams_per_channel:
+                self.logger.warning(f"All channels to {self.target} are at {self.max_streams_per_channel} streams")
+                if not self._released.wait_for(
+                    lambda: min(self.in_flight) < self.max_streams_per_channel, timeout=timeout
+                ):
+                    raise TimeoutError(f"No stream to {self.target} became free within {timeout}s")
+                idx = self._pick()
+            self.in_flight[idx] += 1
+        try:
+            yield idx, self.channels[idx]
+        finally:
+            with self._lock:
+                self.in_flight[idx] -= 1
+                self._released.notify()
+
+    def _stub(self, idx: int, stub_class):
+        key = (idx, stub_class)
+        stub = self._stubs.get(key)
+        if stub is None:
+            stub = self._stubs[key] = stub_class(self.channels[idx])
+        return stub
+
+    def stream(self, stub_class, method: str, request, **kwargs) -> Generator:
+        """Run a response-streaming RPC on a leased channel, yielding its responses"""
+        with self.channel() as (idx, _):
+            call = getattr(self._stub(idx, stub_class), method)(request, **kwargs)
+            try:
+                yield from call
+            finally:
+                # No-op once the call has completed; aborts the RPC when the consumer stops early
+                call.cancel()
+
+    def load(self) -> List[int]:
+        with self._lock:
+            return list(self.in_flight)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+
+class ChannelManager:
+    """Process-wide registry of channel pools, one per endpoint"""
+    def __init__(self):
+        self.pools: Dict[str, ChannelPool] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, target: str) -> ChannelPool:
+        with self._lock:
+            pool = self.pools.get(target)
+            if pool is None:
+                pool = self.pools[target] = ChannelPool(target)
+                if GRPC_SETTINGS['eager_connect']:
+                    pool.warm_up()
+            return pool
+
+    def warm_up(self):
+        for pool in list(self.pools.values()):
+            pool.warm_up()
+
+    def close(self):
+        with self._lock:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools.clear()
+
+
+default_channel_manager = ChannelManager()
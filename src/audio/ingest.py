@@ -0,0 +1,150 @@
+import socket
+import struct
+from dataclasses import dataclass
+from typing import Optional
+from ..utils.config import AUDIO_SETTINGS, INGEST_SETTINGS
+
+# Ingest protocol: a connection may open with a hello (magic b"AUD1", codec, sample rate,
+# channels); the server answers with the same struct carrying the parameters it accepted.
+# Without a hello the AUDIO_SETTINGS defaults apply. Audio then arrives as messages of a
+# `>I` byte length plus payload, the framing AudioStreamer uses for output; a zero-length
+# message ends the stream.
+HELLO = struct.Struct(">4sBIB")
+HELLO_MAGIC = b"AUD1"
+LENGTH = struct.Struct(">I")
+
+CODEC_LINEAR16 = 0
+SUPPORTED_CODECS = {CODEC_LINEAR16}
+SUPPORTED_RATES = {8000, 16000, 48000}
+
+
+@dataclass
+class StreamFormat:
+    codec: int = CODEC_LINEAR16
+    sample_rate: int = AUDIO_SETTINGS['RATE']
+    channels: int = AUDIO_SETTINGS['CHANNELS']
+
+    def frame_bytes(self, frame_ms: Optional[int] = None) -> int:
+        frame_ms = frame_ms or INGEST_SETTINGS['frame_ms']
+        return self.sample_rate * frame_ms // 1000 * 2 * self.channels
+
+
+def negotiate(codec: int, sample_rate: int, channels: int) -> StreamFormat:
+    """Accept the caller's format when STT can take it directly, otherwise fall back to the defaults"""
+    accepted = StreamFormat()
+    if codec in SUPPORTED_CODECS:
+        accepted.codec = codec
+    if sample_rate in SUPPORTED_RATES:
+        accepted.sample_rate = sample_rate
+    if channels == 1:
+        accepted.channels = channels
+    return accepted
+
+
+def pack_hello(stream_format: StreamFormat) -> bytes:
+    return HELLO.pack(HELLO_MAGIC, stream_format.codec, stream_format.sample_rate, stream_format.channels)
+
+
+class FramedAudioReader:
+    """Reads framed audio from a blocking socket straight into a preallocated buffer.
+
+    Payload bytes are received with recv_into into the free tail of the buffer, and
+    consumed frames only advance a read pointer. When the tail is exhausted the
+    (less than one frame of) unread bytes are moved to the front. The only copy
+    per frame is the bytes object handed to protobuf.
+    """
+    def __init__(self, sock: socket.socket, stream_format: Optional[StreamFormat] = None):
+        self.sock = sock
+        self.header = bytearray(LENGTH.size)
+        self.payload_remaining = 0
+        self.ended = False
+        self.hello = False
+        self._allocate(stream_format or StreamFormat())
+
+    def _allocate(self, stream_format: StreamFormat):
+        self.format = stream_format
+        self.frame_bytes = self.format.frame_bytes()
+        self.capacity = self.frame_bytes * INGEST_SETTINGS['buffer_frames']
+        self.buffer = bytearray(self.capacity)
+        self.view = memoryview(self.buffer)
+        self.read_pos = 0
+        self.write_pos = 0
+
+    def handshake(self) -> StreamFormat:
+        """Answer an optional hello; must be called before the first read_frame"""
+        peeked = self.sock.recv(len(HELLO_MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL)
+        if peeked == HELLO_MAGIC:
+            hello = bytearray(HELLO.size)
+            self._recv_exact(memoryview(hello))
+            _, codec, sample_rate, channels = HELLO.unpack(hello)
+            self._allocate(negotiate(codec, sample_rate, channels))
+            self.sock.sendall(pack_hello(self.format))
+            self.hello = True
+        return self.format
+
+    def _recv_exact(self, view: memoryview):
+        received = 0
+        while received < len(view):
+            n = self.sock.recv_into(view[received:])
+            if n == 0:
+                raise RuntimeError("Audio stream ended")
+            received += n
+
+    def _fill(self):
+        if self.payload_remaining == 0:
+            try:
+                self._recv_exact(memoryview(self.header))
+            except RuntimeError:
+                self.ended = True
+                return
+            (self.payload_remaining,) = LENGTH.unpack(self.header)
+            if self.payload_remaining == 0:
+                self.ended = True
+                return
+            if self.payload_remaining > INGEST_SETTINGS['max_message_bytes']:
+                raise RuntimeError(f"Audio message of {self.payload_remaining} bytes exceeds the limit")
+        if self.write_pos == self.capacity:
+            unread = self.write_pos - self.read_pos
+            self.buffer[:unread] = self.view[self.read_pos:self.write_pos]
+            self.read_pos, self.write_pos = 0, unread
+        end = self.write_pos + min(self.capacity - self.write_pos, self.payload_remaining)
+        n = self.sock.recv_into(self.view[self.write_pos:end])
+        if n == 0:
+            self.ended = True
+            return
+        self.write_pos += n
+        self.payload_remaining -= n
+
+    def read_frame(self) -> bytes:
+        """Return the next frame of exactly frame_bytes (the last one may be shorter)"""
+        while self.write_pos - self.read_pos < self.frame_bytes and not self.ended:
+            self._fill()
+        available = min(self.write_pos - self.read_pos, self.frame_bytes)
+        if available == 0:
+            raise RuntimeError("Audio stream ended")
+        frame = bytes(self.view[self.read_pos:self.read_pos + available])
+        self.read_pos += available
+        if self.read_pos == self.write_pos:
+            self.read_pos = self.write_pos = 0
+        return frame
+
+
+class FrameAssembler:
+    """Re-cuts arbitrary payloads into fixed-size frames (for asyncio streams that cannot recv_into)"""
+    def __init__(self, frame_bytes: int):
+        self.frame_bytes = frame_bytes
+        self.pending = bytearray()
+
+    def push(self, payload: bytes):
+        self.pending += payload
+        frames = []
+        offset = 0
+        while len(self.pending) - offset >= self.frame_bytes:
+            frames.append(bytes(self.pending[offset:offset + self.frame_bytes]))
+            offset += self.frame_bytes
+        del self.pending[:offset]
+        return frames
+
+    def flush(self) -> bytes:
+        rest, self.pending = bytes(self.pending), bytearray()
+        return rest
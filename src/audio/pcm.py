@@ -0,0 +1,119 @@
+from typing import Optional
+import numpy as np
+from ..utils.config import TTS_SETTINGS
+
+RAW_FORMAT = "LINEAR16_PCM"
+CODECS = ("linear16", "mulaw", "alaw")
+
+# G.711 segment end points (ITU-T reference implementation, g711.c)
+_MULAW_SEG_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+_ALAW_SEG_END = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF], dtype=np.int32)
+_MULAW_BIAS = 0x21
+_MULAW_CLIP = 8159
+
+_tables = {}
+
+
+def is_raw(audio_format: Optional[str] = None) -> bool:
+    return (audio_format or TTS_SETTINGS['audio_format']) == RAW_FORMAT
+
+
+def output_format(rate: int, codec: str = "linear16") -> str:
+    """Cache tag of the bytes a synthesizer produces; containers are tagged by their type alone"""
+    if not is_raw():
+        return TTS_SETTINGS['audio_format']
+    return f"{RAW_FORMAT}/{rate}/{codec}"
+
+
+def _linear_to_mulaw(samples: np.ndarray) -> np.ndarray:
+    pcm = samples.astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    pcm = np.minimum(np.abs(pcm), _MULAW_CLIP) + _MULAW_BIAS
+    seg = np.searchsorted(_MULAW_SEG_END, pcm, side="left")
+    segment = np.minimum(seg, 7)
+    value = (segment << 4) | ((pcm >> (segment + 1)) & 0x0F)
+    value = np.where(seg >= 8, 0x7F, value)
+    return (value ^ mask).astype(np.uint8)
+
+
+def _linear_to_alaw(samples: np.ndarray) -> np.ndarray:
+    pcm = samples.astype(np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(_ALAW_SEG_END, pcm, side="left")
+    segment = np.minimum(seg, 7)
+    shift = np.where(segment < 2, 1, segment)
+    value = (segment << 4) | ((pcm >> shift) & 0x0F)
+    value = np.where(seg >= 8, 0x7F, value)
+    return (value ^ mask).astype(np.uint8)
+
+
+def _table(codec: str) -> np.ndarray:
+    """Encoding table indexed by the uint16 view of every int16 sample, built on first use"""
+    table = _tables.get(codec)
+    if table is None:
+        samples = np.arange(65536, dtype=np.uint16).view(np.int16)
+        table = _linear_to_mulaw(samples) if codec == "mulaw" else _linear_to_alaw(samples)
+        _tables[codec] = table
+    return table
+
+
+def encode_g711(samples: np.ndarray, codec: str) -> bytes:
+    """Encode int16 samples as 8-bit μ-law or A-law with one table lookup per sample"""
+    return _table(codec)[samples.view(np.uint16)].tobytes()
+
+
+class PcmEncoder:
+    """Turns a stream of LINEAR16 chunks into the caller's rate and codec.
+
+    Chunks may split a sample; the odd byte is carried over to the next chunk. Resampling
+    is linear interpolation at output sample n's input position n * from_rate / to_rate,
+    taken in integers from the count of samples seen so far, so an utterance resampled
+    chunk by chunk is identical to resampling it in one piece.
+    """
+    def __init__(self, from_rate: int, to_rate: int, codec: str = "linear16"):
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported output codec: {codec}")
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.codec = codec
+        self._carry = b""
+        self._prev = None
+        self._seen = 0
+        self._emitted = 0
+
+    def _resample(self, samples: np.ndarray) -> np.ndarray:
+        if self.from_rate == self.to_rate or not len(samples):
+            return samples
+        x = samples.astype(np.float64)
+        # Global index of x[0]; the previous chunk's last sample is kept to interpolate across
+        start = self._seen
+        if self._prev is not None:
+            x = np.concatenate(([self._prev], x))
+            start -= 1
+        self._seen += len(samples)
+        self._prev = x[-1]
+        # Output samples whose position falls on or before the last input sample seen
+        end = (self._seen - 1) * self.to_rate // self.from_rate + 1
+        n = np.arange(self._emitted, end, dtype=np.int64)
+        self._emitted = max(self._emitted, end)
+        if not len(n):
+            return np.empty(0, dtype=np.int16)
+        position = n * self.from_rate
+        idx = position // self.to_rate - start
+        frac = (position % self.to_rate) / self.to_rate
+        following = np.minimum(idx + 1, len(x) - 1)
+        out = x[idx] + (x[following] - x[idx]) * frac
+        return np.round(out).astype(np.int16)
+
+    def encode(self, data: bytes) -> bytes:
+        if self._carry:
+            data = self._carry + data
+        usable = len(data) & ~1
+        self._carry = bytes(data[usable:])
+        if self.from_rate == self.to_rate and self.codec == "linear16":
+            return bytes(data[:usable]) if self._carry else data
+        samples = self._resample(np.frombuffer(data, dtype="<i2", count=usable // 2))
+        if self.codec == "linear16":
+            return samples.astype("<i2").tobytes()
+        return encode_g711(samples, self.codec)
@@ -1,23 +1,27 @@
-import pyaudio
-import wave
 from typing import Generator, List
 import grpc
 import yandex.cloud.ai.stt.v3.stt_pb2 as stt_pb2
 import yandex.cloud.ai.stt.v3.stt_service_pb2_grpc as stt_service_pb2_grpc
-from ..utils.config import AUDIO_SETTINGS, YANDEX_API_KEY
+from ..utils.config import AUDIO_SETTINGS, YANDEX_API_KEY, GRPC_SETTINGS, RECORDING_SETTINGS
 from ..utils.logger import default_logger, timing_decorator
+from .grpc_channels import default_channel_manager
+from .call_recording import CallRecordingWriter, recording_path
 
 class AudioRecorder:
     def __init__(self):
+        import pyaudio
+
         self.logger = default_logger.getChild("AudioRecorder")
         self.audio = pyaudio.PyAudio()
         self.stream = None
-        self.frames = []
+        self.writer = None
         self._setup_audio()
         self.logger.info("AudioRecorder initialized")
 
     def _setup_audio(self):
         """Initialize audio settings"""
+        import pyaudio
+
         self.format = getattr(pyaudio, AUDIO_SETTINGS['FORMAT'])
         self.channels = AUDIO_SETTINGS['CHANNELS']
         self.rate = AUDIO_SETTINGS['RATE']
@@ -26,7 +30,7 @@ class AudioRecorder:
         self.logger.debug(f"Audio settings configured: {AUDIO_SETTINGS}")
 
     @timing_decorator(default_logger)
-    def start_recording(self):
+    def start_recording(self, call_id=None):
         """Start recording audio"""
         self.stream = self.audio.open(
             format=self.format,
@@ -35,29 +39,23 @@ class AudioRecorder:
             input=True,
             frames_per_buffer=self.chunk
         )
-        self.frames = []
+        if RECORDING_SETTINGS['enabled']:
+            self.writer = CallRecordingWriter(
+                recording_path(call_id), self.channels, self.audio.get_sample_size(self.format), self.rate
+            )
         # self.logger.info("Recording started")
 
     @timing_decorator(default_logger)
     def stop_recording(self):
-        """Stop recording and save to file"""
+        """Stop recording; the WAV file is finished in the background"""
         if self.stream:
             self.stream.stop_stream()
             self.stream.close()
-            self._save_audio()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
             # self.logger.info("Recording stopped and saved")
 
-    @timing_decorator(default_logger)
-    def _save_audio(self):
-        """Save recorded audio to WAV file"""
-        wave_file = wave.open(AUDIO_SETTINGS['WAVE_OUTPUT_FILENAME'], 'wb')
-        wave_file.setnchannels(self.channels)
-        wave_file.setsampwidth(self.audio.get_sample_size(self.format))
-        wave_file.setframerate(self.rate)
-        wave_file.writeframes(b''.join(self.frames))
-        wave_file.close()
-        # self.logger.debug(f"Audio saved to {AUDIO_SETTINGS['WAVE_OUTPUT_FILENAME']}")
-
     @timing_decorator(default_logger)
     def record_chunk(self) -> bytes:
         """Record a single chunk of audio"""
@@ -65,7 +63,8 @@ class AudioRecorder:
             self.logger.error("Attempted to record chunk without active stream")
             raise RuntimeError("Recording not started")
         data = self.stream.read(self.chunk)
-        self.frames.append(data)
+        if self.writer:
+            self.writer.write(data)
         return data
 
     def cleanup(self):
@@ -78,13 +77,10 @@ class AudioRecorder:
 class SpeechRecognizer:
     def __init__(self):
         self.logger = default_logger.getChild("SpeechRecognizer")
-        self.cred = grpc.ssl_channel_credentials()
-        # self.channel = grpc.secure_channel('stt.api.cloud.yandex.net:443', self.cred)
-        self.channel = grpc.secure_channel('stt.api.ml.yandexcloud.kz:443', self.cred)
-        self.stub = stt_service_pb2_grpc.RecognizerStub(self.channel)
+        self.channels = default_channel_manager.get_pool(GRPC_SETTINGS['stt_endpoint'])
         self.logger.info("SpeechRecognizer initialized")
 
-    def get_recognition_options(self) -> stt_pb2.StreamingOptions:
+    def get_recognition_options(self, sample_rate_hertz: int = 8000) -> stt_pb2.StreamingOptions:
         """Get recognition options for Yandex Speech-to-Text"""
         # self.logger.debug("Getting recognition options")
         return stt_pb2.StreamingOptions(
@@ -92,7 +88,7 @@ class SpeechRecognizer:
                 audio_format=stt_pb2.AudioFormatOptions(
                     raw_audio=stt_pb2.RawAudio(
                         audio_encoding=stt_pb2.RawAudio.LINEAR16_PCM,
-                        sample_rate_hertz=8000,
+                        sample_rate_hertz=sample_rate_hertz,
                         audio_channel_count=1
                     )
                 ),
@@ -112,13 +108,14 @@ class SpeechRecognizer:
     @timing_decorator(default_logger)
     def recognize_stream(self, audio_generator: Generator) -> Generator:
         """Stream audio to Yandex Speech-to-Text and get recognition results"""
+        # The RPC only starts, and fails, once the stream is iterated
+        recognition_stream = self.channels.stream(
+            stt_service_pb2_grpc.RecognizerStub, 'RecognizeStreaming',
+            audio_generator,
+            metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
+        )
         try:
-            # self.logger.info("Starting speech recognition stream")
-            recognition_stream = self.stub.RecognizeStreaming(
-                audio_generator,
-                metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
-            )
-            return recognition_stream
+            yield from recognition_stream
         except grpc.RpcError as e:
             self.logger.error(f"RPC failed: {e.code()}: {e.details()}")
             raise 
\ No newline at end of file
@@ -1,11 +1,13 @@
 import socket
-import wave
 from typing import Generator, List
 import grpc
 import yandex.cloud.ai.stt.v3.stt_pb2 as stt_pb2
 import yandex.cloud.ai.stt.v3.stt_service_pb2_grpc as stt_service_pb2_grpc
-from ..utils.config import AUDIO_SETTINGS, YANDEX_API_KEY
+from ..utils.config import AUDIO_SETTINGS, YANDEX_API_KEY, GRPC_SETTINGS, RECORDING_SETTINGS, INGEST_SETTINGS
 from ..utils.logger import default_logger, timing_decorator
+from .grpc_channels import default_channel_manager
+from .call_recording import CallRecordingWriter, recording_path
+from .ingest import FramedAudioReader
 
 class AudioRecorder:
     def __init__(self, host='0.0.0.0', port=12345, chunk=4096):
@@ -15,10 +17,13 @@ class AudioRecorder:
         self.chunk = chunk
         self.client_socket = None
         self.conn = None
+        self.reader = None
+        self.writer = None
+        self.sample_rate = AUDIO_SETTINGS['RATE']
         self.logger.info("AudioRecorder initialized")
 
 
-    def start_recording(self):
+    def start_recording(self, call_id=None):
         """Wait for TCP connection and start receiving audio"""
         self.logger.info(f"Waiting for TCP audio stream on {self.host}:{self.port}...")
         self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -26,26 +31,35 @@ class AudioRecorder:
         self.conn.listen(1)
         self.client_socket, addr = self.conn.accept()
         self.logger.info(f"TCP stream connected from {addr}")
-
-    def _save_audio(self):
-        """Save recorded audio to WAV file"""
-        wave_file = wave.open(AUDIO_SETTINGS['WAVE_OUTPUT_FILENAME'], 'wb')
-        wave_file.setnchannels(self.channels)
-        wave_file.setsampwidth(self.audio.get_sample_size(self.format))
-        wave_file.setframerate(self.rate)
-        wave_file.writeframes(b''.join(self.frames))
-        wave_file.close()
+        # A hello opts the connection into framed messages; peeked raw audio stays unread
+        self.reader = FramedAudioReader(self.client_socket)
+        self.sample_rate = self.reader.handshake().sample_rate
+        if not (self.reader.hello or INGEST_SETTINGS['framed']):
+            self.reader = None
+        if RECORDING_SETTINGS['enabled']:
+            self.writer = CallRecordingWriter(
+                recording_path(call_id), AUDIO_SETTINGS['CHANNELS'], 2, self.sample_rate
+            )
 
     def record_chunk(self) -> bytes:
         """Receive audio chunk from TCP stream"""
         if not self.client_socket:
             raise RuntimeError("TCP connection not established")
-        data = self.client_socket.recv(self.chunk)
+        if self.reader:
+            data = self.reader.read_frame()
+        else:
+            data = self.client_socket.recv(self.chunk)
         if not data:
             raise RuntimeError("Audio stream ended")
+        if self.writer:
+            self.writer.write(data)
         return data
 
     def stop_recording(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self.reader = None
         if self.client_socket:
             self.client_socket.close()
             self.client_socket = None
@@ -61,13 +75,10 @@ class AudioRecorder:
 class SpeechRecognizer:
     def __init__(self):
         self.logger = default_logger.getChild("SpeechRecognizer")
-        self.cred = grpc.ssl_channel_credentials()
-        # self.channel = grpc.secure_channel('stt.api.cloud.yandex.net:443', self.cred)
-        self.channel = grpc.secure_channel('stt.api.ml.yandexcloud.kz:443', self.cred)
-        self.stub = stt_service_pb2_grpc.RecognizerStub(self.channel)
+        self.channels = default_channel_manager.get_pool(GRPC_SETTINGS['stt_endpoint'])
         self.logger.info("SpeechRecognizer initialized")
 
-    def get_recognition_options(self) -> stt_pb2.StreamingOptions:
+    def get_recognition_options(self, sample_rate_hertz: int = 8000) -> stt_pb2.StreamingOptions:
         """Get recognition options for Yandex Speech-to-Text"""
         # self.logger.debug("Getting recognition options")
         return stt_pb2.StreamingOptions(
@@ -75,7 +86,7 @@ class SpeechRecognizer:
                 audio_format=stt_pb2.AudioFormatOptions(
                     raw_audio=stt_pb2.RawAudio(
                         audio_encoding=stt_pb2.RawAudio.LINEAR16_PCM,
-                        sample_rate_hertz=8000,
+                        sample_rate_hertz=sample_rate_hertz,
                         audio_channel_count=1
                     )
                 ),
@@ -95,13 +106,14 @@ class SpeechRecognizer:
     @timing_decorator(default_logger)
     def recognize_stream(self, audio_generator: Generator) -> Generator:
         """Stream audio to Yandex Speech-to-Text and get recognition results"""
+        # The RPC only starts, and fails, once the stream is iterated
+        recognition_stream = self.channels.stream(
+            stt_service_pb2_grpc.RecognizerStub, 'RecognizeStreaming',
+            audio_generator,
+            metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
+        )
         try:
-            # self.logger.info("Starting speech recognition stream")
-            recognition_stream = self.stub.RecognizeStreaming(
-                audio_generator,
-                metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
-            )
-            return recognition_stream
+            yield from recognition_stream
         except grpc.RpcError as e:
             self.logger.error(f"RPC failed: {e.code()}: {e.details()}")
             raise 
\ No newline at end of file
@@ -1,51 +1,66 @@
 import io
+import threading
+from functools import partial
 import grpc
 import pydub
 from pydub.playback import play
 from typing import Optional, List
 import yandex.cloud.ai.tts.v3.tts_pb2 as tts_pb2
 import yandex.cloud.ai.tts.v3.tts_service_pb2_grpc as tts_service_pb2_grpc
-from ..utils.config import YANDEX_API_KEY
+from ..utils.config import YANDEX_API_KEY, GRPC_SETTINGS, TTS_SETTINGS, FIXED_PROMPTS
 from ..utils.logger import default_logger, timing_decorator
+from .tts_cache import default_tts_cache
+from .grpc_channels import default_channel_manager
+from .pcm import is_raw, output_format
 
 class SpeechSynthesizer:
     def __init__(self):
         self.logger = default_logger
-        self.cred = grpc.ssl_channel_credentials()
-        # self.channel = grpc.secure_channel('tts.api.cloud.yandex.net:443', self.cred)
-
-        self.channel = grpc.secure_channel('tts.api.ml.yandexcloud.kz:443', self.cred)
-        self.stub = tts_service_pb2_grpc.SynthesizerStub(self.channel)
+        self.channels = default_channel_manager.get_pool(GRPC_SETTINGS['tts_endpoint'])
+        self.cache = default_tts_cache
+        # Local playback takes LINEAR16 at the synthesis rate as it is
+        self.output_format = output_format(TTS_SETTINGS['sample_rate_hertz'])
         self.logger.info("SpeechSynthesizer initialized")
 
+    def get_output_audio_spec(self) -> tts_pb2.AudioFormatOptions:
+        """Raw LINEAR16 at the telephony rate, or the configured container"""
+        if is_raw():
+            return tts_pb2.AudioFormatOptions(
+                raw_audio=tts_pb2.RawAudio(
+                    audio_encoding=tts_pb2.RawAudio.LINEAR16_PCM,
+                    sample_rate_hertz=TTS_SETTINGS['sample_rate_hertz'],
+                )
+            )
+        return tts_pb2.AudioFormatOptions(
+            container_audio=tts_pb2.ContainerAudio(
+                container_audio_type=getattr(tts_pb2.ContainerAudio, TTS_SETTINGS['audio_format'])
+            )
+        )
+
     def get_synthesis_request(self, text: str) -> tts_pb2.UtteranceSynthesisRequest:
         """Get synthesis request for Yandex Text-to-Speech"""
         return tts_pb2.UtteranceSynthesisRequest(
             text=text,
-            output_audio_spec=tts_pb2.AudioFormatOptions(
-                container_audio=tts_pb2.ContainerAudio(
-                    container_audio_type=tts_pb2.ContainerAudio.WAV
-                )
-            ),
+            output_audio_spec=self.get_output_audio_spec(),
             hints=[
-                tts_pb2.Hints(voice='zhanar_ru'),
-                tts_pb2.Hints(speed=1.0),  
-                tts_pb2.Hints(role = 'friendly'),
+                tts_pb2.Hints(voice=TTS_SETTINGS['voice']),
+                tts_pb2.Hints(speed=TTS_SETTINGS['speed']),
+                tts_pb2.Hints(role=TTS_SETTINGS['role']),
             ],
             loudness_normalization_type=tts_pb2.UtteranceSynthesisRequest.LUFS
         )
 
-    @timing_decorator(default_logger)
-    def synthesize_speech(self, text: str) -> Optional[pydub.AudioSegment]:
-        """Synthesize speech from text using Yandex TTS gRPC API"""
+    def _request_audio(self, text: str, cancel_event: Optional[threading.Event] = None) -> Optional[bytes]:
+        """Call Yandex TTS and return the raw audio bytes, or None if cancelled"""
         try:
-            self.logger.info(f"Synthesizing speech for text: {text[:100]}...")
+            self.logger.debug(f"Synthesizing speech for text: {text[:100]}...")
 
             # Create synthesis request
             request = self.get_synthesis_request(text)
 
             # Send request to Yandex TTS API
-            response_iterator = self.stub.UtteranceSynthesis(
+            response_iterator = self.channels.stream(
+                tts_service_pb2_grpc.SynthesizerStub, 'UtteranceSynthesis',
                 request,
                 metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
             )
@@ -53,18 +68,42 @@ class SpeechSynthesizer:
             # Collect audio chunks
             audio = io.BytesIO()
             for response in response_iterator:
+                if cancel_event is not None and cancel_event.is_set():
+                    response_iterator.close()
+                    return None
                 audio.write(response.audio_chunk.data)
-            
-            audio.seek(0)
-            return pydub.AudioSegment.from_wav(audio)
+            return audio.getvalue()
 
         except grpc.RpcError as e:
             self.logger.error(f"RPC failed: {e.code()}: {e.details()}")
             return None
+
+    def prewarm_cache(self):
+        """Synthesize the fixed prompts into the shared cache"""
+        self.cache.prewarm(FIXED_PROMPTS, self._request_audio, self.output_format)
+
+    @timing_decorator(default_logger)
+    def synthesize_speech(self, text: str, cancel_event: Optional[threading.Event] = None) -> Optional[pydub.AudioSegment]:
+        """Synthesize speech from text using Yandex TTS gRPC API"""
+        try:
+            audio = self.cache.get_or_synthesize(
+                text, partial(self._request_audio, cancel_event=cancel_event), self.output_format
+            )
+            if not audio:
+                return None
+            return self.load_audio(audio)
         except Exception as e:
             self.logger.error(f"Error synthesizing speech: {e}")
             return None
 
+    def load_audio(self, audio: bytes) -> pydub.AudioSegment:
+        """Turn synthesized bytes into a playable segment; raw samples need no decoding"""
+        if is_raw():
+            return pydub.AudioSegment(
+                data=audio, sample_width=2, frame_rate=TTS_SETTINGS['sample_rate_hertz'], channels=1
+            )
+        return pydub.AudioSegment.from_wav(io.BytesIO(audio))
+
     def play_audio(self, audio_segment: pydub.AudioSegment) -> None:
         """Play synthesized audio using pydub"""
         try:
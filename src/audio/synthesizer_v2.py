@@ -1,12 +1,30 @@
 import io
+import threading
+from functools import partial
 import grpc
 import struct
 import socket
-from typing import Optional, List
+from typing import Generator, Optional, List
 import yandex.cloud.ai.tts.v3.tts_pb2 as tts_pb2
 import yandex.cloud.ai.tts.v3.tts_service_pb2_grpc as tts_service_pb2_grpc
-from ..utils.config import YANDEX_API_KEY
+from ..utils.config import YANDEX_API_KEY, GRPC_SETTINGS, TTS_SETTINGS, FIXED_PROMPTS
 from ..utils.logger import default_logger, timing_decorator
+from .tts_cache import default_tts_cache
+from .grpc_channels import default_channel_manager
+from .pcm import PcmEncoder, is_raw, output_format
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+def send_frame(sock: socket.socket, data=b'') -> None:
+    """Send one length-prefixed audio frame without joining header and payload; an empty frame ends the utterance"""
+    header = FRAME_HEADER.pack(len(data))
+    sent = sock.sendmsg([header, data])
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sock.sendall(data)
+    elif sent < len(header) + len(data):
+        sock.sendall(memoryview(data)[sent - len(header):])
 
 class AudioStreamer:
     def __init__(self, host='0.0.0.0', port=23456):
@@ -70,24 +88,22 @@ class AudioStreamer:
         for segment in segments:
             if not segment:
                 continue
-            length = len(segment)
-            header = struct.pack('>I', length)
-            self.client_socket.sendall(header + segment)
+            send_frame(self.client_socket, segment)
     
     def close(self):
         self.conn.close()
         self.sock.close()
 
 class SpeechSynthesizer:
-    def __init__(self):
+    def __init__(self, connect_socket: bool = True):
         self.logger = default_logger
-        self.cred = grpc.ssl_channel_credentials()
-        # self.channel = grpc.secure_channel('tts.api.cloud.yandex.net:443', self.cred)
         self.socket = None
         # self.socket_conn = None
-        self.channel = grpc.secure_channel('tts.api.ml.yandexcloud.kz:443', self.cred)
-        self.stub = tts_service_pb2_grpc.SynthesizerStub(self.channel)
-        self.connect_socket()
+        self.channels = default_channel_manager.get_pool(GRPC_SETTINGS['tts_endpoint'])
+        self.cache = default_tts_cache
+        self.output_format = output_format(TTS_SETTINGS['output_rate'], TTS_SETTINGS['output_codec'])
+        if connect_socket:
+            self.connect_socket()
         # self.socket = AudioStreamer()
         self.logger.info("SpeechSynthesizer initialized")
 
@@ -106,58 +122,135 @@ class SpeechSynthesizer:
             print('error')
             self.socket = None 
 
+    def get_output_audio_spec(self) -> tts_pb2.AudioFormatOptions:
+        """Raw LINEAR16 at the telephony rate, or the configured container"""
+        if is_raw():
+            return tts_pb2.AudioFormatOptions(
+                raw_audio=tts_pb2.RawAudio(
+                    audio_encoding=tts_pb2.RawAudio.LINEAR16_PCM,
+                    sample_rate_hertz=TTS_SETTINGS['sample_rate_hertz'],
+                )
+            )
+        return tts_pb2.AudioFormatOptions(
+            container_audio=tts_pb2.ContainerAudio(
+                container_audio_type=getattr(tts_pb2.ContainerAudio, TTS_SETTINGS['audio_format'])
+            )
+        )
+
     def get_synthesis_request(self, text: str) -> tts_pb2.UtteranceSynthesisRequest:
         """Get synthesis request for Yandex Text-to-Speech"""
         return tts_pb2.UtteranceSynthesisRequest(
             text=text,
-            output_audio_spec=tts_pb2.AudioFormatOptions(
-                container_audio=tts_pb2.ContainerAudio(
-                    container_audio_type=tts_pb2.ContainerAudio.WAV
-                )
-            ),
+            output_audio_spec=self.get_output_audio_spec(),
             hints=[
-                tts_pb2.Hints(voice='zhanar_ru'),
-                tts_pb2.Hints(speed=1.0),  
-                tts_pb2.Hints(role = 'friendly'),
+                tts_pb2.Hints(voice=TTS_SETTINGS['voice']),
+                tts_pb2.Hints(speed=TTS_SETTINGS['speed']),
+                tts_pb2.Hints(role=TTS_SETTINGS['role']),
             ],
             loudness_normalization_type=tts_pb2.UtteranceSynthesisRequest.LUFS
         )
 
-    @timing_decorator(default_logger)
-    def synthesize_speech(self, text: str):
-        """Synthesize speech from text using Yandex TTS gRPC API"""
+    def _encoder(self) -> Optional[PcmEncoder]:
+        """Per-utterance converter from raw synthesis output to the caller's rate and codec"""
+        if not is_raw():
+            return None
+        return PcmEncoder(TTS_SETTINGS['sample_rate_hertz'], TTS_SETTINGS['output_rate'], TTS_SETTINGS['output_codec'])
+
+    def _request_audio(self, text: str, cancel_event: Optional[threading.Event] = None) -> Optional[bytes]:
+        """Call Yandex TTS and return the raw audio bytes, or None if cancelled"""
         try:
-            self.logger.info(f"Synthesizing speech for text: {text[:100]}...")
+            self.logger.debug(f"Synthesizing speech for text: {text[:100]}...")
 
             # Create synthesis request
             request = self.get_synthesis_request(text)
 
             # Send request to Yandex TTS API
-            response_iterator = self.stub.UtteranceSynthesis(
+            response_iterator = self.channels.stream(
+                tts_service_pb2_grpc.SynthesizerStub, 'UtteranceSynthesis',
                 request,
                 metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
             )
 
             # Collect audio chunks
+            encoder = self._encoder()
             audio = io.BytesIO()
             for response in response_iterator:
-                audio.write(response.audio_chunk.data)
-            
-            audio.seek(0)
-            return audio.read()
+                if cancel_event is not None and cancel_event.is_set():
+                    response_iterator.close()
+                    return None
+                chunk = response.audio_chunk.data
+                audio.write(encoder.encode(chunk) if encoder else chunk)
+            return audio.getvalue()
         except grpc.RpcError as e:
             self.logger.error(f"RPC failed: {e.code()}: {e.details()}")
             return None
+
+    def prewarm_cache(self):
+        """Synthesize the fixed prompts into the shared cache"""
+        self.cache.prewarm(FIXED_PROMPTS, self._request_audio, self.output_format)
+
+    @timing_decorator(default_logger)
+    def synthesize_speech(self, text: str, cancel_event: Optional[threading.Event] = None):
+        """Synthesize speech from text using Yandex TTS gRPC API"""
+        try:
+            return self.cache.get_or_synthesize(
+                text, partial(self._request_audio, cancel_event=cancel_event), self.output_format
+            )
         except Exception as e:
             self.logger.error(f"Error synthesizing speech: {e}")
             return None
 
+    def iter_speech(self, text: str, cancel_event: Optional[threading.Event] = None) -> Generator:
+        """Yield audio chunks as UtteranceSynthesis returns them; cached text is yielded in one piece"""
+        key = self.cache.key_for(text, self.output_format)
+        audio = self.cache.get(key)
+        if audio is not None:
+            yield audio
+            return
+        self.logger.debug(f"Streaming speech for text: {text[:100]}...")
+        encoder = self._encoder()
+        parts = []
+        try:
+            response_iterator = self.channels.stream(
+                tts_service_pb2_grpc.SynthesizerStub, 'UtteranceSynthesis',
+                self.get_synthesis_request(text),
+                metadata=[('authorization', f'Api-Key {YANDEX_API_KEY}')]
+            )
+            for response in response_iterator:
+                if cancel_event is not None and cancel_event.is_set():
+                    response_iterator.close()
+                    return
+                chunk = response.audio_chunk.data
+                if encoder:
+                    chunk = encoder.encode(chunk)
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        except grpc.RpcError as e:
+            self.logger.error(f"RPC failed: {e.code()}: {e.details()}")
+            return
+        self.cache.put(key, b''.join(parts))
+
+    def stream_audio(self, chunk: bytes) -> None:
+        """Forward one audio chunk to the caller's socket; an empty chunk ends the utterance"""
+        try:
+            send_frame(self.socket_conn, chunk)
+        except Exception as e:
+            self.logger.error(f"Error streaming audio: {e}")
+
+    def load_audio(self, audio: bytes) -> bytes:
+        """Synthesized bytes are sent to the socket as they are"""
+        return audio
+
     def play_audio(self, audio_bytes: bytes) -> None:
         """Play synthesized audio using pydub"""
         try:
             # self.connect_socket()
-            self.socket_conn.sendall(audio_bytes)
-            print("sent _____________________________________________-")
+            if TTS_SETTINGS['stream_output']:
+                send_frame(self.socket_conn, audio_bytes)
+                send_frame(self.socket_conn)
+            else:
+                self.socket_conn.sendall(audio_bytes)
         except Exception as e:
             self.logger.error(f"Error playing audio: {e}")
             
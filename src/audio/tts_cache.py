@@ -0,0 +1,183 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from ..utils.config import AUDIO_DIR, TTS_CACHE_SETTINGS, TTS_SETTINGS
+from ..utils.logger import default_logger
+from ..utils.metrics import MetricsRegistry, default_metrics
+
+LOOKUP_METRIC = "voice_tts_cache_lookups_total"
+BYTES_METRIC = "voice_tts_cache_bytes"
+
+
+def cache_key(text: str, voice: str, speed: float, role: str, audio_format: str) -> str:
+    """Content address of a synthesized utterance"""
+    raw = "\x1f".join([text.strip(), voice, f"{speed:g}", role, audio_format])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Two-tier cache of synthesized audio bytes: in-memory LRU in front of files under AUDIO_DIR.
+
+    Both tiers are bounded. The directory is shared by all workers, so when this process's
+    estimate of its size passes max_disk_bytes it is rescanned and the least recently used
+    files (by mtime, refreshed on disk hits) are removed down to the low-water mark.
+    """
+    def __init__(self, cache_dir: Optional[Path] = None, max_memory_bytes: Optional[int] = None,
+                 max_disk_bytes: Optional[int] = None, registry: MetricsRegistry = default_metrics):
+        self.logger = default_logger.getChild("TTSCache")
+        self.cache_dir = Path(cache_dir or AUDIO_DIR / TTS_CACHE_SETTINGS['dir_name'])
+        self._dir_ready = False
+        self.max_memory_bytes = max_memory_bytes or TTS_CACHE_SETTINGS['max_memory_bytes']
+        self.max_disk_bytes = max_disk_bytes or TTS_CACHE_SETTINGS['max_disk_bytes']
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.registry = registry
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key_for(self, text: str, audio_format: Optional[str] = None) -> str:
+        return cache_key(
+            text, TTS_SETTINGS['voice'], TTS_SETTINGS['speed'],
+            TTS_SETTINGS['role'], audio_format or TTS_SETTINGS['audio_format'],
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.bin"
+
+    def _remember(self, key: str, audio: bytes):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.max_memory_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+            memory_bytes = self._memory_bytes
+        self.registry.set(BYTES_METRIC, memory_bytes, tier="memory")
+
+    def _count(self, tier: str):
+        self.registry.inc(LOOKUP_METRIC, tier=tier)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self._count("memory")
+                return audio
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            self._count("miss")
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        self._count("disk")
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another worker meanwhile
+        self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        self._remember(key, audio)
+        path = self._path(key)
+        if not self._dir_ready:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self._disk_lock:
+                self._disk_bytes = sum(size for _, size, _ in self._scan())
+            self._dir_ready = True
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(audio)
+            # A racing put of the same text may have written it already; count only the growth
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f"Error writing TTS cache entry: {e}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += len(audio) - replaced
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+            disk_bytes = self._disk_bytes
+        self.registry.set(BYTES_METRIC, disk_bytes, tier="disk")
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """(mtime, size, path) of every cached file, oldest first"""
+        files = []
+        for path in self.cache_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        return files
+
+    def _evict_disk(self):
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * TTS_CACHE_SETTINGS['disk_low_water']
+        evicted = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # another worker evicted it first
+            total -= size
+            evicted += 1
+        self._disk_bytes = total
+        self.logger.info(f"Evicted {evicted} TTS cache files, {total} bytes left on disk")
+
+    def get_or_synthesize(self, text: str, synthesize: Callable[[str], Optional[bytes]],
+                          audio_format: Optional[str] = None) -> Optional[bytes]:
+        """Return cached audio for text, calling synthesize only on a miss"""
+        key = self.key_for(text, audio_format)
+        audio = self.get(key)
+        if audio is None:
+            audio = synthesize(text)
+            if audio:
+                self.put(key, audio)
+        return audio
+
+    def prewarm(self, texts: Iterable[str], synthesize: Callable[[str], Optional[bytes]],
+                audio_format: Optional[str] = None):
+        """Make sure the fixed prompts are cached before the first call"""
+        for text in texts:
+            self.get_or_synthesize(text, synthesize, audio_format)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+default_tts_cache = TTSCache()
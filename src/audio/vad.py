@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from ..utils.config import AUDIO_SETTINGS, VAD_SETTINGS
+
+
+@dataclass
+class VADDecision:
+    """What to do with one audio chunk"""
+    speech: bool
+    send: bool
+    end_of_utterance: bool
+    duration_ms: float
+
+
+class VoiceActivityDetector:
+    """Frame energy + zero-crossing voice activity detector with hangover for 16-bit mono PCM.
+
+    Frames of each chunk are scored in one vectorized pass. A chunk is forwarded to STT while
+    speech is present and for hangover_ms after it; longer silences are held back. Once silence
+    has lasted end_of_utterance_ms after speech, the end of the utterance is reported once.
+    """
+    def __init__(self, rate: Optional[int] = None):
+        self.rate = rate or AUDIO_SETTINGS['RATE']
+        self.frame_ms = VAD_SETTINGS['frame_ms']
+        self.frame_len = int(self.rate * self.frame_ms / 1000)
+        self.energy_threshold_db = VAD_SETTINGS['energy_threshold_db']
+        self.noise_margin_db = VAD_SETTINGS['noise_margin_db']
+        self.zcr_max = VAD_SETTINGS['zcr_max']
+        self.hangover_ms = VAD_SETTINGS['hangover_ms']
+        self.end_of_utterance_ms = VAD_SETTINGS['end_of_utterance_ms']
+        self.noise_floor_db = self.energy_threshold_db - self.noise_margin_db
+        self._remainder = np.empty(0, dtype=np.int16)
+        self._odd_byte = b''
+        self.silence_ms = float('inf')
+        self.in_utterance = False
+
+    def reset(self):
+        self._remainder = np.empty(0, dtype=np.int16)
+        self._odd_byte = b''
+        self.silence_ms = float('inf')
+        self.in_utterance = False
+
+    def _frames(self, chunk: bytes) -> np.ndarray:
+        data = self._odd_byte + chunk
+        usable = len(data) - len(data) % 2
+        self._odd_byte = data[usable:]
+        samples = np.concatenate([self._remainder, np.frombuffer(data[:usable], dtype='<i2')])
+        n_frames = len(samples) // self.frame_len
+        self._remainder = samples[n_frames * self.frame_len:]
+        return samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+
+    def classify_frames(self, frames: np.ndarray) -> np.ndarray:
+        """Return a boolean speech mask, one entry per frame"""
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        x = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        energy_db = 20.0 * np.log10(rms / 32768.0 + 1e-10)
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+
+        threshold = max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+        loud = energy_db > threshold
+        # High zero-crossing rate at moderate energy is hiss/noise rather than voice
+        speech = loud & ((zcr < self.zcr_max) | (energy_db > threshold + self.noise_margin_db))
+
+        quiet = energy_db[~speech]
+        if len(quiet):
+            # Slowly track the background level so the threshold follows the line noise
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(np.median(quiet))
+        return speech
+
+    def process(self, chunk: bytes) -> VADDecision:
+        duration_ms = len(chunk) / 2 / self.rate * 1000
+        speech = self.classify_frames(self._frames(chunk))
+
+        if speech.any():
+            last_speech = int(np.flatnonzero(speech)[-1])
+            self.silence_ms = (len(speech) - 1 - last_speech) * self.frame_ms
+            self.in_utterance = True
+            return VADDecision(speech=True, send=True, end_of_utterance=False, duration_ms=duration_ms)
+
+        self.silence_ms += duration_ms
+        end_of_utterance = self.in_utterance and self.silence_ms >= self.end_of_utterance_ms
+        if end_of_utterance:
+            self.in_utterance = False
+        return VADDecision(
+            speech=False,
+            send=self.silence_ms <= self.hangover_ms,
+            end_of_utterance=end_of_utterance,
+            duration_ms=duration_ms,
+        )
@@ -0,0 +1,227 @@
+import argparse
+import io
+import itertools
+import json
+import threading
+import time
+import wave
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+import grpc
+import numpy as np
+import yandex.cloud.ai.stt.v3.stt_pb2 as stt_pb2
+import yandex.cloud.ai.stt.v3.stt_service_pb2_grpc as stt_service_pb2_grpc
+import yandex.cloud.ai.tts.v3.tts_pb2 as tts_pb2
+import yandex.cloud.ai.tts.v3.tts_service_pb2_grpc as tts_service_pb2_grpc
+
+# Local stand-ins for SpeechKit STT/TTS and the /process_text LLM endpoint, with
+# configurable latency and chunking. Run as a separate process by src.bench.run so their
+# CPU time is not attributed to the pipeline under test.
+
+DEFAULT_TRANSCRIPT = "Как подключить услугу?"
+
+
+class FakeRecognizer(stt_service_pb2_grpc.RecognizerServicer):
+    """Emits partials while audio arrives and a final_refinement at end of utterance.
+
+    The utterance ends on an explicit eou, after eou_silence_ms of quiet audio or silence
+    chunks following speech, or when the request stream closes. Every utterance is
+    recognized as the same transcript.
+    """
+    def __init__(self, transcript: str, partial_every: int, partial_latency_ms: float, final_latency_ms: float,
+                 eou_silence_ms: float, energy_threshold: float):
+        self.transcript = transcript
+        self.partial_every = partial_every
+        self.partial_latency = partial_latency_ms / 1000
+        self.final_latency = final_latency_ms / 1000
+        self.eou_silence_ms = eou_silence_ms
+        self.energy_threshold = energy_threshold
+
+    @staticmethod
+    def _update(text: str) -> stt_pb2.AlternativeUpdate:
+        return stt_pb2.AlternativeUpdate(alternatives=[stt_pb2.Alternative(text=text)])
+
+    def RecognizeStreaming(self, request_iterator, context) -> Iterator[stt_pb2.StreamingResponse]:
+        transcript = self.transcript
+        words = transcript.split()
+        sample_rate = 8000
+        chunks = 0
+        heard_speech = False
+        silence_ms = 0.0
+        for request in request_iterator:
+            event = request.WhichOneof("Event")
+            if event == "session_options":
+                raw = request.session_options.recognition_model.audio_format.raw_audio
+                sample_rate = raw.sample_rate_hertz or sample_rate
+                continue
+            if event == "chunk":
+                samples = np.frombuffer(request.chunk.data, dtype="<i2")
+                duration_ms = len(samples) * 1000 / sample_rate
+                rms = float(np.sqrt(np.mean(samples.astype(np.float32) ** 2))) if len(samples) else 0.0
+                if rms >= self.energy_threshold:
+                    heard_speech = True
+                    silence_ms = 0.0
+                    chunks += 1
+                    if chunks % self.partial_every == 0:
+                        time.sleep(self.partial_latency)
+                        shown = words[:max(1, min(len(words), chunks // self.partial_every))]
+                        yield stt_pb2.StreamingResponse(partial=self._update(" ".join(shown)))
+                    continue
+                silence_ms += duration_ms
+            elif event == "silence_chunk":
+                silence_ms += request.silence_chunk.duration_ms
+            if heard_speech and (event == "eou" or silence_ms >= self.eou_silence_ms):
+                time.sleep(self.final_latency)
+                yield stt_pb2.StreamingResponse(final_refinement=stt_pb2.FinalRefinement(
+                    normalized_text=self._update(transcript)
+                ))
+                heard_speech = False
+                chunks = 0
+                silence_ms = 0.0
+        if heard_speech:
+            time.sleep(self.final_latency)
+            yield stt_pb2.StreamingResponse(final_refinement=stt_pb2.FinalRefinement(
+                normalized_text=self._update(transcript)
+            ))
+
+
+class FakeSynthesizer(tts_service_pb2_grpc.SynthesizerServicer):
+    """Streams a tone whose length follows the text, after first_chunk_ms, in chunk_ms pieces"""
+    def __init__(self, first_chunk_ms: float, chunk_ms: int, chunk_interval_ms: float, ms_per_char: float):
+        self.first_chunk = first_chunk_ms / 1000
+        self.chunk_ms = chunk_ms
+        self.chunk_interval = chunk_interval_ms / 1000
+        self.ms_per_char = ms_per_char
+
+    def UtteranceSynthesis(self, request, context) -> Iterator[tts_pb2.UtteranceSynthesisResponse]:
+        spec = request.output_audio_spec
+        sample_rate = spec.raw_audio.sample_rate_hertz if spec.HasField("raw_audio") else 22050
+        sample_rate = sample_rate or 22050
+        n = int(sample_rate * len(request.text) * self.ms_per_char / 1000)
+        tone = (np.sin(2 * np.pi * 440 * np.arange(n) / sample_rate) * 8000).astype("<i2").tobytes()
+        if spec.HasField("container_audio"):
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                wav.writeframes(tone)
+            audio = buffer.getvalue()
+        else:
+            audio = tone
+        step = max(2, sample_rate * self.chunk_ms // 1000 * 2)
+        time.sleep(self.first_chunk)
+        for offset in range(0, len(audio), step):
+            if offset:
+                time.sleep(self.chunk_interval)
+            yield tts_pb2.UtteranceSynthesisResponse(
+                audio_chunk=tts_pb2.AudioChunk(data=audio[offset:offset + step])
+            )
+
+
+def llm_handler(ttfb_ms: float, token_interval_ms: float, answer_template: str):
+    """/process_text answering JSON, or SSE tokens when the request asks to stream.
+
+    The answer is numbered per request so every turn misses the TTS cache.
+    """
+    counter = itertools.count(1)
+
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            answer = answer_template.format(text=payload.get("text", ""), n=next(counter))
+            time.sleep(ttfb_ms / 1000)
+            if not payload.get("stream"):
+                body = json.dumps({"response": answer}, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            tokens = [word + " " for word in answer.split()]
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_interval_ms / 1000)
+                self._chunk(f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeLLMHandler
+
+
+def serve(args):
+    grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=args.workers))
+    stt_service_pb2_grpc.add_RecognizerServicer_to_server(
+        FakeRecognizer(args.transcript, args.partial_every, args.partial_latency_ms, args.final_latency_ms,
+                       args.eou_silence_ms, args.energy_threshold),
+        grpc_server,
+    )
+    tts_service_pb2_grpc.add_SynthesizerServicer_to_server(
+        FakeSynthesizer(args.tts_first_chunk_ms, args.tts_chunk_ms, args.tts_chunk_interval_ms, args.tts_ms_per_char),
+        grpc_server,
+    )
+    grpc_port = grpc_server.add_insecure_port(f"{args.host}:{args.grpc_port}")
+    grpc_server.start()
+
+    http_server = ThreadingHTTPServer(
+        (args.host, args.llm_port), llm_handler(args.llm_ttfb_ms, args.llm_token_interval_ms, args.answer)
+    )
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    # The harness reads this line to learn the bound ports
+    print(json.dumps({"grpc_port": grpc_port, "llm_port": http_server.server_address[1]}), flush=True)
+    try:
+        grpc_server.wait_for_termination()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.shutdown()
+        grpc_server.stop(0)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--grpc-port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--llm-port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--partial-every", type=int, default=10, help="Speech chunks per STT partial")
+    parser.add_argument("--partial-latency-ms", type=float, default=20)
+    parser.add_argument("--final-latency-ms", type=float, default=150)
+    parser.add_argument("--eou-silence-ms", type=float, default=800)
+    parser.add_argument("--energy-threshold", type=float, default=300.0, help="RMS that counts as speech")
+    parser.add_argument("--tts-first-chunk-ms", type=float, default=120)
+    parser.add_argument("--tts-chunk-ms", type=int, default=200, help="Audio duration per TTS chunk")
+    parser.add_argument("--tts-chunk-interval-ms", type=float, default=20)
+    parser.add_argument("--tts-ms-per-char", type=float, default=60)
+    parser.add_argument("--llm-ttfb-ms", type=float, default=400)
+    parser.add_argument("--llm-token-interval-ms", type=float, default=30)
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT, help="Text recognized for every utterance")
+    parser.add_argument("--answer", default="Ответ {n}. Услуга подключается в личном кабинете. Это займет пару минут.",
+                        help="LLM answer template with {text} and {n} (request number)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake SpeechKit STT/TTS and /process_text servers for benchmarks")
+    add_arguments(parser)
+    serve(parser.parse_args())
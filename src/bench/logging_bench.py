@@ -0,0 +1,100 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from ..utils.config import BASE_DIR
+from ..utils.logger import JsonFormatter, attach_queue_handler, bind_call_id, call_id_var, CallContextFilter
+
+
+class StallingHandler(logging.Handler):
+    """A sink that formats every record and stalls for stall_ms on every stall_every-th one,
+    standing in for a console or disk that occasionally blocks"""
+    def __init__(self, stall_ms: float, stall_every: int):
+        super().__init__()
+        self.stall = stall_ms / 1000
+        self.stall_every = stall_every
+        self.count = 0
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record: logging.LogRecord):
+        self.format(record)
+        self.count += 1
+        if self.stall_every and self.count % self.stall_every == 0:
+            time.sleep(self.stall)
+
+
+def simulate_call(logger: logging.Logger, call: int, turns: int, records_per_turn: int, debug_per_turn: int) -> List[float]:
+    """Per-turn seconds spent inside logging calls, as a call would log them"""
+    token = bind_call_id(f"bench{call:04d}")
+    spent = []
+    try:
+        for turn in range(turns):
+            start = time.perf_counter()
+            for i in range(records_per_turn):
+                logger.info(f"Turn {turn} event {i}", extra={"turn": turn})
+            for i in range(debug_per_turn):
+                logger.debug(f"Turn {turn} detail {i}")
+            spent.append(time.perf_counter() - start)
+    finally:
+        call_id_var.reset(token)
+    return spent
+
+
+def measure(mode: str, args) -> Dict[str, float]:
+    logger = logging.getLogger(f"bench.logging.{mode}")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    sink = StallingHandler(args.stall_ms, args.stall_every)
+    listener = None
+    if mode == "queued":
+        listener = attach_queue_handler(logger, sink)
+    else:
+        sink.addFilter(CallContextFilter())
+        logger.addHandler(sink)
+
+    with ThreadPoolExecutor(max_workers=args.calls) as executor:
+        per_call = list(executor.map(
+            lambda call: simulate_call(logger, call, args.turns, args.records_per_turn, args.debug_per_turn),
+            range(args.calls),
+        ))
+    if listener is not None:
+        listener.stop()
+    spent = np.array([value for values in per_call for value in values]) * 1000
+    return {
+        "turns": int(len(spent)),
+        "p50_ms": float(np.percentile(spent, 50)),
+        "p99_ms": float(np.percentile(spent, 99)),
+        "max_ms": float(spent.max()),
+        "mean_ms": float(spent.mean()),
+        "records_written": sink.count,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-turn latency added by logging, synchronous vs queue-backed")
+    parser.add_argument("--calls", type=int, default=32, help="Concurrent calls")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--records-per-turn", type=int, default=15)
+    parser.add_argument("--debug-per-turn", type=int, default=50, help="DEBUG records, subject to rate limiting")
+    parser.add_argument("--stall-ms", type=float, default=20.0)
+    parser.add_argument("--stall-every", type=int, default=200)
+    parser.add_argument("--output", type=Path, default=BASE_DIR / "bench_logging.json")
+    args = parser.parse_args(argv)
+
+    results = {mode: measure(mode, args) for mode in ("sync", "queued")}
+    report = {"settings": vars(args) | {"output": str(args.output)}, "results": results}
+    args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    for mode, result in results.items():
+        print(f"{mode:>6}: per-turn logging p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+              f"max {result['max_ms']:.3f} ms  ({result['records_written']} records written)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
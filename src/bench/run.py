@@ -0,0 +1,287 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ..utils.config import (
+    AUDIO_SETTINGS, BASE_DIR, GRPC_SETTINGS, FASTAPI_SETTINGS, TTS_SETTINGS, TTS_CACHE_SETTINGS,
+    VAD_SETTINGS, SPECULATION_SETTINGS, SEMANTIC_CACHE_SETTINGS, ANSWER_PACK_SETTINGS, RECORDING_SETTINGS,
+)
+from ..utils.logger import default_logger
+from ..utils.metrics import STAGE_METRIC, default_metrics
+from . import fake_services
+
+# Summary keys compared against a baseline; all are "lower is better"
+REGRESSION_KEYS = [
+    ("ttfa", "p50"), ("ttfa", "p95"),
+    ("turn_latency", "p50"), ("turn_latency", "p95"),
+    ("cpu_seconds_per_turn", None),
+]
+
+
+def load_fixture(path: Path, rate: int) -> bytes:
+    """Mono LINEAR16 samples of a WAV fixture at the pipeline rate"""
+    from ..audio.pcm import PcmEncoder
+
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: fixtures must be 16-bit PCM")
+        frames = wav.readframes(wav.getnframes())
+        if wav.getnchannels() > 1:
+            samples = np.frombuffer(frames, dtype="<i2").reshape(-1, wav.getnchannels())
+            frames = samples.mean(axis=1).astype("<i2").tobytes()
+        fixture_rate = wav.getframerate()
+    if fixture_rate == rate:
+        return frames
+    return PcmEncoder(fixture_rate, rate).encode(frames)
+
+
+def synthetic_fixture(rate: int, seconds: float = 1.5) -> bytes:
+    """A voiced-like 150 Hz pulse train with syllable-rate amplitude modulation"""
+    t = np.arange(int(rate * seconds)) / rate
+    voiced = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 8))
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)
+    return (voiced * envelope * 4000).astype("<i2").tobytes()
+
+
+class FixtureRecorder:
+    """Feeds a fixture to the pipeline in real time, followed by trailing silence.
+
+    speech_end is the monotonic time the last fixture chunk was handed over; after the
+    silence the session stops recording, which ends the STT stream.
+    """
+    def __init__(self, audio: bytes, sample_rate: int, chunk_ms: int, trailing_silence_ms: int, realtime: bool = True):
+        self.sample_rate = sample_rate
+        self.chunk_bytes = sample_rate * chunk_ms // 1000 * 2
+        self.speech_bytes = len(audio)
+        silence = bytes(sample_rate * trailing_silence_ms // 1000 * 2)
+        self.audio = audio + silence
+        self.realtime = realtime
+        self.session = None
+        self.started = 0.0
+        self.offset = 0
+        self.speech_end: Optional[float] = None
+
+    def start_recording(self, call_id=None):
+        self.started = time.perf_counter()
+        self.offset = 0
+
+    def record_chunk(self) -> bytes:
+        if self.realtime:
+            due = self.started + self.offset / (2 * self.sample_rate)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        chunk = self.audio[self.offset:self.offset + self.chunk_bytes]
+        self.offset += len(chunk)
+        if self.speech_end is None and self.offset >= self.speech_bytes:
+            self.speech_end = time.perf_counter()
+        if self.offset >= len(self.audio):
+            self.session.is_recording = False
+        return chunk
+
+    def stop_recording(self):
+        pass
+
+
+@dataclass
+class TurnResult:
+    fixture: str
+    ttfa: Optional[float] = None
+    turn_latency: Optional[float] = None
+    audio_bytes: int = 0
+    error: Optional[str] = None
+
+
+def run_call(assistant, name: str, audio: bytes, args) -> TurnResult:
+    from ..session import CallSession
+
+    recorder = FixtureRecorder(audio, AUDIO_SETTINGS['RATE'], args.chunk_ms, args.trailing_silence_ms, not args.fast)
+    result = TurnResult(fixture=name)
+    first_audio: List[float] = []
+    last_audio: List[float] = []
+
+    def on_audio(data) -> None:
+        # Audio before the caller finished speaking is the greeting
+        if recorder.speech_end is None or not data:
+            return
+        now = time.perf_counter()
+        if not first_audio:
+            first_audio.append(now)
+        last_audio[:] = [now]
+        result.audio_bytes += len(data)
+
+    session = CallSession(audio_recorder=recorder, play_audio=on_audio, stream_audio=on_audio)
+    recorder.session = session
+    try:
+        assistant.handle_call(session)
+    except Exception as e:
+        result.error = str(e)
+    if first_audio:
+        result.ttfa = first_audio[0] - recorder.speech_end
+        result.turn_latency = last_audio[0] - recorder.speech_end
+    elif result.error is None:
+        result.error = "no answer audio"
+    return result
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {"p50": p50, "p90": p90, "p95": p95, "p99": p99, "mean": float(np.mean(values)), "max": max(values)}
+
+
+def start_fakes(fake_args: List[str]) -> Tuple[subprocess.Popen, Dict[str, int]]:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.bench.fake_services", *fake_args],
+        cwd=BASE_DIR, stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("Fake services exited before reporting their ports")
+    return process, json.loads(line)
+
+
+def configure(ports: Dict[str, int], args, cache_dir: str):
+    """Point every client at the fakes; must run before the pipeline modules create their clients"""
+    GRPC_SETTINGS['stt_endpoint'] = GRPC_SETTINGS['tts_endpoint'] = f"127.0.0.1:{ports['grpc_port']}"
+    GRPC_SETTINGS['secure'] = False
+    FASTAPI_SETTINGS['host'] = f"http://127.0.0.1:{ports['llm_port']}/process_text"
+    FASTAPI_SETTINGS['http2'] = False
+    # An absolute dir_name replaces AUDIO_DIR / dir_name, so runs never share cached audio
+    TTS_CACHE_SETTINGS['dir_name'] = cache_dir
+    SEMANTIC_CACHE_SETTINGS['enabled'] = args.semantic_cache
+    ANSWER_PACK_SETTINGS['enabled'] = False
+    RECORDING_SETTINGS['enabled'] = False
+
+
+def compare(summary: Dict, baseline_path: Path, tolerance: float) -> List[str]:
+    """Keys that got more than `tolerance` slower than the baseline run"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["summary"]
+    regressions = []
+    for key, stat in REGRESSION_KEYS:
+        current = summary.get(key)
+        previous = baseline.get(key)
+        if stat is not None:
+            current = (current or {}).get(stat)
+            previous = (previous or {}).get(stat)
+        if current is None or not previous:
+            continue
+        if current > previous * (1 + tolerance):
+            name = f"{key}.{stat}" if stat else key
+            regressions.append(f"{name}: {previous:.4f} -> {current:.4f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against local fake STT/TTS/LLM")
+    parser.add_argument("--fixtures", type=Path, default=BASE_DIR / "data" / "bench",
+                        help="Directory of WAV fixtures (a synthetic utterance is used if empty)")
+    parser.add_argument("--output", type=Path, default=BASE_DIR / "bench_results.json")
+    parser.add_argument("--baseline", type=Path, help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed calls before measuring")
+    parser.add_argument("--calls", type=int, default=1, help="Concurrent calls")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--trailing-silence-ms", type=int, default=1500)
+    parser.add_argument("--fast", action="store_true", help="Feed audio as fast as possible instead of in real time")
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic answer cache enabled")
+    # Remaining options configure the fakes (see `python -m src.bench.fake_services --help`)
+    args, fake_args = parser.parse_known_args(argv)
+    fake_parser = argparse.ArgumentParser(prog="fake services")
+    fake_services.add_arguments(fake_parser)
+    fake_settings = vars(fake_parser.parse_args(fake_args))
+
+    logger = default_logger.getChild("Benchmark")
+
+    fixtures = sorted(args.fixtures.glob("*.wav")) if args.fixtures.is_dir() else []
+    if fixtures:
+        audios = [(path.name, load_fixture(path, AUDIO_SETTINGS['RATE'])) for path in fixtures]
+    else:
+        logger.warning(f"No fixtures in {args.fixtures}, using a synthetic utterance")
+        audios = [("synthetic", synthetic_fixture(AUDIO_SETTINGS['RATE']))]
+
+    process, ports = start_fakes(fake_args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_tts_cache_") as cache_dir:
+            configure(ports, args, cache_dir)
+            from ..main import VoiceAssistant
+            from ..audio.synthesizer_v2 import SpeechSynthesizer
+
+            started = time.perf_counter()
+            assistant = VoiceAssistant(speech_synthesizer=SpeechSynthesizer(connect_socket=False))
+            startup_seconds = time.perf_counter() - started
+
+            for i in range(args.warmup):
+                run_call(assistant, audios[i % len(audios)][0], audios[i % len(audios)][1], args)
+
+            jobs = [audio for _ in range(args.repeat) for audio in audios]
+            usage_before = resource.getrusage(resource.RUSAGE_SELF)
+            wall_started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.calls) as executor:
+                results = list(executor.map(lambda job: run_call(assistant, job[0], job[1], args), jobs))
+            wall_seconds = time.perf_counter() - wall_started
+            usage_after = resource.getrusage(resource.RUSAGE_SELF)
+            assistant.gpt_handler.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    ok = [result for result in results if result.error is None]
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    summary = {
+        "turns": len(results),
+        "failed": len(results) - len(ok),
+        "ttfa": percentiles([result.ttfa for result in ok]),
+        "turn_latency": percentiles([result.turn_latency for result in ok]),
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "cpu_seconds_per_turn": cpu_seconds / len(ok) if ok else None,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": usage_after.ru_maxrss / 1024,
+        "startup_seconds": startup_seconds,
+    }
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "calls": args.calls,
+            "fixtures": [name for name, _ in audios],
+            "realtime": not args.fast,
+            "tts": {key: TTS_SETTINGS[key] for key in ("pipelined", "max_in_flight", "stream_output", "audio_format")},
+            "llm_stream": FASTAPI_SETTINGS['stream'],
+            "vad": VAD_SETTINGS['enabled'],
+            "speculation": SPECULATION_SETTINGS['enabled'],
+            "semantic_cache": SEMANTIC_CACHE_SETTINGS['enabled'],
+            "fakes": fake_settings,
+        },
+        "summary": summary,
+        "stages": default_metrics.summary(STAGE_METRIC),
+        "turns": [asdict(result) for result in results],
+    }
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    logger.info(
+        f"{len(ok)}/{len(results)} turns, TTFA p50 {summary['ttfa'].get('p50', 0):.3f}s "
+        f"p95 {summary['ttfa'].get('p95', 0):.3f}s; results written to {args.output}"
+    )
+
+    if args.baseline:
+        regressions = compare(summary, args.baseline, args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
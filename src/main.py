@@ -1,122 +1,449 @@
 import sys
 import time
-from typing import Generator, List
+import queue
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, Iterable, List, Optional
 import yandex.cloud.ai.stt.v3.stt_pb2 as stt_pb2
-from .audio.recorder import AudioRecorder, SpeechRecognizer
-from .audio.synthesizer import SpeechSynthesizer
-from .api.gpt_handler import GPTHandler
-from .utils.logger import default_logger, timing_decorator
+from .audio.recorder import SpeechRecognizer
+from .audio.vad import VoiceActivityDetector
+from .api.gpt_handler import GPTHandler, NO_CONTEXT
+from .api.answer_cache import SemanticAnswerCache
+from .session import CallSession
+from .speculation import Speculator
+from .utils.logger import default_logger, timing_decorator, bind_call_id, call_id_var
+from .utils.metrics import TurnTrace, start_metrics_server
+from .utils.startup import startup_report
+from .audio.grpc_channels import default_channel_manager
+from .rag.metadata_store import record_field, record_key
 # from .rag.local_loader_v1 import DocumentLoader
-from .utils.config import DOCUMENT_NON_EXISTING, DOCUMENT_END, DOCUMENT_START
+from .utils.config import (
+    DOCUMENT_NON_EXISTING, DOCUMENT_END, DOCUMENT_START, BASE_DIR,
+    TTS_SETTINGS, TTS_CACHE_SETTINGS, FASTAPI_SETTINGS, VAD_SETTINGS, SPECULATION_SETTINGS,
+    SEMANTIC_CACHE_SETTINGS, ANSWER_PACK_SETTINGS, RAG_INDEX_SETTINGS, METRICS_SETTINGS,
+)
 class VoiceAssistant:
-    def __init__(self):
+    def __init__(self, speech_synthesizer=None, prewarm: bool = True):
         self.logger = default_logger
-        self.audio_recorder = AudioRecorder()
-        self.speech_recognizer = SpeechRecognizer()
-        self.speech_synthesizer = SpeechSynthesizer()
+        with startup_report.phase("speech recognizer"):
+            self.speech_recognizer = SpeechRecognizer()
+        if speech_synthesizer is None:
+            with startup_report.phase("speech synthesizer"):
+                from .audio.synthesizer import SpeechSynthesizer
+                speech_synthesizer = SpeechSynthesizer()
+        self.speech_synthesizer = speech_synthesizer
         self.gpt_handler = GPTHandler()
-        
-        # self.document_loader = DocumentLoader()
-        self.is_recording = False
-        self.last_recognition_time = 0
-        self.pause_threshold = 1
-        self.recognized_text_buffer = []
-
-    def audio_generator(self) -> Generator:
+        self.speculator = Speculator(self.gpt_handler.generate_response_from_text)
+        self.answer_cache = SemanticAnswerCache()
+        self.document_loader = None
+        self.answer_pack = None
+        if ANSWER_PACK_SETTINGS['enabled']:
+            with startup_report.phase("answer pack"):
+                self.load_answer_pack()
+        self.tts_executor = ThreadPoolExecutor(max_workers=TTS_SETTINGS['workers'], thread_name_prefix="tts")
+        # Storing an answer may embed its question; keep that off the playback path
+        self.cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-cache")
+
+        if prewarm:
+            self.warm_up()
+
+    def warm_up(self):
+        """Connect, load models and prime caches now, so that the first call pays for none of it"""
+        with startup_report.phase("grpc channels"):
+            default_channel_manager.warm_up()
+        with startup_report.phase("llm connection"):
+            self.gpt_handler.warm_up()
+        if SEMANTIC_CACHE_SETTINGS['enabled']:
+            with startup_report.phase("embedding model"):
+                self.answer_cache.encode(DOCUMENT_START)
+        if TTS_CACHE_SETTINGS['prewarm'] and hasattr(self.speech_synthesizer, 'prewarm_cache'):
+            with startup_report.phase("tts cache"):
+                self.speech_synthesizer.prewarm_cache()
+
+    def audio_generator(self, session: CallSession) -> Generator:
         """Generate audio chunks for streaming"""
+        session.audio_recorder.start_recording(session.call_id)
+        session.sample_rate = getattr(session.audio_recorder, 'sample_rate', session.sample_rate)
         yield stt_pb2.StreamingRequest(
-            session_options=self.speech_recognizer.get_recognition_options()
+            session_options=self.speech_recognizer.get_recognition_options(session.sample_rate)
         )
 
-        self.audio_recorder.start_recording()
-        self.is_recording = True
+        session.is_recording = True
+        if VAD_SETTINGS['enabled']:
+            session.vad = VoiceActivityDetector(rate=session.sample_rate)
+
+        try:
+            while session.is_recording:
+                chunk = session.audio_recorder.record_chunk()
+                if session.vad is None:
+                    if not session.trace.active:
+                        session.trace.start()
+                    yield stt_pb2.StreamingRequest(chunk=stt_pb2.AudioChunk(data=chunk))
+                    continue
+                yield from self._vad_requests(session, chunk)
+        finally:
+            session.audio_recorder.stop_recording()
+
+    def _vad_requests(self, session: CallSession, chunk: bytes) -> Generator:
+        """Forward speech, report held-back silence by duration and force end of utterance"""
+        decision = session.vad.process(chunk)
+        if session.speaking and VAD_SETTINGS['barge_in']:
+            session.barge_in_speech_ms = session.barge_in_speech_ms + decision.duration_ms if decision.speech else 0
+            if session.barge_in_speech_ms >= VAD_SETTINGS['barge_in_min_speech_ms']:
+                session.barge_in.set()
+        if decision.send:
+            if decision.speech and not session.trace.active:
+                session.trace.start()
+            if session.pending_silence_ms:
+                yield self._silence_request(session)
+            yield stt_pb2.StreamingRequest(chunk=stt_pb2.AudioChunk(data=chunk))
+        else:
+            session.pending_silence_ms += decision.duration_ms
+        if decision.end_of_utterance:
+            session.trace.mark("audio_capture")
+            session.last_recognition_time = time.time()
+            if session.pending_silence_ms:
+                yield self._silence_request(session)
+            yield stt_pb2.StreamingRequest(eou=stt_pb2.Eou())
+        elif session.pending_silence_ms >= VAD_SETTINGS['silence_flush_ms']:
+            yield self._silence_request(session)
+
+    def _silence_request(self, session: CallSession) -> stt_pb2.StreamingRequest:
+        duration_ms = int(session.pending_silence_ms)
+        session.pending_silence_ms = 0
+        return stt_pb2.StreamingRequest(silence_chunk=stt_pb2.SilenceChunk(duration_ms=duration_ms))
+
+    def _pipeline(self, texts: Iterable[str], start, drain, cancel_event: Optional[threading.Event]) -> Generator:
+        """Run start(text) for up to max_in_flight texts ahead and yield from drain(job) in text order.
+
+        texts may be a lazy stream (e.g. sentences arriving from the LLM); it is consumed
+        on a feeder thread so waiting for the next text never delays playback.
+        Setting cancel_event stops the feeder and aborts pending and running synthesis.
+        """
+        in_flight = threading.Semaphore(TTS_SETTINGS['max_in_flight'])
+        jobs = queue.Queue()
+        stopped = threading.Event()
 
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        def feed():
+            try:
+                for text in texts:
+                    in_flight.acquire()
+                    if stopped.is_set() or cancelled():
+                        break
+                    jobs.put(start(text))
+            except Exception as e:
+                self.logger.error(f"Error reading text for synthesis: {e}")
+            finally:
+                jobs.put(None)
+
+        threading.Thread(target=feed, daemon=True).start()
         try:
-            while self.is_recording:
-                chunk = self.audio_recorder.record_chunk()
-                yield stt_pb2.StreamingRequest(chunk=stt_pb2.AudioChunk(data=chunk))
+            while True:
+                job = jobs.get()
+                if job is None or cancelled():
+                    break
+                yield from drain(job)
+                in_flight.release()
         finally:
-            self.audio_recorder.stop_recording()
+            stopped.set()
+            in_flight.release()
+            while True:
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.cancel()
+
+    def synthesize_pipelined(self, texts: Iterable[str], cancel_event: Optional[threading.Event] = None,
+                             trace: Optional[TurnTrace] = None) -> Generator:
+        """Yield synthesized segments in order while the following ones are synthesized concurrently"""
+        def synthesize(text: str):
+            if trace is None:
+                return self.speech_synthesizer.synthesize_speech(text, cancel_event=cancel_event)
+            with trace.span("tts_synthesis"):
+                return self.speech_synthesizer.synthesize_speech(text, cancel_event=cancel_event)
+
+        return self._pipeline(
+            texts,
+            lambda text: self.tts_executor.submit(synthesize, text),
+            lambda future: [future.result()],
+            cancel_event,
+        )
+
+    def stream_pipelined(self, texts: Iterable[str], cancel_event: Optional[threading.Event] = None,
+                         trace: Optional[TurnTrace] = None) -> Generator:
+        """Yield audio chunks in text order as they arrive, synthesizing following texts concurrently.
+
+        An empty chunk follows the audio of every text.
+        """
+        def run(text: str, chunks: queue.Queue):
+            start = time.perf_counter()
+            first = True
+            try:
+                for chunk in self.speech_synthesizer.iter_speech(text, cancel_event=cancel_event):
+                    if first and trace is not None:
+                        trace.observe("tts_first_byte", time.perf_counter() - start)
+                    first = False
+                    chunks.put(chunk)
+            finally:
+                chunks.put(None)
+
+        def start(text: str):
+            chunks = queue.Queue()
+            future = self.tts_executor.submit(run, text, chunks)
+            future.chunks = chunks
+            return future
 
-    def check_for_pause(self) -> bool:
-        """Check if there has been a pause in speech"""
-        current_time = time.time()
-        time_since_last_recognition = current_time - self.last_recognition_time
-        return time_since_last_recognition >= self.pause_threshold
+        def drain(future):
+            while True:
+                chunk = future.chunks.get()
+                if chunk is None:
+                    yield b''
+                    return
+                yield chunk
+
+        return self._pipeline(texts, start, drain, cancel_event)
+
+    def _mark_playback(self, session: CallSession):
+        """Record when the first audio of the answer reaches the caller"""
+        if "playback_start" in session.trace.marks:
+            return
+        response = session.trace.since("stt_final")
+        session.trace.mark("playback_start")
+        if response is not None:
+            session.trace.observe("response", response)
 
-    def process_buffered_text(self, lang_code="ru"):
+    def play_texts(self, session: CallSession, texts: Iterable[str]):
+        """Synthesize texts and play them to the caller in order, stopping on barge-in"""
+        if (TTS_SETTINGS['stream_output'] and session.stream_audio is not None
+                and hasattr(self.speech_synthesizer, 'iter_speech')):
+            for chunk in self.stream_pipelined(texts, cancel_event=session.barge_in, trace=session.trace):
+                if session.barge_in.is_set():
+                    break
+                if chunk:
+                    self._mark_playback(session)
+                session.stream_audio(chunk)
+        elif TTS_SETTINGS['pipelined']:
+            for audio_segment in self.synthesize_pipelined(texts, cancel_event=session.barge_in, trace=session.trace):
+                if session.barge_in.is_set():
+                    break
+                if audio_segment:
+                    self._mark_playback(session)
+                    session.play_audio(audio_segment)
+        else:
+            for text in texts:
+                with session.trace.span("tts_synthesis"):
+                    audio_segment = self.speech_synthesizer.synthesize_speech(text, cancel_event=session.barge_in)
+                if session.barge_in.is_set():
+                    break
+                if audio_segment:
+                    self._mark_playback(session)
+                    session.play_audio(audio_segment)
+
+    def load_answer_pack(self):
+        """Open the pre-synthesized answer audio and the retrieval index it is keyed by"""
+        from .audio.answer_pack import AnswerPack
+        from .rag.local_loader_v1 import DocumentLoader
+
+        pack_path = BASE_DIR / "data" / RAG_INDEX_SETTINGS['dir_name'] / ANSWER_PACK_SETTINGS['file']
+        if not pack_path.exists():
+            self.logger.warning(f"Answer pack {pack_path} not found; build it with `python -m src.audio.answer_pack`")
+            return
+        try:
+            answer_pack = AnswerPack(pack_path, self.speech_synthesizer.output_format)
+        except ValueError as e:
+            self.logger.warning(f"Answer pack disabled: {e}")
+            return
+        self.document_loader = DocumentLoader()
+        self.answer_pack = answer_pack
+        self.logger.info(f"Loaded {len(self.answer_pack)} pre-synthesized answers")
+
+    def play_packed_answer(self, session: CallSession, text: str) -> bool:
+        """Stream the pack audio of a confidently retrieved answer; False if there is none"""
+        if self.answer_pack is None:
+            return False
+        with session.trace.span("retrieval"):
+            matches = self.document_loader.search_records(text, top_k=1)
+        if not matches or matches[0][1] < ANSWER_PACK_SETTINGS['threshold']:
+            return False
+        record, score = matches[0]
+        doc_id = record_key(record)
+        # Entries synthesized from an answer that has since been edited are skipped
+        segments = self.answer_pack.segments(doc_id, record_field(record, "answer") or "") if doc_id else None
+        if not segments:
+            return False
+        self.logger.info(f"[{session.call_id}] Serving pre-synthesized answer {doc_id} ({score:.3f})")
+        for segment in segments:
+            if session.barge_in.is_set():
+                return True
+            self._mark_playback(session)
+            session.play_audio(self.speech_synthesizer.load_audio(segment))
+        self.play_texts(session, [DOCUMENT_END])
+        return True
+
+    def _collect(self, sentences: Iterable[str], answer: List[str]) -> Generator:
+        for sentence in sentences:
+            answer.append(sentence)
+            yield sentence
+
+    def _timed_response(self, session: CallSession, sentences: Iterable[str], started: float) -> Generator:
+        yield from sentences
+        session.trace.observe("llm_total", time.perf_counter() - started)
+
+    def remember_answer(self, text: str, answer: Optional[str]):
+        if SEMANTIC_CACHE_SETTINGS['enabled'] and answer:
+            self.cache_executor.submit(self._store_answer, text, answer)
+
+    def _store_answer(self, text: str, answer: str):
+        try:
+            self.answer_cache.store(text, answer)
+        except Exception as e:
+            self.logger.error(f"Error caching answer: {e}")
+
+    def process_buffered_text(self, session: CallSession, lang_code="ru"):
         """Process the buffered text and send to GPT"""
-        if not self.recognized_text_buffer:
+        if not session.recognized_text_buffer:
             return
 
-        combined_text = " ".join(self.recognized_text_buffer).strip()
+        combined_text = " ".join(session.recognized_text_buffer).strip()
         if not combined_text:
             return
-        self.logger.info(f"User: {combined_text}")
-        segments = []
+        self.logger.info(f"[{session.call_id}] User: {combined_text}")
 
-        gpt_response = self.gpt_handler.generate_response_from_text(combined_text)
-        if gpt_response == "NO_CONTEXT":
-            audio_segment = self.speech_synthesizer.synthesize_speech(DOCUMENT_NON_EXISTING)
-            self.speech_synthesizer.play_audio(audio_segment)
-        else:
-            chunks = self.gpt_handler.split_text_into_chunks(gpt_response)
-            for chunk in chunks:
-                audio_segment = self.speech_synthesizer.synthesize_speech(chunk)
-                segments.append(audio_segment)
-            segments.append(self.speech_synthesizer.synthesize_speech(DOCUMENT_END))
-            self.speech_synthesizer.play_audio_segments(segments)
-        
-        self.recognized_text_buffer = []
-
-    def process_recognition_result(self, result):
+        session.barge_in.clear()
+        session.speaking = True
+        try:
+            if self.play_packed_answer(session, combined_text):
+                session.recognized_text_buffer = []
+                return
+
+            gpt_response = None
+            if SEMANTIC_CACHE_SETTINGS['enabled']:
+                with session.trace.span("answer_cache"):
+                    gpt_response = self.answer_cache.lookup(combined_text)
+            # Speculative answers came from the LLM, so they are cached like any other
+            from_cache = gpt_response is not None
+            if SPECULATION_SETTINGS['enabled']:
+                if gpt_response is None:
+                    gpt_response = self.speculator.resolve(session, combined_text)
+                else:
+                    self.speculator.discard(session)
+
+            if gpt_response is None and FASTAPI_SETTINGS['stream']:
+                llm_started = time.perf_counter()
+                sentences = self.gpt_handler.generate_response_stream(combined_text, cancel_event=session.barge_in)
+                first_sentence = next(sentences, None)
+                session.trace.observe("llm_ttfb", time.perf_counter() - llm_started)
+                sentences = self._timed_response(session, sentences, llm_started)
+                if first_sentence is None or first_sentence == NO_CONTEXT:
+                    self.play_texts(session, [DOCUMENT_NON_EXISTING])
+                    if first_sentence == NO_CONTEXT:
+                        self.remember_answer(combined_text, NO_CONTEXT)
+                else:
+                    answer = [first_sentence]
+                    self.play_texts(session, chain([first_sentence], self._collect(sentences, answer), [DOCUMENT_END]))
+                    if not session.barge_in.is_set():
+                        self.remember_answer(combined_text, " ".join(answer))
+            else:
+                if gpt_response is None:
+                    # The whole answer arrives in one body, so its first byte is its last
+                    llm_started = time.perf_counter()
+                    gpt_response = self.gpt_handler.generate_response_from_text(combined_text)
+                    session.trace.observe("llm_ttfb", time.perf_counter() - llm_started)
+                    session.trace.observe("llm_total", time.perf_counter() - llm_started)
+                if not from_cache:
+                    self.remember_answer(combined_text, gpt_response)
+                if gpt_response == NO_CONTEXT:
+                    self.play_texts(session, [DOCUMENT_NON_EXISTING])
+                else:
+                    chunks = self.gpt_handler.split_text_into_chunks(gpt_response)
+                    chunks.append(DOCUMENT_END)
+                    self.play_texts(session, chunks)
+        finally:
+            session.speaking = False
+            session.trace.finish()
+            if session.barge_in.is_set():
+                self.logger.info(f"[{session.call_id}] Caller interrupted the answer")
+
+        session.recognized_text_buffer = []
+
+    def process_recognition_result(self, session: CallSession, result):
         """Process recognition results and generate GPT response"""
         event_type = result.WhichOneof('Event')
         alternatives = None
 
         if event_type == 'final_refinement':
             alternatives = [a.text for a in result.final_refinement.normalized_text.alternatives]
-            self.last_recognition_time = time.time()
-            self.recognized_text_buffer.append(alternatives[0])
+            session.trace.mark("stt_final")
+            session.last_recognition_time = time.time()
+            session.recognized_text_buffer.append(alternatives[0])
+        elif event_type == 'partial':
+            alternatives = [a.text for a in result.partial.alternatives]
+            if alternatives and alternatives[0]:
+                session.trace.mark("stt_first_partial")
+                if SPECULATION_SETTINGS['enabled']:
+                    self.speculator.on_partial(session, alternatives[0])
 
-        if self.recognized_text_buffer:
-            self.process_buffered_text()
+        if session.recognized_text_buffer:
+            self.process_buffered_text(session)
+
+    def handle_call(self, session: CallSession):
+        """Run one full conversation: greeting, then recognize -> LLM -> TTS until the audio ends"""
+        call_context = bind_call_id(session.call_id)
+        try:
+            audio_segment = self.speech_synthesizer.synthesize_speech(DOCUMENT_START)
+            if audio_segment:
+                session.play_audio(audio_segment)
+
+            session.reset()
+            recognition_stream = self.speech_recognizer.recognize_stream(self.audio_generator(session))
+            for result in recognition_stream:
+                self.process_recognition_result(session, result)
+        finally:
+            session.is_recording = False
+            self.speculator.discard(session)
+            call_id_var.reset(call_context)
 
     def run(self):
         """Main run loop"""
+        from .audio.recorder import AudioRecorder
+
         print("Voice Assistant started. Press Ctrl+C to stop.")
         print("Speak into the microphone. The system will process your speech after you pause.")
+        audio_recorder = AudioRecorder()
+        if METRICS_SETTINGS['enabled']:
+            start_metrics_server()
         try:
             while True:
                 print("\nPress Enter to start recording (Ctrl+C to exit)...")
                 input()
-                
-                audio_segment = self.speech_synthesizer.synthesize_speech(DOCUMENT_START)
-                if audio_segment:
-                    self.speech_synthesizer.play_audio(audio_segment)
-                    
-                self.last_recognition_time = time.time()
-                self.recognized_text_buffer = []
-                
-                recognition_stream = self.speech_recognizer.recognize_stream(self.audio_generator())
-                
-                for result in recognition_stream:
-                    self.process_recognition_result(result)
-                
-                self.audio_recorder.cleanup()
-                self.is_recording = False
+
+                session = CallSession(
+                    audio_recorder=audio_recorder,
+                    play_audio=self.speech_synthesizer.play_audio,
+                    stream_audio=getattr(self.speech_synthesizer, 'stream_audio', None),
+                )
+                self.handle_call(session)
+                audio_recorder.cleanup()
 
         except KeyboardInterrupt:
             print("\nStopping Voice Assistant...")
-            self.audio_recorder.cleanup()
+            audio_recorder.cleanup()
             self.speech_synthesizer.cleanup()
+            self.gpt_handler.close()
             sys.exit(0)
         except Exception as e:
             print(f"Error: {e}")
-            self.audio_recorder.cleanup()
+            audio_recorder.cleanup()
             self.speech_synthesizer.cleanup()
+            self.gpt_handler.close()
             sys.exit(1)
 
 if __name__ == "__main__":
     assistant = VoiceAssistant()
-    assistant.run() 
\ No newline at end of file
+    assistant.run()
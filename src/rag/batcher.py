@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from ..utils.logger import default_logger
+from ..utils.metrics import MetricsRegistry, default_metrics
+from ..utils.config import EMBEDDING_BATCH_SETTINGS
+
+BATCH_SIZE_METRIC = "voice_embedding_batch_size"
+QUEUE_WAIT_METRIC = "voice_embedding_queue_wait_seconds"
+
+
+class _Request:
+    __slots__ = ("text", "top_k", "index", "future", "queued")
+
+    def __init__(self, text: str, top_k: int, index=None):
+        self.text = text
+        self.top_k = top_k
+        self.index = index
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """Runs the query embeddings and index searches of concurrent calls as batches.
+
+    Callers block on encode() or search() while a single thread collects pending queries
+    and flushes them after max_batch queries or max_wait_ms after the first one, whichever
+    comes first. Each flush is one encode of all texts and one search per index of those
+    that asked for neighbours; results are handed back to every caller.
+    """
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], index=None, name: str = "query",
+                 max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 registry: MetricsRegistry = default_metrics):
+        self.logger = default_logger.getChild("EmbeddingBatcher")
+        self._encode = encode
+        self.index = index
+        self.max_batch = max_batch or EMBEDDING_BATCH_SETTINGS['max_batch']
+        wait_ms = EMBEDDING_BATCH_SETTINGS['max_wait_ms'] if max_wait_ms is None else max_wait_ms
+        self.max_wait = wait_ms / 1000
+        self._batch_sizes = registry.histogram(BATCH_SIZE_METRIC, EMBEDDING_BATCH_SETTINGS['size_buckets'],
+                                               batcher=name)
+        self._queue_waits = registry.histogram(QUEUE_WAIT_METRIC, EMBEDDING_BATCH_SETTINGS['wait_buckets'],
+                                               batcher=name)
+        self._queue = queue.SimpleQueue()
+        threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True).start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embeddings of texts, one row per text; same contract as the embedding backends"""
+        futures = [self._submit(text, 0) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def search(self, text: str, top_k: int, index=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and ids of the top_k nearest entries to text in index (default: self.index)"""
+        return self._submit(text, top_k, index if index is not None else self.index).result()
+
+    def _submit(self, text: str, top_k: int, index=None) -> Future:
+        request = _Request(text, top_k, index)
+        self._queue.put(request)
+        return request.future
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = batch[0].queued + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                # Past the deadline, still take whatever is already queued
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.perf_counter())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._batch_sizes.observe(len(batch))
+            for request in batch:
+                self._queue_waits.observe(started - request.queued)
+            try:
+                self._flush(batch)
+            except Exception as e:
+                self.logger.error(f"Batch of {len(batch)} queries failed: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _flush(self, batch: List[_Request]):
+        vectors = np.asarray(self._encode([request.text for request in batch]), dtype=np.float32)
+        # Queries of a batch may target different index snapshots while one is being swapped in
+        groups = {}
+        for i, request in enumerate(batch):
+            if request.top_k:
+                groups.setdefault(id(request.index), []).append(i)
+        for searched in groups.values():
+            top_k = max(batch[i].top_k for i in searched)
+            distances, indices = batch[searched[0]].index.search(vectors[searched], top_k)
+            for row, i in enumerate(searched):
+                request = batch[i]
+                request.future.set_result((distances[row, :request.top_k], indices[row, :request.top_k]))
+        for request, vector in zip(batch, vectors):
+            if not request.top_k:
+                request.future.set_result(vector)
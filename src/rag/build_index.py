@@ -0,0 +1,114 @@
+import argparse
+import json
+import pickle
+import time
+from pathlib import Path
+from typing import Any, List, Tuple
+import faiss
+import numpy as np
+from ..utils.config import BASE_DIR, RAG_INDEX_SETTINGS
+from .metadata_store import record_text, write_metadata_store
+
+
+def load_records(path: Path) -> List[Any]:
+    if path.suffix == ".pkl":
+        with open(path, "rb") as f:
+            return list(pickle.load(f))
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_vectors(args, records: List[Any]) -> np.ndarray:
+    if args.embeddings:
+        vectors = np.load(args.embeddings)
+    elif args.from_index:
+        index = faiss.read_index(str(args.from_index))
+        vectors = index.reconstruct_n(0, index.ntotal)
+    else:
+        from .embeddings import load_embedding_backend
+        model = load_embedding_backend()
+        texts = [record_text(record) for record in records]
+        vectors = np.concatenate([
+            model.encode(texts[i:i + args.batch_size]) for i in range(0, len(texts), args.batch_size)
+        ])
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) != len(records):
+        raise ValueError(f"{len(vectors)} vectors for {len(records)} metadata records")
+    return vectors
+
+
+def build(kind: str, vectors: np.ndarray, nlist: int, hnsw_m: int) -> faiss.Index:
+    """Build an inner-product index (embeddings are normalized, so scores are cosine similarities)"""
+    dim = vectors.shape[1]
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "ivf":
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = RAG_INDEX_SETTINGS['nprobe']
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = RAG_INDEX_SETTINGS['ef_search']
+    else:
+        raise ValueError(f"Unknown index type: {kind}")
+    index.add(vectors)
+    return index
+
+
+def evaluate(index: faiss.Index, exact: faiss.Index, queries: np.ndarray, k: int) -> Tuple[float, float]:
+    """Return recall@k against exact search and mean per-query latency in ms"""
+    _, truth = exact.search(queries, k)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, found = index.search(queries[i:i + 1], k)
+        if i == 0:
+            results = np.empty((len(queries), k), dtype=found.dtype)
+        results[i] = found[0]
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    hits = sum(len(set(truth[i]) & set(results[i])) for i in range(len(queries)))
+    return hits / truth.size, latency_ms
+
+
+def main():
+    default_dir = BASE_DIR / "data" / RAG_INDEX_SETTINGS['dir_name']
+    parser = argparse.ArgumentParser(description="Build the FAISS index and metadata store for DocumentLoader")
+    parser.add_argument("--metadata", type=Path, default=default_dir / RAG_INDEX_SETTINGS['legacy_metadata_file'],
+                        help="metadata.pkl or a JSONL file of QA records")
+    parser.add_argument("--embeddings", type=Path, help="precomputed .npy embeddings in metadata order")
+    parser.add_argument("--from-index", type=Path, help="reuse the vectors of an existing flat index")
+    parser.add_argument("--output-dir", type=Path, default=default_dir)
+    parser.add_argument("--type", choices=["flat", "ivf", "hnsw"], nargs="+", default=["flat"],
+                        help="index types to build and report; the first one is written out")
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500, help="corpus vectors sampled as evaluation queries")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    records = load_records(args.metadata)
+    vectors = load_vectors(args, records)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + rng.normal(scale=0.01, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = build("flat", vectors, args.nlist, args.hnsw_m)
+    k = min(args.top_k, len(vectors))
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    for i, kind in enumerate(args.type):
+        start = time.perf_counter()
+        index = build(kind, vectors, args.nlist, args.hnsw_m)
+        build_s = time.perf_counter() - start
+        recall, latency_ms = evaluate(index, exact, queries, k)
+        print(f"{kind:>5}: build {build_s:.2f}s  recall@{k} {recall:.4f}  latency {latency_ms:.3f} ms/query")
+        if i == 0:
+            faiss.write_index(index, str(args.output_dir / RAG_INDEX_SETTINGS['index_file']))
+
+    count = write_metadata_store(args.output_dir / RAG_INDEX_SETTINGS['metadata_file'], records)
+    print(f"Wrote {args.type[0]} index and {count} metadata records to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from ..utils.logger import default_logger
+from ..utils.config import EMBEDDING_MODEL_SETTINGS
+
+logger = default_logger.getChild("Embeddings")
+
+
+def select_device() -> str:
+    """Pick 'cuda' when a GPU is usable, 'cpu' otherwise"""
+    device = EMBEDDING_MODEL_SETTINGS['device']
+    if device != 'auto':
+        return device
+    try:
+        import torch
+    except ImportError:
+        return 'cpu'
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class SentenceTransformerBackend:
+    """Reference backend: the sentence-transformers model on CPU or GPU"""
+    name = "sentence_transformers"
+
+    def __init__(self, model_path: str, device: str, threads: Optional[int] = None):
+        from sentence_transformers import SentenceTransformer
+        if device == 'cpu' and threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.device = device
+        self.model = SentenceTransformer(model_path, device=device)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32)
+
+
+class OnnxEmbeddingBackend:
+    """CPU backend: the same model exported to ONNX, optionally int8-quantized, run by ONNX Runtime"""
+    name = "onnx"
+
+    def __init__(self, model_path: str, threads: Optional[int] = None, quantized: bool = True):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        self.model_path = Path(model_path)
+        onnx_path = self.model_path / EMBEDDING_MODEL_SETTINGS['onnx_file']
+        if quantized:
+            onnx_path = quantize_onnx_model(onnx_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_path))
+        self.pooling = self._read_pooling_mode()
+        self.device = 'cpu'
+
+    def _read_pooling_mode(self) -> str:
+        config_path = self.model_path / "1_Pooling" / "config.json"
+        if config_path.exists():
+            with open(config_path) as f:
+                config = json.load(f)
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+        return "mean"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        inputs = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+        hidden = self.session.run(None, inputs)[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return _normalize(pooled)
+
+
+def quantize_onnx_model(onnx_path: Path) -> Path:
+    """Return the int8 dynamically-quantized copy of onnx_path, creating it on first use.
+
+    Workers may start at the same time, so each quantizes to its own temporary file and
+    renames it into place; a reader never sees a partially written model.
+    """
+    quantized_path = onnx_path.with_name(f"{onnx_path.stem}.int8.onnx")
+    if not quantized_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info(f"Quantizing {onnx_path} to int8")
+        tmp_path = quantized_path.with_name(f"{quantized_path.name}.{os.getpid()}.tmp")
+        try:
+            quantize_dynamic(str(onnx_path), str(tmp_path), weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return quantized_path
+
+
+def load_embedding_backend(model_path: Optional[str] = None):
+    """Create the embedding backend selected in EMBEDDING_MODEL_SETTINGS['backend']"""
+    model_path = model_path or EMBEDDING_MODEL_SETTINGS['path']
+    backend = EMBEDDING_MODEL_SETTINGS['backend']
+    threads = EMBEDDING_MODEL_SETTINGS['threads']
+    device = select_device()
+    has_onnx = (Path(model_path) / EMBEDDING_MODEL_SETTINGS['onnx_file']).exists()
+
+    if backend == 'auto':
+        backend = 'onnx' if device == 'cpu' and has_onnx else 'sentence_transformers'
+    if backend == 'onnx':
+        model = OnnxEmbeddingBackend(model_path, threads, EMBEDDING_MODEL_SETTINGS['quantized'])
+    else:
+        model = SentenceTransformerBackend(model_path, device, threads)
+    logger.info(f"Embedding backend: {model.name} on {model.device}")
+    return model
+
+
+def verify_backend(candidate, reference, sentences: List[str], tolerance: Optional[float] = None) -> float:
+    """Check that candidate embeddings match the reference model; returns the lowest cosine similarity"""
+    tolerance = EMBEDDING_MODEL_SETTINGS['tolerance'] if tolerance is None else tolerance
+    similarity = np.sum(candidate.encode(sentences) * reference.encode(sentences), axis=1)
+    worst = float(similarity.min())
+    if worst < 1.0 - tolerance:
+        raise ValueError(f"Embedding backend {candidate.name} deviates from reference: min cosine {worst:.4f}")
+    return worst
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the configured embedding backend with the reference model")
+    parser.add_argument("sentences", nargs="*", default=["Как вернуть билет?", "Можно ли поменять дату поездки?"])
+    args = parser.parse_args()
+
+    candidate = load_embedding_backend()
+    reference = SentenceTransformerBackend(EMBEDDING_MODEL_SETTINGS['path'], select_device())
+    print(f"min cosine similarity: {verify_backend(candidate, reference, args.sentences):.5f}")
+
+    candidate.encode(args.sentences[:1])
+    start = time.perf_counter()
+    for _ in range(20):
+        candidate.encode(args.sentences[:1])
+    print(f"query latency: {(time.perf_counter() - start) / 20 * 1000:.2f} ms")
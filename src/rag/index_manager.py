@@ -0,0 +1,431 @@
+import base64
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from ..utils.logger import default_logger
+from ..utils.config import RAG_INDEX_SETTINGS, LEXICAL_SETTINGS, ANSWER_PACK_SETTINGS
+from .lexical import LexicalIndex
+from .metadata_store import (
+    record_field, record_from_json, record_key, record_text, record_to_json, write_metadata_store,
+)
+
+
+def resolve_generation(docs_dir: Path) -> Tuple[str, Path]:
+    """Name and directory of the generation in use; ("", docs_dir) when there is no pointer file"""
+    pointer = docs_dir / RAG_INDEX_SETTINGS['current_file']
+    try:
+        name = pointer.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        name = ""
+    return name, docs_dir / name if name else docs_dir
+
+
+def publish_generation(docs_dir: Path, name: str):
+    """Point readers at generation name; the rename makes the switch atomic"""
+    pointer = docs_dir / RAG_INDEX_SETTINGS['current_file']
+    tmp_path = pointer.with_suffix(".tmp")
+    tmp_path.write_text(name + "\n", encoding="utf-8")
+    tmp_path.replace(pointer)
+
+
+class BaseGeneration:
+    """Index and metadata files of one generation, with its lexical index.
+
+    The lexical index is built once per generation while streaming the records; the id ->
+    row map only writers need is built on first use. Closed when the last snapshot built on
+    it is released.
+    """
+    def __init__(self, name: str, path: Path, load_index: Callable, load_metadata: Callable):
+        self.name = name
+        self.path = path
+        self.index = load_index(path / RAG_INDEX_SETTINGS['index_file'])
+        self.metadata = load_metadata(path)
+        self.size = len(self.metadata)
+        self.lexical = None
+        if LEXICAL_SETTINGS['enabled']:
+            self.lexical = LexicalIndex(record_text(record) for record in self.metadata)
+        self._keys: Optional[Dict[str, int]] = None
+        self._keys_lock = threading.Lock()
+        self.refs = 0
+
+    def key_rows(self) -> Dict[str, int]:
+        """Row of every record id in the generation's metadata"""
+        with self._keys_lock:
+            if self._keys is None:
+                keys = {}
+                for row, record in enumerate(self.metadata):
+                    key = record_key(record)
+                    if key is not None:
+                        keys[key] = row
+                self._keys = keys
+            return self._keys
+
+    @property
+    def log_path(self) -> Path:
+        return self.path / RAG_INDEX_SETTINGS['log_file']
+
+    def close(self):
+        if hasattr(self.metadata, "close"):
+            self.metadata.close()
+        self.index = None
+        self.lexical = None
+        self._keys = None
+
+
+class IndexSnapshot:
+    """An immutable view of the knowledge base: a base generation plus the updates logged on top.
+
+    Updated or deleted base rows are tombstoned; current versions of updated and added
+    records live in a small ID-mapped flat index searched next to the base index, and in
+    an overlay on the base lexical index. keys maps the ids touched by the log to their
+    row, or to None once deleted.
+    """
+    def __init__(self, base: BaseGeneration, keys: Dict[str, Optional[int]], records: Dict[int, Any],
+                 vectors: Dict[int, np.ndarray], tombstones: Set[int], log_offset: int):
+        self.base = base
+        self.keys = keys
+        self.records = records
+        self.vectors = vectors
+        self.tombstones = tombstones
+        self.log_offset = log_offset
+        self.next_row = max(base.size, max(records, default=-1) + 1)
+        self.refs = 1
+
+        self.delta = None
+        if vectors:
+            import faiss
+            rows = np.fromiter(vectors, dtype=np.int64, count=len(vectors))
+            matrix = np.ascontiguousarray(np.stack([vectors[row] for row in rows]), dtype=np.float32)
+            self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(matrix.shape[1]))
+            self.delta.add_with_ids(matrix, rows)
+
+        self.lexical = base.lexical
+        if self.lexical is not None and (tombstones or records):
+            changes = {row: "" for row in tombstones}
+            changes.update((row, record_text(record)) for row, record in records.items())
+            self.lexical = self.lexical.updated(changes, self.next_row)
+
+    def row_for(self, key: str) -> Optional[int]:
+        """Current row of the record with id key, None when there is none"""
+        if key in self.keys:
+            return self.keys[key]
+        row = self.base.key_rows().get(key)
+        return None if row in self.tombstones else row
+
+    def record(self, row: int) -> Any:
+        if row in self.records:
+            return self.records[row]
+        return self.base.metadata[row]
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """faiss-style search over the base index and the updates"""
+        if not self.tombstones and self.delta is None:
+            return self.base.index.search(vectors, k)
+        fetch = k + min(len(self.tombstones), RAG_INDEX_SETTINGS['max_overfetch'])
+        distances, indices = self.base.index.search(vectors, fetch)
+        if self.delta is not None:
+            delta_distances, delta_indices = self.delta.search(vectors, k)
+        out_distances = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        out_indices = np.full((len(vectors), k), -1, dtype=np.int64)
+        for q in range(len(vectors)):
+            hits = [(d, i) for d, i in zip(distances[q], indices[q]) if i >= 0 and int(i) not in self.tombstones]
+            if self.delta is not None:
+                hits += [(d, i) for d, i in zip(delta_distances[q], delta_indices[q]) if i >= 0]
+            hits.sort(key=lambda hit: hit[0], reverse=True)
+            for j, (distance, row) in enumerate(hits[:k]):
+                out_distances[q, j] = distance
+                out_indices[q, j] = row
+        return out_distances, out_indices
+
+    def close(self):
+        self.delta = None
+        self.lexical = None
+
+
+class IndexManager:
+    """Serves searches from the current IndexSnapshot and swaps in new ones.
+
+    Writers append upserts and deletes to the generation's log (under an exclusive file
+    lock, so several processes can write); every process replays the log into a new
+    snapshot, and a watcher thread also loads a new generation once the pointer file names
+    one. Searches take a reference on the snapshot they started with, so a swap never
+    waits for them, and a snapshot (and finally its generation's files) is released when
+    the last search using it ends.
+    """
+    def __init__(self, docs_dir: Path, encode: Callable[[List[str]], np.ndarray],
+                 load_index: Callable, load_metadata: Callable):
+        self.logger = default_logger.getChild("IndexManager")
+        self.docs_dir = Path(docs_dir)
+        self._encode = encode
+        self._load_index = load_index
+        self._load_metadata = load_metadata
+        self._lock = threading.Lock()
+        self._update_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._current = self._load_generation()
+
+    def _new_snapshot(self, base: BaseGeneration, *state) -> IndexSnapshot:
+        snapshot = IndexSnapshot(base, *state)
+        with self._lock:
+            base.refs += 1
+        return snapshot
+
+    def _load_generation(self) -> IndexSnapshot:
+        name, path = resolve_generation(self.docs_dir)
+        base = BaseGeneration(name, path, self._load_index, self._load_metadata)
+        if base.index.ntotal != base.size:
+            self.logger.warning(f"{path}: {base.index.ntotal} vectors for {base.size} metadata records")
+        entries, offset = self._read_log(base.log_path, 0)
+        state = self._apply(base, {}, {}, {}, set(), entries)
+        snapshot = self._new_snapshot(base, *state, offset)
+        self.logger.info(f"Loaded index generation {name or '(base)'}: {base.size} records, {len(entries)} updates")
+        return snapshot
+
+    @staticmethod
+    def _read_log(path: Path, offset: int) -> Tuple[List[dict], int]:
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        # A line still being written is read on the next pass
+        end = data.rfind(b"\n") + 1
+        entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return entries, offset + end
+
+    @staticmethod
+    def _apply(base: BaseGeneration, keys: Dict[str, Optional[int]], records: Dict[int, Any], vectors: Dict[int, np.ndarray],
+               tombstones: Set[int], entries: List[dict]):
+        for entry in entries:
+            row, key = entry["row"], entry.get("key")
+            if row < base.size:
+                tombstones.add(row)
+            records.pop(row, None)
+            vectors.pop(row, None)
+            if key is not None:
+                keys[key] = None
+            if entry["op"] == "upsert":
+                records[row] = record_from_json(entry["record"])
+                vectors[row] = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+                if key is not None:
+                    keys[key] = row
+        return keys, records, vectors, tombstones
+
+    @contextmanager
+    def acquire(self) -> Iterator[IndexSnapshot]:
+        """The current snapshot, kept open until the block ends"""
+        with self._lock:
+            snapshot = self._current
+            snapshot.refs += 1
+        try:
+            yield snapshot
+        finally:
+            self._release(snapshot)
+
+    def _release(self, snapshot: IndexSnapshot):
+        with self._lock:
+            snapshot.refs -= 1
+            if snapshot.refs:
+                return
+            base = snapshot.base
+            base.refs -= 1
+            close_base = base.refs == 0
+        snapshot.close()
+        if close_base:
+            self.logger.info(f"Released index generation {base.name or '(base)'}")
+            base.close()
+
+    def _swap(self, snapshot: IndexSnapshot):
+        with self._lock:
+            old, self._current = self._current, snapshot
+        self._release(old)
+
+    def refresh(self):
+        """Load a newly published generation, then apply updates appended to the log"""
+        with self._update_lock:
+            name, _ = resolve_generation(self.docs_dir)
+            if name != self._current.base.name:
+                self._swap(self._load_generation())
+                return
+            current = self._current
+            entries, offset = self._read_log(current.base.log_path, current.log_offset)
+            if entries:
+                state = self._apply(current.base, dict(current.keys), dict(current.records), dict(current.vectors),
+                                    set(current.tombstones), entries)
+                self._swap(self._new_snapshot(current.base, *state, offset))
+                self.logger.info(f"Applied {len(entries)} index updates")
+
+    @contextmanager
+    def _locked_log(self):
+        """Exclusive lock on the current generation's log, after catching up with it"""
+        with self._update_lock:
+            while True:
+                self.refresh()
+                log = open(self._current.base.log_path, "ab")
+                fcntl.flock(log, fcntl.LOCK_EX)
+                # A compaction may have published a new generation while we waited for the lock
+                if resolve_generation(self.docs_dir)[0] == self._current.base.name:
+                    break
+                log.close()
+            try:
+                self.refresh()
+                yield log
+            finally:
+                log.close()
+
+    def _append(self, log, entry: dict):
+        log.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        log.flush()
+        os.fsync(log.fileno())
+        self.refresh()
+
+    def upsert(self, record: Any) -> int:
+        """Add record, or replace the record with the same id; returns its row"""
+        vector = np.asarray(self._encode([record_text(record)]), dtype=np.float32)[0]
+        key = record_key(record)
+        with self._locked_log() as log:
+            current = self._current
+            row = current.row_for(key) if key is not None else None
+            if row is None:
+                row = current.next_row
+            self._append(log, {
+                "op": "upsert",
+                "key": key,
+                "row": row,
+                "record": record_to_json(record),
+                "vector": base64.b64encode(vector.tobytes()).decode("ascii"),
+            })
+        return row
+
+    def delete(self, key: str) -> int:
+        """Remove the record with id key; returns its row"""
+        with self._locked_log() as log:
+            row = self._current.row_for(key)
+            if row is None:
+                raise KeyError(key)
+            self._append(log, {"op": "delete", "key": key, "row": row})
+        return row
+
+    def compact(self, kind: str = "flat", nlist: int = 256, hnsw_m: int = 32) -> str:
+        """Write base and updates as a new generation, publish it and return its name.
+
+        Rows are renumbered; the answer pack is keyed by document id and is pruned of
+        entries whose document was deleted or whose answer changed.
+        """
+        from .build_index import build
+
+        with self._locked_log():
+            current = self._current
+            rows = [row for row in range(current.next_row)
+                    if row in current.records or (row < current.base.size and row not in current.tombstones)]
+            if not rows:
+                raise ValueError("Nothing to compact: the knowledge base is empty")
+            records = [current.record(row) for row in rows]
+            vectors = self._vectors(current, rows)
+            name, path = self._new_generation_dir()
+            index = build(kind, vectors, nlist, hnsw_m)
+            import faiss
+            faiss.write_index(index, str(path / RAG_INDEX_SETTINGS['index_file']))
+            write_metadata_store(path / RAG_INDEX_SETTINGS['metadata_file'], records)
+            publish_generation(self.docs_dir, name)
+            self._prune_answer_pack(records, name)
+        self.refresh()
+        self.logger.info(f"Compacted {len(rows)} records into generation {name}")
+        return name
+
+    def _new_generation_dir(self) -> Tuple[str, Path]:
+        """Create the next gen-NNNNNN directory; numbers only grow, so names never collide"""
+        numbers = [int(path.name[4:]) for path in self.docs_dir.glob("gen-*") if path.name[4:].isdigit()]
+        number = max(numbers, default=0) + 1
+        while True:
+            name = f"gen-{number:06d}"
+            path = self.docs_dir / name
+            try:
+                path.mkdir(parents=True)
+                return name, path
+            except FileExistsError:
+                number += 1
+
+    def _prune_answer_pack(self, records: List[Any], generation: str):
+        from ..audio.answer_pack import answer_digest, prune_answer_pack
+
+        pack_path = self.docs_dir / ANSWER_PACK_SETTINGS['file']
+        if not pack_path.exists():
+            return
+        answers = {}
+        for record in records:
+            key, answer = record_key(record), record_field(record, "answer")
+            if key is not None and answer:
+                answers[key] = answer_digest(answer)
+        try:
+            kept, dropped = prune_answer_pack(pack_path, answers, generation)
+        except ValueError as e:
+            self.logger.warning(f"Answer pack not pruned: {e}")
+            return
+        self.logger.info(f"Answer pack: kept {kept} answers, dropped {dropped} deleted or edited ones")
+
+    def _vectors(self, snapshot: IndexSnapshot, rows: List[int]) -> np.ndarray:
+        vectors = []
+        for row in rows:
+            if row in snapshot.vectors:
+                vectors.append(snapshot.vectors[row])
+                continue
+            try:
+                vectors.append(snapshot.base.index.reconstruct(row))
+            except RuntimeError:
+                # Index types without a direct map cannot return stored vectors
+                vectors.append(np.asarray(self._encode([record_text(snapshot.base.metadata[row])]), dtype=np.float32)[0])
+        return np.ascontiguousarray(np.stack(vectors), dtype=np.float32)
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"Index refresh failed: {e}")
+
+    def start_watching(self, interval: Optional[float] = None):
+        threading.Thread(
+            target=self._watch, args=(interval or RAG_INDEX_SETTINGS['poll_seconds'],),
+            name="index-watch", daemon=True,
+        ).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    import argparse
+    from .local_loader_v1 import DocumentLoader, QADocument
+
+    parser = argparse.ArgumentParser(description="Update the knowledge index in place; running workers pick changes up")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upsert = commands.add_parser("upsert", help="Add or replace QA records from a JSONL file")
+    upsert.add_argument("records", type=Path)
+    delete = commands.add_parser("delete", help="Remove QA records by id")
+    delete.add_argument("ids", nargs="+")
+    compact = commands.add_parser("compact", help="Fold the update log into a new generation and publish it")
+    compact.add_argument("--type", choices=["flat", "ivf", "hnsw"], default="flat")
+    compact.add_argument("--nlist", type=int, default=256)
+    compact.add_argument("--hnsw-m", type=int, default=32)
+    args = parser.parse_args()
+
+    manager = DocumentLoader().indexes
+    if args.command == "upsert":
+        with open(args.records, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    fields = json.loads(line)
+                    row = manager.upsert(QADocument(**fields) if "question" in fields else fields)
+                    print(f"{fields.get('id')} -> row {row}")
+    elif args.command == "delete":
+        for key in args.ids:
+            print(f"{key} -> row {manager.delete(key)} deleted")
+    else:
+        print(f"Published generation {manager.compact(args.type, args.nlist, args.hnsw_m)}")
@@ -0,0 +1,183 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ..utils.config import LEXICAL_SETTINGS
+from ..utils.text import normalize_text
+
+
+def trigrams(key: str) -> Counter:
+    """Character trigrams of each space-padded word.
+
+    Russian questions differ mostly in word endings ("билет" / "билета"), so words are not
+    joined across spaces and the padding keeps word starts and ends distinct.
+    """
+    grams = Counter()
+    for word in key.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _add_postings(postings: Dict[str, Tuple[np.ndarray, np.ndarray]], idf: Dict[str, float], grams: Iterable[str],
+                  bm25: np.ndarray, matched: np.ndarray):
+    for gram in grams:
+        posting = postings.get(gram)
+        if posting is None:
+            continue
+        ids, weights = posting
+        # Ids are unique within a posting list, so fancy-index addition is exact
+        bm25[ids] += weights
+        matched[ids] += idf[gram]
+
+
+class LexicalIndex:
+    """Exact and character-trigram BM25 lookup of FAQ questions.
+
+    Questions are normalized (lowercase, ё -> е, no punctuation, filler words removed);
+    an exact hash maps those keys to their record id. Other queries are ranked by BM25 over
+    word trigrams, and the confidence of a match is the IDF-weighted overlap of the query's
+    and the question's trigrams (matched / union), so 1.0 means the same trigram set.
+    """
+    def __init__(self, texts: Iterable[str], k1: Optional[float] = None, b: Optional[float] = None,
+                 filler_words: Optional[Iterable[str]] = None):
+        self.k1 = LEXICAL_SETTINGS['k1'] if k1 is None else k1
+        self.b = LEXICAL_SETTINGS['b'] if b is None else b
+        self.filler_words = frozenset(LEXICAL_SETTINGS['filler_words'] if filler_words is None else filler_words)
+        self.exact: Dict[str, int] = {}
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            key = self.key(text)
+            grams = trigrams(key)
+            lengths.append(sum(grams.values()))
+            if not key:
+                continue
+            self.exact.setdefault(key, doc_id)
+            for gram, tf in grams.items():
+                ids, tfs = postings[gram]
+                ids.append(doc_id)
+                tfs.append(tf)
+
+        self.size = len(lengths)
+        lengths = np.array(lengths, dtype=np.float32)
+        self.avgdl = max(float(lengths.mean()) if self.size else 0.0, 1.0)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        self.doc_mass = np.zeros(self.size, dtype=np.float32)
+        for gram, (ids, tfs) in postings.items():
+            ids = np.array(ids, dtype=np.int32)
+            idf = math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[gram] = (ids, self.weights(idf, np.array(tfs, dtype=np.float32), lengths[ids]))
+            self.idf[gram] = idf
+            self.doc_mass[ids] += idf
+        # Trigrams no question contains count fully against the overlap
+        self.unseen_idf = math.log(1 + (self.size + 0.5) / 0.5)
+
+    def weights(self, idf: float, tfs: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * lengths / self.avgdl)
+        return (idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    def key(self, text: str) -> str:
+        return " ".join(word for word in normalize_text(text).split() if word not in self.filler_words)
+
+    def gram_idf(self, gram: str) -> float:
+        return self.idf.get(gram, self.unseen_idf)
+
+    def lookup(self, key: str) -> Optional[int]:
+        """Row whose normalized question is exactly key"""
+        return self.exact.get(key)
+
+    def scores(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 score and trigram-overlap confidence of every record for a normalized key"""
+        grams = trigrams(key)
+        bm25 = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=np.float32)
+        _add_postings(self.postings, self.idf, grams, bm25, matched)
+        query_mass = sum(self.gram_idf(gram) for gram in grams)
+        confidence = matched / np.maximum(query_mass + self.doc_mass - matched, 1e-9)
+        return bm25, confidence
+
+    def updated(self, changes: Dict[int, str], size: int) -> "LexicalOverlay":
+        """This index with the rows in changes replaced by new texts ("" removes a row)"""
+        return LexicalOverlay(self, changes, size)
+
+    @staticmethod
+    def top(bm25: np.ndarray, k: int) -> List[int]:
+        """Ids of the k best BM25 scores, best first, leaving out records sharing no trigram"""
+        k = min(k, len(bm25))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-bm25, k - 1)[:k]
+        candidates = candidates[np.argsort(-bm25[candidates])]
+        return [int(i) for i in candidates if bm25[i] > 0]
+
+
+class LexicalOverlay:
+    """A LexicalIndex with some rows replaced, removed or added, without rebuilding it.
+
+    Only the changed rows are indexed here, weighted with the base index's IDF and average
+    length, so building an overlay costs O(changes) and base postings are shared.
+    """
+    top = staticmethod(LexicalIndex.top)
+
+    def __init__(self, base: LexicalIndex, changes: Dict[int, str], size: int):
+        self.base = base
+        self.size = max(size, base.size)
+        self.changed = frozenset(changes)
+        self.masked = np.array(sorted(row for row in changes if row < base.size), dtype=np.int64)
+        self.exact: Dict[str, int] = {}
+
+        postings = defaultdict(lambda: ([], [], []))
+        masses = {}
+        for row, text in changes.items():
+            key = base.key(text)
+            if not key:
+                continue
+            self.exact.setdefault(key, row)
+            grams = trigrams(key)
+            length = sum(grams.values())
+            masses[row] = sum(base.gram_idf(gram) for gram in grams)
+            for gram, tf in grams.items():
+                ids, tfs, lengths = postings[gram]
+                ids.append(row)
+                tfs.append(tf)
+                lengths.append(length)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        for gram, (ids, tfs, lengths) in postings.items():
+            idf = base.gram_idf(gram)
+            self.postings[gram] = (
+                np.array(ids, dtype=np.int64),
+                base.weights(idf, np.array(tfs, dtype=np.float32), np.array(lengths, dtype=np.float32)),
+            )
+            self.idf[gram] = idf
+
+        self.doc_mass = np.zeros(self.size, dtype=np.float32)
+        self.doc_mass[:base.size] = base.doc_mass
+        self.doc_mass[self.masked] = 0.0
+        for row, mass in masses.items():
+            self.doc_mass[row] = mass
+
+    def key(self, text: str) -> str:
+        return self.base.key(text)
+
+    def lookup(self, key: str) -> Optional[int]:
+        row = self.exact.get(key)
+        if row is not None:
+            return row
+        row = self.base.lookup(key)
+        return None if row is None or row in self.changed else row
+
+    def scores(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        grams = trigrams(key)
+        bm25 = np.zeros(self.size, dtype=np.float32)
+        matched = np.zeros(self.size, dtype=np.float32)
+        _add_postings(self.base.postings, self.base.idf, grams, bm25, matched)
+        bm25[self.masked] = 0.0
+        matched[self.masked] = 0.0
+        _add_postings(self.postings, self.idf, grams, bm25, matched)
+        query_mass = sum(self.base.gram_idf(gram) for gram in grams)
+        confidence = matched / np.maximum(query_mass + self.doc_mass - matched, 1e-9)
+        return bm25, confidence
@@ -1,14 +1,25 @@
-import faiss
 import pickle
+import threading
+from collections import Counter
 import numpy as np
 import json
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 # import torch
 # from sentence_transformers import SentenceTransformer
 from dataclasses import dataclass
 from ..utils.logger import default_logger, timing_decorator
-from ..utils.config import BASE_DIR, EMBEDDING_MODEL_SETTINGS, ISSAI_MODEL_SETTINGS
+from ..utils.metrics import default_metrics
+from ..utils.config import (
+    BASE_DIR, EMBEDDING_MODEL_SETTINGS, EMBEDDING_BATCH_SETTINGS, ISSAI_MODEL_SETTINGS, RAG_INDEX_SETTINGS,
+    LEXICAL_SETTINGS,
+)
+from .batcher import EmbeddingBatcher
+from .embeddings import load_embedding_backend
+from .index_manager import IndexManager, IndexSnapshot
+from .metadata_store import MetadataStore
+
+FAST_PATHS = ("exact", "lexical")
 
 
 @dataclass
@@ -21,40 +32,159 @@ class QADocument:
     source: str
     type: str = "qa"
 
+def load_metadata(docs_dir: Path):
+    """Open the QA metadata of an index directory"""
+    store_path = docs_dir / RAG_INDEX_SETTINGS['metadata_file']
+    if store_path.exists():
+        return MetadataStore(store_path)
+    # Legacy pickle; convert it with `python -m src.rag.build_index`
+    with open(docs_dir / RAG_INDEX_SETTINGS['legacy_metadata_file'], "rb") as f:
+        return pickle.load(f)
+
 class DocumentLoader:
     def __init__(self, data_dir: Optional[Path] = None):
         self.data_dir = data_dir or BASE_DIR / "data"
-        self.index, self.metadata = self.load_document()
         self.load_embedding_model()
+        self.indexes = self.load_document()
+        if RAG_INDEX_SETTINGS['watch']:
+            self.indexes.start_watching()
+        self.retrieval_paths = Counter()
+        self._paths_lock = threading.Lock()
         print("Loaded FAISS index")
 
     def load_embedding_model(self):
-        self.model = SentenceTransformer(EMBEDDING_MODEL_SETTINGS['path'], device='cuda')
+        self.model = load_embedding_backend()
+        # Queries from concurrent calls share one encode and one index.search
+        self.batcher = None
+        if EMBEDDING_BATCH_SETTINGS['enabled']:
+            self.batcher = EmbeddingBatcher(self.model.encode, name="retrieval")
+
+
+    def load_index(self, path: Path):
+        """Memory-map the index when the index type supports it, otherwise read it into RAM.
 
+        IO_FLAG_MMAP_IFC (newer faiss) also maps flat and HNSW codes; plain IO_FLAG_MMAP only
+        maps the inverted lists of IVF indexes, so other types are still read per process.
+        """
+        import faiss
 
-    def load_document(self):
-        index = faiss.read_index(f"{self.data_dir}/full_ru_docs/index.faiss")
-        with open(f"{self.data_dir}/full_ru_docs/metadata.pkl", "rb") as f:
-            metadata = pickle.load(f)
-        return index, metadata
+        index = None
+        if RAG_INDEX_SETTINGS['mmap']:
+            mmap_ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+            flag = mmap_ifc if mmap_ifc is not None else faiss.IO_FLAG_MMAP
+            try:
+                index = faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                default_logger.warning(f"Cannot mmap {path}, reading it into memory: {e}")
+            if index is not None and mmap_ifc is None and faiss.try_extract_index_ivf(index) is None:
+                default_logger.warning(
+                    f"{path} is not memory-mapped: this faiss only maps IVF inverted lists, so the "
+                    f"{type(index).__name__} codes are held in each process (build with --type ivf to share them)"
+                )
+        if index is None:
+            index = faiss.read_index(str(path))
+        if hasattr(index, "nprobe"):
+            index.nprobe = RAG_INDEX_SETTINGS['nprobe']
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = RAG_INDEX_SETTINGS['ef_search']
+        return index
+
+    def load_metadata(self, docs_dir: Path):
+        return load_metadata(docs_dir)
+
+    def load_document(self) -> IndexManager:
+        docs_dir = Path(self.data_dir) / RAG_INDEX_SETTINGS['dir_name']
+        return IndexManager(docs_dir, self.model.encode, self.load_index, self.load_metadata)
     
     
     def get_query_embedding(self, query):
-        return self.model.encode(
-            [query],
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        )
+        if self.batcher is not None:
+            return self.batcher.encode([query])
+        return self.model.encode([query])
         
+    def _count_path(self, path: str):
+        with self._paths_lock:
+            self.retrieval_paths[path] += 1
+            fraction = self.fast_path_fraction()
+        default_metrics.inc("voice_retrieval_queries_total", path=path)
+        default_metrics.set("voice_retrieval_fast_path_fraction", fraction)
+
+    def fast_path_fraction(self) -> float:
+        """Share of queries answered without the embedding model"""
+        total = sum(self.retrieval_paths.values())
+        return sum(self.retrieval_paths[path] for path in FAST_PATHS) / total if total else 0.0
+
+    def search_with_scores(self, query, top_k=None) -> List[Tuple[int, float]]:
+        """Return (metadata id, similarity) pairs of the nearest documents"""
+        with self.indexes.acquire() as snapshot:
+            return self._search(snapshot, query, top_k)
+
+    def search_records(self, query, top_k=None) -> List[Tuple[object, float]]:
+        """Return (record, similarity) pairs of the nearest documents, read from one snapshot"""
+        with self.indexes.acquire() as snapshot:
+            return [(snapshot.record(idx), score) for idx, score in self._search(snapshot, query, top_k)]
+
+    def _search(self, snapshot: IndexSnapshot, query, top_k=None) -> List[Tuple[int, float]]:
+        """Exact and confident lexical matches are answered from the lexical index, scored by
+        their trigram overlap; other queries go to the embedding search, or in hybrid mode
+        are ranked by the fused score of both.
+        """
+        top_k = top_k or EMBEDDING_MODEL_SETTINGS["top_k"]
+        lexical = snapshot.lexical
+        if lexical is not None:
+            key = lexical.key(query)
+            exact = lexical.lookup(key)
+            if exact is not None:
+                self._count_path("exact")
+                return [(exact, 1.0)]
+            if key:
+                bm25, confidence = lexical.scores(key)
+                if LEXICAL_SETTINGS['mode'] == "hybrid":
+                    self._count_path("hybrid")
+                    return self.hybrid_search(snapshot, query, top_k, bm25, confidence)
+                matches = [(idx, float(confidence[idx])) for idx in lexical.top(bm25, top_k)
+                           if confidence[idx] >= LEXICAL_SETTINGS['threshold']]
+                if matches:
+                    self._count_path("lexical")
+                    return matches
+            self._count_path("embedding")
+        return self.embedding_search(snapshot, query, top_k)
+
+    def hybrid_search(self, snapshot: IndexSnapshot, query, top_k: int, bm25: np.ndarray,
+                      confidence: np.ndarray) -> List[Tuple[int, float]]:
+        """Rank embedding and lexical candidates by weighted cosine + trigram overlap.
+
+        A candidate the embedding search did not return counts as cosine 0.
+        """
+        candidates = max(top_k, LEXICAL_SETTINGS['hybrid_candidates'])
+        dense = dict(self.embedding_search(snapshot, query, candidates))
+        weight = LEXICAL_SETTINGS['hybrid_weight']
+        fused = [
+            (idx, weight * dense.get(idx, 0.0) + (1 - weight) * float(confidence[idx]))
+            for idx in set(dense) | set(snapshot.lexical.top(bm25, candidates))
+        ]
+        fused.sort(key=lambda item: item[1], reverse=True)
+        return fused[:top_k]
+
+    def embedding_search(self, snapshot: IndexSnapshot, query, top_k: int) -> List[Tuple[int, float]]:
+        if self.batcher is not None:
+            distances, indices = self.batcher.search(query, top_k, index=snapshot)
+        else:
+            query_vector = self.get_query_embedding(query)
+            distances, indices = snapshot.search(query_vector, top_k)
+            distances, indices = distances[0], indices[0]
+        return [(int(idx), float(distance)) for idx, distance in zip(indices, distances) if idx >= 0]
+
     @timing_decorator(default_logger)
     def search_document(self, query):
-        query_vector = self.get_query_embedding(query)
-        distances, indices = self.index.search(query_vector, EMBEDDING_MODEL_SETTINGS["top_k"])
-        print(distances)
         results = []
-        for i, idx in enumerate(indices[0]):
-            if distances[0][i] >= EMBEDDING_MODEL_SETTINGS["threshold"]:
-                results.append(self.metadata[idx])
+        threshold = EMBEDDING_MODEL_SETTINGS["threshold"]
+        if LEXICAL_SETTINGS['enabled'] and LEXICAL_SETTINGS['mode'] == "hybrid":
+            threshold = LEXICAL_SETTINGS['hybrid_threshold']
+        with self.indexes.acquire() as snapshot:
+            for idx, distance in self._search(snapshot, query):
+                if distance >= threshold:
+                    results.append(snapshot.record(idx))
         return results
     
     def construct_prompt_message(self, user_question, context_chunks) -> List[Dict[str, str]]:
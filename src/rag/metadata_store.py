@@ -0,0 +1,105 @@
+import json
+import mmap
+import struct
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+import numpy as np
+
+MAGIC = b"QAMETA1\0"
+HEADER = struct.Struct("<8sQ")
+
+
+def record_text(record: Any) -> str:
+    """Text that is embedded (and lexically indexed) for a metadata record"""
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        return record.get("question") or record.get("text") or ""
+    return getattr(record, "question", str(record))
+
+
+def record_field(record: Any, name: str) -> Optional[str]:
+    """A field of a QADocument or dict record, None when missing"""
+    if isinstance(record, dict):
+        return record.get(name)
+    return getattr(record, name, None)
+
+
+def record_key(record: Any) -> Optional[str]:
+    """Stable id of a metadata record (QADocument.id), if it has one"""
+    if isinstance(record, dict):
+        key = record.get("id")
+    else:
+        key = getattr(record, "id", None)
+    return None if key is None else str(key)
+
+
+def record_to_json(record: Any) -> Any:
+    """JSON-ready form of a record; QADocuments are tagged so they decode back to the dataclass"""
+    if is_dataclass(record):
+        return {"__qa__": True, **asdict(record)}
+    return record
+
+
+def record_from_json(record: Any) -> Any:
+    if isinstance(record, dict) and record.get("__qa__"):
+        from .local_loader_v1 import QADocument
+        return QADocument(**{k: v for k, v in record.items() if k != "__qa__"})
+    return record
+
+
+def _encode(record: Any) -> bytes:
+    return json.dumps(record_to_json(record), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_metadata_store(path: Union[str, Path], records: Iterable[Any]) -> int:
+    """Write records as an offset-indexed file: header, uint64 offsets, then JSON blobs"""
+    blobs = [_encode(record) for record in records]
+    offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(blobs)))
+        f.write(offsets.tobytes())
+        for blob in blobs:
+            f.write(blob)
+    tmp_path.replace(path)
+    return len(blobs)
+
+
+class MetadataStore:
+    """Read-only, memory-mapped metadata; a record is decoded only when it is looked up by id"""
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a metadata store")
+        self._count = count
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=HEADER.size)
+        self._data_start = HEADER.size + self._offsets.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> Any:
+        idx = int(idx)
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        start = self._data_start + int(self._offsets[idx])
+        end = self._data_start + int(self._offsets[idx + 1])
+        return record_from_json(json.loads(self._mmap[start:end].decode("utf-8")))
+
+    def __iter__(self):
+        for idx in range(self._count):
+            yield self[idx]
+
+    def close(self):
+        self._offsets = None
+        self._mmap.close()
+        self._file.close()
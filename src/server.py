@@ -0,0 +1,256 @@
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from .main import VoiceAssistant
+from .session import CallSession
+from .audio.synthesizer_v2 import FRAME_HEADER, SpeechSynthesizer
+from .utils.logger import default_logger
+from .utils.metrics import ready, start_metrics_server
+from .utils.startup import startup_report
+from .audio.call_recording import CallRecordingWriter, recording_path
+from .audio.ingest import HELLO, HELLO_MAGIC, LENGTH, FrameAssembler, StreamFormat, negotiate, pack_hello
+from .utils.config import (
+    SERVER_SETTINGS, AUDIO_SETTINGS, RECORDING_SETTINGS, INGEST_SETTINGS, TTS_SETTINGS, METRICS_SETTINGS,
+)
+
+
+class QueueAudioRecorder:
+    """Audio source fed by the event loop with chunks received from the caller's connection.
+
+    The queue is bounded: if the recognition loop falls behind, the oldest chunk is dropped
+    so memory stays bounded and recognition catches up with live audio. The empty chunk
+    that ends the stream is always enqueued.
+    """
+    def __init__(self, sample_rate: int = AUDIO_SETTINGS['RATE']):
+        self.logger = default_logger.getChild("QueueAudioRecorder")
+        self.queue = queue.Queue(maxsize=INGEST_SETTINGS['queue_chunks'])
+        self.dropped = 0
+        self.closed = False
+        self.writer = None
+        self.sample_rate = sample_rate
+
+    def feed(self, data: bytes):
+        while True:
+            try:
+                self.queue.put_nowait(data)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def start_recording(self, call_id=None):
+        if RECORDING_SETTINGS['enabled']:
+            self.writer = CallRecordingWriter(
+                recording_path(call_id), AUDIO_SETTINGS['CHANNELS'], 2, self.sample_rate
+            )
+
+    def record_chunk(self) -> bytes:
+        """Block until the next audio chunk of this call arrives"""
+        data = self.queue.get()
+        if not data:
+            raise RuntimeError("Audio stream ended")
+        if self.writer:
+            self.writer.write(data)
+        return data
+
+    def stop_recording(self):
+        if self.dropped and not self.closed:
+            self.logger.warning(f"Dropped {self.dropped} audio chunks the recognizer did not keep up with")
+        self.closed = True
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def cleanup(self):
+        self.stop_recording()
+
+
+class CallServer:
+    """Asyncio TCP server carrying many concurrent calls in one process.
+
+    Socket I/O for every caller is multiplexed on the event loop, while the blocking
+    recognize -> LLM -> TTS session of each call runs on a bounded worker pool.
+    Synthesized audio is written back on the caller's own connection.
+    """
+    def __init__(self, host=None, port=None, max_calls=None, chunk=None, sock=None, reuse_port=False, metrics_port=None):
+        self.logger = default_logger.getChild("CallServer")
+        self.host = host or SERVER_SETTINGS['host']
+        self.port = port or SERVER_SETTINGS['port']
+        self.chunk = chunk or SERVER_SETTINGS['chunk']
+        self.max_calls = max_calls or SERVER_SETTINGS['max_calls']
+        # A listening socket shared with other worker processes, or a port bound with SO_REUSEPORT
+        self.sock = sock
+        self.reuse_port = reuse_port
+        # Up before the warm-up so /ready answers 503 while models and connections load
+        self.metrics_server = start_metrics_server(port=metrics_port) if METRICS_SETTINGS['enabled'] else None
+        self.assistant = VoiceAssistant(
+            speech_synthesizer=SpeechSynthesizer(connect_socket=False), prewarm=SERVER_SETTINGS['prewarm']
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.max_calls, thread_name_prefix="call")
+        self.call_slots = asyncio.Semaphore(self.max_calls)
+        self.active_calls = {}
+        self.calls_total = 0
+
+    async def _send_audio(self, writer: asyncio.StreamWriter, *buffers: bytes):
+        writer.writelines(buffers)
+        await writer.drain()
+
+    def _audio_player(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter):
+        """Return a blocking play_audio callable that writes to the caller from a worker thread"""
+        def play_audio(audio_bytes: bytes) -> None:
+            buffers = (audio_bytes,)
+            if TTS_SETTINGS['stream_output']:
+                buffers = (FRAME_HEADER.pack(len(audio_bytes)), audio_bytes, FRAME_HEADER.pack(0))
+            try:
+                asyncio.run_coroutine_threadsafe(self._send_audio(writer, *buffers), loop).result()
+            except Exception as e:
+                self.logger.error(f"Error playing audio: {e}")
+        return play_audio
+
+    def _audio_streamer(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter):
+        """Return a blocking stream_audio callable that forwards one length-prefixed chunk per call"""
+        def stream_audio(chunk: bytes) -> None:
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    self._send_audio(writer, FRAME_HEADER.pack(len(chunk)), chunk), loop
+                ).result()
+            except Exception as e:
+                self.logger.error(f"Error streaming audio: {e}")
+        return stream_audio
+
+    async def _handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the optional format hello.
+
+        Returns the format, any audio bytes already read and whether the client sent a hello,
+        which opts the connection into framed messages.
+        """
+        try:
+            peeked = await reader.readexactly(len(HELLO_MAGIC))
+        except asyncio.IncompleteReadError as e:
+            return StreamFormat(), e.partial, False
+        if peeked != HELLO_MAGIC:
+            # No hello: these bytes already belong to the audio stream
+            return StreamFormat(), peeked, False
+        hello = peeked + await reader.readexactly(HELLO.size - len(HELLO_MAGIC))
+        _, codec, sample_rate, channels = HELLO.unpack(hello)
+        stream_format = negotiate(codec, sample_rate, channels)
+        writer.write(pack_hello(stream_format))
+        await writer.drain()
+        return stream_format, b'', True
+
+    async def _pump_raw(self, reader: asyncio.StreamReader, recorder: QueueAudioRecorder, first_bytes: bytes):
+        if first_bytes:
+            recorder.feed(first_bytes)
+        while not recorder.closed:
+            data = await reader.read(self.chunk)
+            if not data:
+                break
+            recorder.feed(data)
+
+    async def _pump_framed(self, reader: asyncio.StreamReader, recorder: QueueAudioRecorder,
+                           stream_format: StreamFormat, first_bytes: bytes):
+        """Read length-prefixed messages and feed fixed-duration frames"""
+        assembler = FrameAssembler(stream_format.frame_bytes())
+        try:
+            while not recorder.closed:
+                header = first_bytes + await reader.readexactly(LENGTH.size - len(first_bytes))
+                first_bytes = b''
+                (length,) = LENGTH.unpack(header)
+                if length == 0 or length > INGEST_SETTINGS['max_message_bytes']:
+                    break
+                for frame in assembler.push(await reader.readexactly(length)):
+                    recorder.feed(frame)
+        except asyncio.IncompleteReadError:
+            pass
+        rest = assembler.flush()
+        if rest:
+            recorder.feed(rest)
+
+    async def _pump_audio(self, reader: asyncio.StreamReader, recorder: QueueAudioRecorder,
+                          stream_format: StreamFormat, first_bytes: bytes, framed: bool):
+        try:
+            if framed:
+                await self._pump_framed(reader, recorder, stream_format, first_bytes)
+            else:
+                await self._pump_raw(reader, recorder, first_bytes)
+        finally:
+            recorder.feed(b'')
+
+    def _run_session(self, session: CallSession):
+        try:
+            self.assistant.handle_call(session)
+        except Exception as e:
+            self.logger.info(f"[{session.call_id}] Call ended: {e}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info('peername')
+        async with self.call_slots:
+            loop = asyncio.get_running_loop()
+            try:
+                stream_format, first_bytes, hello = await self._handshake(reader, writer)
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                self.logger.warning(f"Connection from {addr} dropped during the format hello: {e!r}")
+                writer.close()
+                return
+            framed = hello or INGEST_SETTINGS['framed']
+            recorder = QueueAudioRecorder(stream_format.sample_rate)
+            session = CallSession(
+                audio_recorder=recorder,
+                play_audio=self._audio_player(loop, writer),
+                stream_audio=self._audio_streamer(loop, writer),
+            )
+            self.active_calls[session.call_id] = session
+            self.calls_total += 1
+            self.logger.info(f"[{session.call_id}] Call connected from {addr} ({len(self.active_calls)} active)")
+
+            pump = asyncio.create_task(self._pump_audio(reader, recorder, stream_format, first_bytes, framed))
+            try:
+                await loop.run_in_executor(self.executor, self._run_session, session)
+            finally:
+                session.is_recording = False
+                recorder.stop_recording()
+                pump.cancel()
+                writer.close()
+                del self.active_calls[session.call_id]
+                self.logger.info(f"[{session.call_id}] Call closed ({len(self.active_calls)} active)")
+
+    def load(self) -> dict:
+        """Current load of this process, as reported to the supervisor"""
+        return {
+            "active_calls": len(self.active_calls),
+            "calls_total": self.calls_total,
+            "max_calls": self.max_calls,
+            "ready": ready.is_set(),
+        }
+
+    async def serve(self):
+        if self.sock is not None:
+            server = await asyncio.start_server(self.handle_connection, sock=self.sock, backlog=self.max_calls)
+        else:
+            server = await asyncio.start_server(
+                self.handle_connection, self.host, self.port, backlog=self.max_calls,
+                reuse_port=self.reuse_port or None,
+            )
+        self.logger.info(f"Accepting calls on {self.host}:{self.port} (max {self.max_calls})")
+        ready.set()
+        self.logger.info(startup_report.format())
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\nStopping call server...")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.assistant.speech_synthesizer.cleanup()
+            self.assistant.gpt_handler.close()
+
+
+if __name__ == "__main__":
+    CallServer().run()
@@ -0,0 +1,41 @@
+import time
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+from .utils.config import AUDIO_SETTINGS
+from .utils.metrics import TurnTrace
+
+
+@dataclass
+class CallSession:
+    """Per-call conversation state"""
+    audio_recorder: Any
+    play_audio: Callable[[Any], None]
+    stream_audio: Optional[Callable[[bytes], None]] = None
+    call_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    is_recording: bool = False
+    sample_rate: int = AUDIO_SETTINGS['RATE']
+    last_recognition_time: float = 0
+    recognized_text_buffer: List[str] = field(default_factory=list)
+    vad: Any = None
+    pending_silence_ms: float = 0
+    speaking: bool = False
+    barge_in: threading.Event = field(default_factory=threading.Event)
+    barge_in_speech_ms: float = 0
+    partial_text: str = ""
+    partial_since: float = 0
+    speculation: Any = None
+    speculation_timer: Any = None
+    trace: TurnTrace = field(default_factory=TurnTrace)
+
+    def reset(self):
+        """Reset the state at the start of a conversation"""
+        self.last_recognition_time = time.time()
+        self.recognized_text_buffer = []
+
+    def play_audio_segments(self, audio_segments: List[Any]) -> None:
+        """Play synthesized segments in order to this caller"""
+        for audio_segment in audio_segments:
+            if audio_segment:
+                self.play_audio(audio_segment)
@@ -0,0 +1,131 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Optional
+from .session import CallSession
+from .utils.config import SPECULATION_SETTINGS
+from .utils.logger import default_logger
+from .utils.metrics import MetricsRegistry, default_metrics
+from .utils.text import normalize_text
+
+STARTED_METRIC = "voice_speculation_started_total"
+RESULT_METRIC = "voice_speculation_total"
+
+
+class Speculator:
+    """Starts the LLM request on a stable STT partial and reuses it if the final text matches.
+
+    A partial hypothesis that has not changed for stable_ms launches generate() in the
+    background; a timer armed on every new partial catches the case where the caller stops
+    talking and no further partial arrives. When the final text arrives, the speculative answer is kept if the
+    normalized texts are identical or at least `similarity` alike; otherwise it is dropped
+    and the caller reissues the request.
+    """
+    def __init__(self, generate: Callable[[str], Optional[str]], registry: MetricsRegistry = default_metrics):
+        self.logger = default_logger.getChild("Speculator")
+        self.generate = generate
+        self.registry = registry
+        self.stable_ms = SPECULATION_SETTINGS['stable_ms']
+        self.similarity = SPECULATION_SETTINGS['similarity']
+        self.executor = ThreadPoolExecutor(max_workers=SPECULATION_SETTINGS['workers'], thread_name_prefix="speculate")
+        # Guards session speculation state, changed by the recognition loop and by timers
+        self._lock = threading.RLock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def on_partial(self, session: CallSession, text: str):
+        """Track the latest partial hypothesis and speculate once it has been stable long enough"""
+        text = " ".join(session.recognized_text_buffer + [text]).strip()
+        if not text:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if text != session.partial_text:
+                session.partial_text = text
+                session.partial_since = now
+                self._arm_timer(session, text)
+                return
+            if (now - session.partial_since) * 1000 >= self.stable_ms:
+                self._start(session, text)
+
+    def _arm_timer(self, session: CallSession, text: str):
+        self._cancel_timer(session)
+        timer = threading.Timer(self.stable_ms / 1000, self._on_stable, args=(session, text))
+        timer.daemon = True
+        session.speculation_timer = timer
+        timer.start()
+
+    def _cancel_timer(self, session: CallSession):
+        if session.speculation_timer is not None:
+            session.speculation_timer.cancel()
+            session.speculation_timer = None
+
+    def _on_stable(self, session: CallSession, text: str):
+        with self._lock:
+            if session.partial_text == text:
+                self._start(session, text)
+
+    def _start(self, session: CallSession, text: str):
+        if session.speculation is not None and session.speculation[0] == normalize_text(text):
+            return
+        if session.speculation is not None:
+            session.speculation[1].cancel()
+        session.speculation = (normalize_text(text), self.executor.submit(self.generate, text))
+        self.started += 1
+        self.registry.inc(STARTED_METRIC)
+
+    def discard(self, session: CallSession):
+        """Drop the pending speculation of this session"""
+        with self._lock:
+            session.partial_text = ""
+            self._cancel_timer(session)
+            if session.speculation is not None:
+                session.speculation[1].cancel()
+                session.speculation = None
+
+    def _matches(self, speculative_text: str, final_text: str) -> bool:
+        if speculative_text == final_text:
+            return True
+        return SequenceMatcher(None, speculative_text, final_text).ratio() >= self.similarity
+
+    def resolve(self, session: CallSession, final_text: str) -> Optional[str]:
+        """Return the speculative answer for final_text, or None if it has to be requested again"""
+        with self._lock:
+            speculation, session.speculation = session.speculation, None
+            session.partial_text = ""
+            self._cancel_timer(session)
+        if speculation is None:
+            return None
+        speculative_text, future = speculation
+        if not self._matches(speculative_text, normalize_text(final_text)):
+            future.cancel()
+            with self._lock:
+                self.misses += 1
+            self.registry.inc(RESULT_METRIC, result="miss")
+            return None
+        try:
+            response = future.result()
+        except Exception as e:
+            self.logger.warning(f"[{session.call_id}] Speculative request failed: {e}")
+            with self._lock:
+                self.failures += 1
+            self.registry.inc(RESULT_METRIC, result="failure")
+            return None
+        with self._lock:
+            self.hits += 1
+        self.registry.inc(RESULT_METRIC, result="hit")
+        return response
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            resolved = self.hits + self.misses + self.failures
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "hit_rate": self.hits / resolved if resolved else 0.0,
+            }
@@ -0,0 +1,203 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import resource
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional
+from .utils.logger import default_logger
+from .utils.metrics import default_metrics, ready, start_metrics_server
+from .utils.config import SERVER_SETTINGS, SUPERVISOR_SETTINGS, METRICS_SETTINGS
+
+# One call worker process per core behind a single port. The supervisor itself never
+# imports the pipeline, so gRPC channels, models and the embedding index are only
+# created inside the workers.
+
+
+def worker_count() -> int:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _report_load(server, index: int, reports, interval: float):
+    while True:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        reports.put({
+            "worker": index,
+            "pid": os.getpid(),
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+            # ru_maxrss is in kilobytes on Linux
+            "max_rss_bytes": usage.ru_maxrss * 1024,
+            **server.load(),
+        })
+        time.sleep(interval)
+
+
+def run_worker(index: int, host: str, port: int, sock: Optional[socket.socket], reports):
+    """Entry point of one call worker process"""
+    from .server import CallServer
+
+    # Stop like on Ctrl+C so the server shuts its executor and connections down
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    server = CallServer(
+        host=host,
+        port=port,
+        sock=sock,
+        reuse_port=sock is None,
+        metrics_port=METRICS_SETTINGS['port'] + 1 + index,
+    )
+    threading.Thread(
+        target=_report_load, args=(server, index, reports, SUPERVISOR_SETTINGS['report_interval']),
+        name="load-report", daemon=True,
+    ).start()
+    server.run()
+
+
+class Supervisor:
+    """Starts the call workers, restarts the ones that exit and aggregates their load reports.
+
+    With SO_REUSEPORT every worker binds the call port itself and the kernel spreads new
+    connections across them; otherwise the supervisor binds the port once and the workers
+    accept from the shared socket.
+    """
+    def __init__(self, workers=None, host=None, port=None):
+        self.logger = default_logger.getChild("Supervisor")
+        self.workers = workers or SUPERVISOR_SETTINGS['workers'] or worker_count()
+        self.host = host or SERVER_SETTINGS['host']
+        self.port = port or SERVER_SETTINGS['port']
+        self.context = mp.get_context(SUPERVISOR_SETTINGS['start_method'])
+        self.reports = self.context.Queue()
+        self.sock: Optional[socket.socket] = None
+        self.processes: Dict[int, mp.Process] = {}
+        self.started_at: Dict[int, float] = {}
+        self.restart_at: Dict[int, float] = {}
+        self.backoff: Dict[int, float] = {}
+        self.loads: Dict[int, dict] = {}
+        self.stopping = False
+
+    def _listen_socket(self) -> Optional[socket.socket]:
+        if SUPERVISOR_SETTINGS['reuse_port'] and hasattr(socket, "SO_REUSEPORT"):
+            return None
+        return socket.create_server(
+            (self.host, self.port), backlog=SERVER_SETTINGS['max_calls'] * self.workers
+        )
+
+    def _start(self, index: int):
+        process = self.context.Process(
+            target=run_worker, args=(index, self.host, self.port, self.sock, self.reports), name=f"call-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        self.logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for index, process in self.processes.items():
+            if process.is_alive():
+                continue
+            if index not in self.restart_at:
+                # A worker that keeps dying right after start is restarted with a growing delay
+                backoff = 0.0
+                if now - self.started_at[index] < SUPERVISOR_SETTINGS['stable_after']:
+                    previous = self.backoff.get(index, 0.0)
+                    backoff = min(previous * 2 or SUPERVISOR_SETTINGS['restart_backoff'],
+                                  SUPERVISOR_SETTINGS['max_backoff'])
+                self.backoff[index] = backoff
+                self.restart_at[index] = now + backoff
+                self.loads.pop(index, None)
+                default_metrics.inc("voice_worker_restarts_total", worker=str(index))
+                self.logger.warning(
+                    f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}, "
+                    f"restarting in {backoff:.1f}s"
+                )
+            if now >= self.restart_at[index]:
+                del self.restart_at[index]
+                self._start(index)
+
+    def _record_load(self, load: dict):
+        index = load["worker"]
+        if index not in self.processes or self.processes[index].pid != load["pid"]:
+            return  # late report of a worker that has been replaced
+        self.loads[index] = load
+        worker = str(index)
+        default_metrics.set("voice_worker_active_calls", load["active_calls"], worker=worker)
+        default_metrics.set("voice_worker_calls_handled", load["calls_total"], worker=worker)
+        default_metrics.set("voice_worker_cpu_seconds", load["cpu_seconds"], worker=worker)
+        default_metrics.set("voice_worker_max_rss_bytes", load["max_rss_bytes"], worker=worker)
+        default_metrics.set("voice_worker_ready", int(load["ready"]), worker=worker)
+
+    def _log_load(self):
+        workers = ", ".join(
+            f"{index}: {load['active_calls']}/{load['max_calls']} calls, {load['cpu_seconds']:.1f}s cpu"
+            for index, load in sorted(self.loads.items())
+        )
+        active = sum(load["active_calls"] for load in self.loads.values())
+        self.logger.info(f"Load: {active} active calls on {len(self.loads)}/{self.workers} workers ({workers})")
+
+    def _update_ready(self):
+        if len(self.loads) == self.workers and all(load["ready"] for load in self.loads.values()):
+            if not ready.is_set():
+                self.logger.info(f"All {self.workers} workers ready on {self.host}:{self.port}")
+            ready.set()
+        else:
+            ready.clear()
+
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        if METRICS_SETTINGS['enabled']:
+            start_metrics_server()
+        self.sock = self._listen_socket()
+        mode = "shared socket" if self.sock is not None else "SO_REUSEPORT"
+        self.logger.info(f"Starting {self.workers} call workers on {self.host}:{self.port} ({mode})")
+        for index in range(self.workers):
+            self._start(index)
+
+        next_log = time.monotonic() + SUPERVISOR_SETTINGS['report_interval']
+        try:
+            while not self.stopping:
+                try:
+                    self._record_load(self.reports.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+                self._check_workers()
+                self._update_ready()
+                if time.monotonic() >= next_log:
+                    next_log = time.monotonic() + SUPERVISOR_SETTINGS['report_interval']
+                    self._log_load()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        print("\nStopping call workers...")
+        ready.clear()
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + SUPERVISOR_SETTINGS['shutdown_timeout']
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if self.sock is not None:
+            self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve calls from one worker process per core")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+    Supervisor(args.workers, args.host, args.port).run()
@@ -1,13 +1,12 @@
 from environs import Env
 from pathlib import Path
-import time
 
 env = Env()
 env.read_env()
 
 BASE_DIR = Path(__file__).parent.parent.parent
+# Created by the writers that need it, not at import
 AUDIO_DIR = BASE_DIR / "audio_files"
-AUDIO_DIR.mkdir(exist_ok=True)
 
 # Yandex settings
 YANDEX_API_KEY = env.str("YANDEX_API_KEY", 'TEST_YANDEX_API_KEY')
@@ -20,7 +19,26 @@ AUDIO_SETTINGS = {
     "RATE": 8000,
     "CHUNK": 4096,
     "RECORD_SECONDS": 30,
-    "WAVE_OUTPUT_FILENAME": str(AUDIO_DIR / f"{time.time()}.wav")
+}
+
+INGEST_SETTINGS = {
+    # Length-prefixed messages for every connection; otherwise only a connection opening with
+    # a format hello is framed and the rest are read as raw PCM
+    "framed": False,
+    # Duration of audio carried by each STT request
+    "frame_ms": 100,
+    "buffer_frames": 16,
+    "max_message_bytes": 1024 * 1024,
+    # Received chunks waiting for the recognition loop; when full the oldest one is dropped
+    "queue_chunks": 64,
+}
+
+RECORDING_SETTINGS = {
+    "enabled": True,
+    # Per-call WAV files are written to AUDIO_DIR / dir_name
+    "dir_name": "calls",
+    "buffer_bytes": 64 * 1024,
+    "queue_chunks": 256,
 }
 
 # GPT settings
@@ -73,12 +91,232 @@ EMBEDDING_MODEL_SETTINGS = {
     'path' : f'{BASE_DIR}/embedding_model',
     'top_k': 1,    
     'threshold': 0.45,
+    # 'auto' uses sentence-transformers on GPU and the ONNX Runtime path on CPU when model.onnx exists
+    'backend': 'auto',
+    'device': 'auto',
+    'onnx_file': 'model.onnx',
+    'quantized': True,
+    'threads': 4,
+    # Maximum allowed 1 - cosine similarity against the reference model
+    'tolerance': 0.02,
+}
+
+EMBEDDING_BATCH_SETTINGS = {
+    # Queue query embeddings (and FAISS searches) from concurrent calls and run them in batches
+    "enabled": True,
+    "max_batch": 32,
+    # How long the first query of a batch may wait for others to join it
+    "max_wait_ms": 5.0,
+    "size_buckets": [1, 2, 4, 8, 16, 32, 64],
+    "wait_buckets": [0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1],
+}
+
+VAD_SETTINGS = {
+    "enabled": True,
+    "frame_ms": 20,
+    "energy_threshold_db": -45.0,
+    "noise_margin_db": 10.0,
+    "zcr_max": 0.35,
+    # Keep streaming this long after the last speech frame
+    "hangover_ms": 300,
+    # Silence after speech that ends the caller's turn
+    "end_of_utterance_ms": 700,
+    # Withheld silence is reported to STT as SilenceChunk at most this often
+    "silence_flush_ms": 1000,
+    # Stop the answer when the caller talks over it for this long
+    "barge_in": True,
+    "barge_in_min_speech_ms": 200,
+}
+
+SPECULATION_SETTINGS = {
+    # Start /process_text on a stable STT partial before the final result arrives
+    "enabled": False,
+    "stable_ms": 300,
+    # Normalized partial/final similarity above which the speculative answer is kept
+    "similarity": 0.92,
+    "workers": 8,
+}
+
+SEMANTIC_CACHE_SETTINGS = {
+    # Answer repeated questions from cache instead of calling /process_text
+    "enabled": False,
+    # Minimum cosine similarity between the new and a cached question
+    "threshold": 0.92,
+    "ttl_seconds": 6 * 3600,
+    "max_entries": 2000,
+    # Question vectors of recent misses, reused when their answer is stored
+    "missed_vectors": 256,
+}
+
+GRPC_SETTINGS = {
+    # "stt_endpoint": "stt.api.cloud.yandex.net:443",
+    # "tts_endpoint": "tts.api.cloud.yandex.net:443",
+    "stt_endpoint": "stt.api.ml.yandexcloud.kz:443",
+    "tts_endpoint": "tts.api.ml.yandexcloud.kz:443",
+    # TLS; only local stand-ins (src.bench) run without it
+    "secure": True,
+    "channels_per_endpoint": 4,
+    # Enforced by ChannelPool; a stream waits up to stream_wait_timeout for a free slot
+    "max_streams_per_channel": 100,
+    "stream_wait_timeout": 10.0,
+    "keepalive_time_ms": 30000,
+    "keepalive_timeout_ms": 10000,
+    "max_message_length": 16 * 1024 * 1024,
+    # Connect when a pool is created; otherwise VoiceAssistant.warm_up connects all pools
+    "eager_connect": False,
+    "warmup_timeout": 5.0,
+}
+
+TTS_SETTINGS = {
+    # Play chunk 1 as soon as it is ready while later chunks are synthesized concurrently
+    "pipelined": True,
+    # Per-turn bound on concurrent UtteranceSynthesis calls
+    "max_in_flight": 3,
+    # Size of the synthesis thread pool shared by all calls
+    "workers": 16,
+    "voice": "zhanar_ru",
+    "speed": 1.0,
+    "role": "friendly",
+    # "LINEAR16_PCM" asks for raw samples at sample_rate_hertz, so nothing has to be decoded;
+    # "WAV" is decoded with pydub for local playback
+    "audio_format": "LINEAR16_PCM",
+    "sample_rate_hertz": AUDIO_SETTINGS['RATE'],
+    # Raw output sent to callers: resampled to output_rate and encoded as
+    # "linear16", "mulaw" or "alaw" (G.711)
+    "output_rate": AUDIO_SETTINGS['RATE'],
+    "output_codec": "linear16",
+    # Forward each synthesized chunk to the caller as a >I length-prefixed frame as soon as
+    # it arrives; an empty frame marks the end of an utterance
+    "stream_output": True,
+}
+
+TTS_CACHE_SETTINGS = {
+    "dir_name": "tts_cache",
+    "max_memory_bytes": 64 * 1024 * 1024,
+    # Shared by all workers; past the cap the least recently used files are removed down to
+    # disk_low_water of it, so a burst of long answers does not rescan the directory every put
+    "max_disk_bytes": 1024 * 1024 * 1024,
+    "disk_low_water": 0.9,
+    "prewarm": True,
+}
+
+SERVER_SETTINGS = {
+    "host": "0.0.0.0",
+    "port": 12345,
+    "chunk": 4096,
+    "max_calls": 64,
+    # Load models, connect to SpeechKit and the LLM and prime the TTS cache before accepting
+    # calls (readiness is reported on the metrics port at /ready); False defers it to the first call
+    "prewarm": True,
+}
+
+SUPERVISOR_SETTINGS = {
+    # Call worker processes started by src.supervisor; 0 starts one per available core
+    "workers": 0,
+    # Each worker binds the call port with SO_REUSEPORT and the kernel balances connections;
+    # False (or no SO_REUSEPORT) binds once in the supervisor and shares the listening socket
+    "reuse_port": True,
+    # "spawn" keeps gRPC and model state out of the supervisor; workers build their own
+    "start_method": "spawn",
+    "report_interval": 5.0,
+    # Workers that exit sooner than stable_after seconds after starting are restarted with
+    # a delay doubling from restart_backoff up to max_backoff
+    "restart_backoff": 1.0,
+    "max_backoff": 30.0,
+    "stable_after": 60.0,
+    "shutdown_timeout": 10.0,
+}
+
+RAG_INDEX_SETTINGS = {
+    "dir_name": "full_ru_docs",
+    "index_file": "index.faiss",
+    "metadata_file": "metadata.bin",
+    "legacy_metadata_file": "metadata.pkl",
+    # Map the index file instead of reading it into each process
+    "mmap": True,
+    "nprobe": 16,
+    "ef_search": 64,
+    # Names the generation subdirectory in use; without it the files above are read from dir_name
+    "current_file": "CURRENT",
+    # Incremental upserts and deletes on top of a generation, replayed by every process
+    "log_file": "updates.log",
+    # Poll for a new generation or appended updates and swap them in without blocking searches
+    "watch": True,
+    "poll_seconds": 2.0,
+    # Base results fetched beyond top_k to make up for deleted or replaced base entries
+    "max_overfetch": 1024,
+}
+
+LEXICAL_SETTINGS = {
+    # Match near-verbatim FAQ questions with a normalized-text hash and a character-trigram
+    # BM25 index built from the QA metadata before running the embedding model
+    "enabled": True,
+    # "fast_path": confident lexical matches skip the encoder and FAISS;
+    # "hybrid": every query is scored by both and the scores are fused
+    "mode": "fast_path",
+    # Minimum IDF-weighted trigram overlap (0..1) between query and question for a fast-path answer
+    "threshold": 0.75,
+    "k1": 1.2,
+    "b": 0.75,
+    # Hybrid score: hybrid_weight * cosine + (1 - hybrid_weight) * trigram overlap
+    "hybrid_weight": 0.7,
+    "hybrid_candidates": 10,
+    "hybrid_threshold": 0.4,
+    # Hesitations and politeness callers wrap FAQ questions in; dropped before matching
+    "filler_words": [
+        "а", "ну", "вот", "э", "эм", "алло", "пожалуйста", "скажите", "подскажите",
+        "здравствуйте", "слушайте", "извините", "короче", "типа",
+    ],
+}
+
+ANSWER_PACK_SETTINGS = {
+    # Play pre-synthesized QA answers when retrieval is confident, skipping LLM and TTS
+    "enabled": False,
+    "file": "answers.pack",
+    # Minimum retrieval similarity for serving a pack answer verbatim
+    "threshold": 0.85,
+    "langs": ["ru"],
+    "concurrency": 8,
 }
 
 FASTAPI_SETTINGS = {
     "host": "https://f021-37-208-42-227.ngrok-free.app/process_text",
+    # Consume /process_text as an SSE/chunked stream and synthesize sentence by sentence
+    "stream": False,
+    # Persistent client settings
+    "http2": True,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 120.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    "write_timeout": 10.0,
+    "pool_timeout": 5.0,
+}
+
+LOGGING_SETTINGS = {
+    "level": "INFO",
+    # Records are handed to a listener thread through this bounded queue; overflow is dropped
+    "queue_size": 10000,
+    # JSON lines with call_id in the log file, plain text on the console
+    "file_json": True,
+    "console_json": False,
+    # Per call site token bucket for DEBUG records
+    "debug_rate_per_sec": 5.0,
+    "debug_burst": 20,
+}
+
+METRICS_SETTINGS = {
+    # Prometheus text endpoint at http://host:port/metrics with per-stage latency histograms
+    "enabled": True,
+    "host": "127.0.0.1",
+    "port": 9108,
+    "buckets": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0],
 }
 
 DOCUMENT_START = "Здравствуйте! Чем я могу помочь?"
 DOCUMENT_NON_EXISTING = "Пожалуйста, сформулируйте вопрос по-другому."
-DOCUMENT_END = "Могу я чем-то еще помочь?"
\ No newline at end of file
+DOCUMENT_END = "Могу я чем-то еще помочь?"
+
+# Constant prompts synthesized once at startup
+FIXED_PROMPTS = [DOCUMENT_START, DOCUMENT_NON_EXISTING, DOCUMENT_END]
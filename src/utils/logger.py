@@ -1,56 +1,203 @@
+import atexit
+import contextvars
+import inspect
+import json
 import logging
+import logging.handlers
+import queue
+import threading
 import time
 from functools import wraps
 from datetime import datetime
 from pathlib import Path
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Optional, Tuple
+from .config import LOGGING_SETTINGS
+from .metrics import FUNCTION_METRIC, default_metrics
 
-# Create logs directory
+# Logs directory, created with the log file on the first record
 BASE_DIR = Path(__file__).parent.parent.parent
 LOGS_DIR = BASE_DIR / "logs"
-LOGS_DIR.mkdir(exist_ok=True)
+
+# Call id of the conversation the current thread is serving, added to every record
+call_id_var: contextvars.ContextVar = contextvars.ContextVar("call_id", default=None)
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "call_id", "suppressed"}
+
+
+def bind_call_id(call_id: Optional[str]) -> contextvars.Token:
+    """Tag records logged from this thread with call_id until the token is reset"""
+    return call_id_var.set(call_id)
+
+
+class CallContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "call_id", None) is None:
+            record.call_id = call_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site for records at DEBUG and below; the next record let through
+    carries the number suppressed since the previous one"""
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(key, [float(self.burst), now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, call id, message and any `extra` fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "call_id": getattr(record, "call_id", None),
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} similar suppressed)"
+        return text
+
+
+class LazyFileHandler(logging.FileHandler):
+    """Opens (and creates the directory of) its file when the first record is written"""
+    def __init__(self, filename: Path, encoding: Optional[str] = None):
+        super().__init__(filename, encoding=encoding, delay=True)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped and counted when the queue is full"""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep args and exc_info out of the queue, but leave formatting to the listener
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def attach_queue_handler(logger: logging.Logger, *handlers: logging.Handler) -> logging.handlers.QueueListener:
+    """Route logger through a bounded queue to handlers run by a started background listener.
+
+    Only the queue handler (call id tagging, DEBUG rate limiting, enqueue) runs on the
+    logging thread, so slow consoles and disks never stall the audio path.
+    """
+    queue_handler = DroppingQueueHandler(queue.Queue(LOGGING_SETTINGS['queue_size']))
+    queue_handler.addFilter(CallContextFilter())
+    queue_handler.addFilter(RateLimitFilter(LOGGING_SETTINGS['debug_rate_per_sec'], LOGGING_SETTINGS['debug_burst']))
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(queue_handler.queue, *handlers)
+    listener.start()
+    return listener
+
 
 # Configure logging
 def setup_logger(name: str) -> logging.Logger:
-    """Setup and return a logger with the specified name"""
+    """Setup and return a logger whose records are written by a background listener thread"""
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(getattr(logging, LOGGING_SETTINGS['level']))
+    logger.propagate = False
 
     # Create handlers
     console_handler = logging.StreamHandler()
-    file_handler = logging.FileHandler(
-        LOGS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    file_handler = LazyFileHandler(
+        LOGS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.log", encoding="utf-8"
     )
 
     # Create formatters
-    log_format = logging.Formatter('%(asctime)s - %(message)s', datefmt='%H:%M:%S')
-    
+    text_format = TextFormatter('%(asctime)s - %(message)s', datefmt='%H:%M:%S')
+    json_format = JsonFormatter()
+
     # Set formatters
-    console_handler.setFormatter(log_format)
-    file_handler.setFormatter(log_format)
+    console_handler.setFormatter(json_format if LOGGING_SETTINGS['console_json'] else text_format)
+    file_handler.setFormatter(json_format if LOGGING_SETTINGS['file_json'] else text_format)
 
-    # Add handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    listener = attach_queue_handler(logger, console_handler, file_handler)
+    atexit.register(listener.stop)
 
     return logger
 
 # Create timing decorator
 def timing_decorator(logger: logging.Logger) -> Callable:
-    """Decorator to measure and log execution time of functions"""
+    """Decorator that records the execution time of a function in the function latency histogram.
+
+    Generator functions are timed until the generator is exhausted or closed.
+    """
     def decorator(func: Callable) -> Callable:
+        name = func.__qualname__
+
+        def record(start_time: float):
+            execution_time = time.perf_counter() - start_time
+            default_metrics.observe(FUNCTION_METRIC, execution_time, function=name)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Timing: {name} in {execution_time:.3f} seconds")
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs) -> Any:
+                start_time = time.perf_counter()
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    record(start_time)
+            return generator_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
-            execution_time = end_time - start_time
-            
-            # Only log timing for GPT response
-            if func.__name__ == 'process_speech_text':
-                logger.info(f"Timing: {func.__name__} in {execution_time:.2f} seconds")
-            
-            return result
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(start_time)
         return wrapper
     return decorator
 
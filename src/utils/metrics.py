@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Tuple
+from .config import METRICS_SETTINGS
+
+STAGE_METRIC = "voice_stage_seconds"
+FUNCTION_METRIC = "voice_function_seconds"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram; observe() is one bisect and three additions under a lock"""
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[list, float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+
+class MetricsRegistry:
+    """Histograms, counters and gauges keyed by metric name and labels, rendered in Prometheus text format"""
+    def __init__(self, buckets: Optional[Iterable[float]] = None):
+        self.buckets = list(buckets or METRICS_SETTINGS['buckets'])
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets: Optional[Iterable[float]] = None, **labels: str) -> Histogram:
+        """The histogram of name and labels; buckets apply when it is first created"""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets or self.buckets))
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        self.histogram(name, **labels).observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def summary(self, name: str) -> Dict[str, Dict[str, float]]:
+        """Count and mean of each labelled histogram of a metric"""
+        with self._lock:
+            histograms = [(labels, h) for (metric, labels), h in self._histograms.items() if metric == name]
+        result = {}
+        for labels, histogram in sorted(histograms, key=lambda item: item[0]):
+            _, total, count = histogram.snapshot()
+            key = ",".join(str(value) for _, value in labels)
+            result[key] = {"count": count, "mean": total / count if count else 0.0}
+        return result
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            labels = dict(labels)
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels, le=f'{bound:g}')} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in values:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{name}{_labels(dict(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+default_metrics = MetricsRegistry()
+
+# Set once the worker is warmed up and accepting calls; GET /ready reports it
+ready = threading.Event()
+
+
+class TurnTrace:
+    """Span timings of one caller turn, measured with the monotonic clock.
+
+    start() is called on the first speech audio of a turn; mark(stage) records the time
+    from there to the first occurrence of stage in the turn, and observe() / span() record
+    stage durations that do not depend on the turn start. finish() records the whole turn.
+    """
+    def __init__(self, registry: MetricsRegistry = default_metrics):
+        self.registry = registry
+        self.started: Optional[float] = None
+        self.marks: Dict[str, float] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.started is not None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, stage: str):
+        if self.started is None or stage in self.marks:
+            return
+        now = time.perf_counter()
+        self.marks[stage] = now
+        self.registry.observe(STAGE_METRIC, now - self.started, stage=stage)
+
+    def since(self, stage: str) -> Optional[float]:
+        marked = self.marks.get(stage)
+        return None if marked is None else time.perf_counter() - marked
+
+    def observe(self, stage: str, seconds: float):
+        self.registry.observe(STAGE_METRIC, seconds, stage=stage)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def finish(self):
+        if self.started is not None:
+            self.observe("turn", time.perf_counter() - self.started)
+        self.started = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = default_metrics
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ready":
+            body = b"ready\n" if ready.is_set() else b"starting\n"
+            self.send_response(200 if ready.is_set() else 503)
+        elif path == "/metrics":
+            body = self.registry.render().encode("utf-8")
+            self.send_response(200)
+        else:
+            self.send_error(404)
+            return
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(registry: MetricsRegistry = default_metrics,
+                         host: Optional[str] = None, port: Optional[int] = None) -> ThreadingHTTPServer:
+    """Serve GET /metrics from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host or METRICS_SETTINGS['host'], port or METRICS_SETTINGS['port']), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
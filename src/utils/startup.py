@@ -0,0 +1,149 @@
+import argparse
+import importlib
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Import and warm-up timing for the startup report. Kept free of project imports so the
+# timer can be installed before anything else is loaded.
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, timer: "ImportTimer"):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.timer._enter(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer._exit(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Measures how long each module takes to import, with and without its own imports"""
+    def __init__(self):
+        self.cumulative: Dict[str, float] = {}
+        self.self_time: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.finding = False
+
+    def _stack(self) -> List[Tuple[str, float, float]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, name: str):
+        self._stack().append((name, time.perf_counter(), 0.0))
+
+    def _exit(self, name: str):
+        stack = self._stack()
+        _, start, children = stack.pop()
+        elapsed = time.perf_counter() - start
+        self.cumulative[name] = elapsed
+        self.self_time[name] = elapsed - children
+        if stack:
+            parent, parent_start, parent_children = stack[-1]
+            stack[-1] = (parent, parent_start, parent_children + elapsed)
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def top(self, n: int = 20, by_self: bool = True) -> List[Tuple[str, float, float]]:
+        times = self.self_time if by_self else self.cumulative
+        names = sorted(times, key=times.get, reverse=True)[:n]
+        return [(name, self.self_time[name], self.cumulative[name]) for name in names]
+
+    def by_package(self) -> Dict[str, float]:
+        """Self time summed per top-level package"""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.self_time.items():
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0.0) + seconds
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+class StartupReport:
+    """Named phase durations of bringing a worker up (imports, model loading, connections)"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def format(self, imports: Optional[ImportTimer] = None, top: int = 15) -> str:
+        lines = [f"Startup: {self.total():.3f}s"]
+        for name, seconds in self.phases.items():
+            lines.append(f"  {name:<28} {seconds:8.3f}s")
+        if imports is not None and imports.cumulative:
+            lines.append("Imports by package (self time):")
+            for package, seconds in list(imports.by_package().items())[:top]:
+                lines.append(f"  {package:<28} {seconds:8.3f}s")
+            lines.append("Slowest modules (self / cumulative):")
+            for name, self_seconds, cumulative in imports.top(top):
+                lines.append(f"  {name:<40} {self_seconds:8.3f}s {cumulative:8.3f}s")
+        return "\n".join(lines)
+
+
+startup_report = StartupReport()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report where startup time goes, by module and warm-up phase")
+    parser.add_argument("--module", default="src.server", help="Module to import")
+    parser.add_argument("--warm", action="store_true", help="Also construct and warm up VoiceAssistant")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The report the project modules record into, not this __main__ copy of it
+    from .startup import ImportTimer, startup_report
+
+    timer = ImportTimer()
+    timer.install()
+    with startup_report.phase("import " + args.module):
+        importlib.import_module(args.module)
+    if args.warm:
+        from ..main import VoiceAssistant
+        VoiceAssistant(prewarm=True)
+    timer.uninstall()
+    print(startup_report.format(timer, args.top))
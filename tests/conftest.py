@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the pipeline as the `src` package, the way `python -m src.server` runs it
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
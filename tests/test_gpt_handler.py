@@ -0,0 +1,52 @@
+import threading
+import pytest
+
+pytest.importorskip("environs")
+pytest.importorskip("httpx")
+
+from src.api.gpt_handler import GPTHandler, NO_CONTEXT
+
+
+@pytest.fixture
+def handler():
+    handler = GPTHandler()
+    yield handler
+    handler.close()
+
+
+def test_iter_sentences_cuts_at_sentence_boundaries(handler):
+    tokens = ["Привет", ". Как", " дела?", " Всё", " хорошо! Пока"]
+    assert list(handler.iter_sentences(tokens)) == ["Привет.", "Как дела?", "Всё хорошо!", "Пока"]
+
+
+def test_iter_sentences_skips_empty_tokens_and_blank_sentences(handler):
+    tokens = ["", "Да.", "   ", "  Нет.", ""]
+    assert list(handler.iter_sentences(tokens)) == ["Да.", "Нет."]
+
+
+def test_iter_sentences_recognizes_split_sentinel(handler):
+    assert list(handler.iter_sentences(["  NO_", "CON", "TEXT"])) == [NO_CONTEXT]
+
+
+def test_iter_sentences_stops_after_sentinel(handler):
+    assert list(handler.iter_sentences([NO_CONTEXT, " something else."])) == [NO_CONTEXT]
+
+
+def test_iter_sentences_sentinel_prefix_is_ordinary_text(handler):
+    assert list(handler.iter_sentences(["NO", " way. Ok"])) == ["NO way.", "Ok"]
+
+
+def test_iter_sentences_stops_on_cancel(handler):
+    cancel = threading.Event()
+
+    def tokens():
+        yield "Первое. "
+        cancel.set()
+        yield "Второе. "
+
+    assert list(handler.iter_sentences(tokens(), cancel)) == ["Первое."]
+
+
+def test_split_text_into_chunks_keeps_sentences_whole(handler):
+    text = "Раз два. Три четыре. Пять."
+    assert handler.split_text_into_chunks(text, max_chars=20) == ["Раз два.", "Три четыре. Пять."]
@@ -0,0 +1,150 @@
+import zlib
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("environs")
+
+from src.rag.index_manager import IndexManager
+from src.rag.local_loader_v1 import QADocument
+from src.rag.metadata_store import MetadataStore, write_metadata_store
+from src.utils.config import RAG_INDEX_SETTINGS
+
+DIM = 16
+QUESTIONS = ["Как купить билет?", "Где посмотреть расписание?", "Сколько стоит багаж?"]
+
+
+def vector_of(text: str) -> np.ndarray:
+    vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def encode(texts):
+    return np.stack([vector_of(text) for text in texts])
+
+
+def qa(key: str, question: str, answer: str = "Ответ.") -> QADocument:
+    return QADocument(id=key, question=question, answer=answer, lang="ru", source="faq")
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    index = faiss.IndexFlatIP(DIM)
+    index.add(encode(QUESTIONS))
+    faiss.write_index(index, str(docs_dir / RAG_INDEX_SETTINGS['index_file']))
+    write_metadata_store(
+        docs_dir / RAG_INDEX_SETTINGS['metadata_file'],
+        [qa(f"q{i}", question) for i, question in enumerate(QUESTIONS)],
+    )
+    return docs_dir
+
+
+def open_manager(docs_dir) -> IndexManager:
+    return IndexManager(
+        docs_dir, encode,
+        lambda path: faiss.read_index(str(path)),
+        lambda path: MetadataStore(path / RAG_INDEX_SETTINGS['metadata_file']),
+    )
+
+
+@pytest.fixture
+def manager(docs_dir):
+    return open_manager(docs_dir)
+
+
+def nearest(manager: IndexManager, text: str, k: int = 1):
+    with manager.acquire() as snapshot:
+        _, indices = snapshot.search(encode([text]), k)
+    return [int(i) for i in indices[0] if i >= 0]
+
+
+def test_upsert_replaces_a_record_in_place(manager):
+    assert manager.upsert(qa("q1", "Где найти расписание поездов?")) == 1
+    with manager.acquire() as snapshot:
+        assert snapshot.row_for("q1") == 1
+        assert snapshot.record(1).question == "Где найти расписание поездов?"
+        assert 1 in snapshot.tombstones
+        lexical = snapshot.lexical
+        if lexical is not None:
+            assert lexical.lookup(lexical.key(QUESTIONS[1])) is None
+            assert lexical.lookup(lexical.key("Где найти расписание поездов")) == 1
+    assert nearest(manager, "Где найти расписание поездов?") == [1]
+
+
+def test_upsert_of_a_new_id_appends_a_row(manager):
+    assert manager.upsert(qa("q9", "Можно ли провезти велосипед?")) == 3
+    with manager.acquire() as snapshot:
+        assert snapshot.row_for("q9") == 3
+        assert snapshot.next_row == 4
+    assert nearest(manager, "Можно ли провезти велосипед?") == [3]
+
+
+def test_delete_hides_the_record(manager):
+    assert manager.delete("q0") == 0
+    with manager.acquire() as snapshot:
+        assert snapshot.row_for("q0") is None
+    assert 0 not in nearest(manager, QUESTIONS[0], k=3)
+    with pytest.raises(KeyError):
+        manager.delete("q0")
+    with pytest.raises(KeyError):
+        manager.delete("missing")
+
+
+def test_reinserting_a_deleted_id_gets_a_new_row(manager):
+    manager.delete("q0")
+    assert manager.upsert(qa("q0", QUESTIONS[0])) == 3
+    assert nearest(manager, QUESTIONS[0]) == [3]
+
+
+def test_other_processes_replay_the_log(docs_dir, manager):
+    other = open_manager(docs_dir)
+    manager.upsert(qa("q9", "Можно ли провезти велосипед?"))
+    manager.delete("q2")
+    other.refresh()
+    for replica in (other, open_manager(docs_dir)):
+        with replica.acquire() as snapshot:
+            assert snapshot.row_for("q9") == 3
+            assert snapshot.row_for("q2") is None
+            assert snapshot.row_for("q1") == 1
+
+
+def test_snapshot_in_use_survives_a_swap(manager):
+    with manager.acquire() as old:
+        manager.upsert(qa("q9", "Можно ли провезти велосипед?"))
+        assert old.row_for("q9") is None
+        _, indices = old.search(encode([QUESTIONS[2]]), 1)
+        assert int(indices[0][0]) == 2
+    with manager.acquire() as snapshot:
+        assert snapshot.row_for("q9") == 3
+
+
+def test_compact_folds_the_log_into_a_new_generation(docs_dir, manager):
+    manager.delete("q0")
+    manager.upsert(qa("q1", "Где найти расписание поездов?"))
+    manager.upsert(qa("q9", "Можно ли провезти велосипед?"))
+
+    with manager.acquire() as old:
+        assert manager.compact() == "gen-000001"
+        # The old generation stays open until its last search ends
+        assert old.base.index is not None
+    assert old.base.index is None
+
+    assert (docs_dir / RAG_INDEX_SETTINGS['current_file']).read_text(encoding="utf-8").strip() == "gen-000001"
+    with manager.acquire() as snapshot:
+        assert snapshot.base.name == "gen-000001"
+        assert snapshot.base.size == 3
+        assert not snapshot.records and not snapshot.tombstones
+        assert snapshot.row_for("q0") is None
+        rows = {key: snapshot.row_for(key) for key in ("q1", "q2", "q9")}
+        assert sorted(rows.values()) == [0, 1, 2]
+        assert snapshot.record(rows["q1"]).question == "Где найти расписание поездов?"
+    assert nearest(manager, "Можно ли провезти велосипед?") == [rows["q9"]]
+
+    # Updates after a compaction go to the new generation's log, and names keep growing
+    assert manager.upsert(qa("q10", "Есть ли в поезде Wi-Fi?")) == 3
+    assert manager.compact() == "gen-000002"
+    with open_manager(docs_dir).acquire() as snapshot:
+        assert snapshot.base.size == 4
+        assert snapshot.record(snapshot.row_for("q10")).question == "Есть ли в поезде Wi-Fi?"
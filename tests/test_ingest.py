@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("environs")
+
+from src.audio.ingest import (
+    CODEC_LINEAR16, HELLO, HELLO_MAGIC, FrameAssembler, StreamFormat, negotiate, pack_hello,
+)
+
+
+def test_assembler_cuts_fixed_size_frames():
+    assembler = FrameAssembler(4)
+    assert assembler.push(b"abcdefghij") == [b"abcd", b"efgh"]
+    assert assembler.flush() == b"ij"
+    assert assembler.flush() == b""
+
+
+def test_assembler_joins_small_payloads():
+    assembler = FrameAssembler(4)
+    assert assembler.push(b"ab") == []
+    assert assembler.push(b"c") == []
+    assert assembler.push(b"defg") == [b"abcd"]
+    assert assembler.push(b"h") == [b"efgh"]
+    assert assembler.flush() == b""
+
+
+def test_assembler_preserves_the_stream():
+    payloads = [bytes(range(i, i + n)) for i, n in [(0, 7), (7, 1), (8, 30), (38, 0), (38, 5)]]
+    assembler = FrameAssembler(6)
+    frames = [frame for payload in payloads for frame in assembler.push(payload)]
+    assert all(len(frame) == 6 for frame in frames)
+    assert b"".join(frames) + assembler.flush() == b"".join(payloads)
+
+
+def test_frame_bytes_follow_the_format():
+    assert StreamFormat(CODEC_LINEAR16, 16000, 1).frame_bytes(100) == 3200
+    assert StreamFormat(CODEC_LINEAR16, 8000, 1).frame_bytes(20) == 320
+
+
+def test_negotiate_falls_back_to_defaults():
+    default = StreamFormat()
+    accepted = negotiate(99, 44100, 2)
+    assert (accepted.codec, accepted.sample_rate, accepted.channels) == (
+        default.codec, default.sample_rate, default.channels
+    )
+    assert negotiate(CODEC_LINEAR16, 16000, 1).sample_rate == 16000
+
+
+def test_hello_round_trip():
+    hello = pack_hello(StreamFormat(CODEC_LINEAR16, 16000, 1))
+    assert len(hello) == HELLO.size
+    assert HELLO.unpack(hello) == (HELLO_MAGIC, CODEC_LINEAR16, 16000, 1)
@@ -0,0 +1,84 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("environs")
+
+from src.rag.lexical import LexicalIndex, trigrams
+
+QUESTIONS = [
+    "Как купить билет на поезд?",
+    "Где посмотреть расписание автобусов?",
+    "Можно ли вернуть билет?",
+    "Сколько стоит багаж?",
+    "Ещё один вопрос про парковку",
+]
+
+
+@pytest.fixture
+def index():
+    return LexicalIndex(QUESTIONS)
+
+
+def test_trigrams_pad_each_word():
+    assert trigrams("да да") == {" да": 2, "да ": 2}
+
+
+def test_key_drops_fillers_punctuation_and_yo(index):
+    assert index.key("Скажите, пожалуйста: ЕЩЁ один вопрос про парковку!") == "еще один вопрос про парковку"
+
+
+def test_exact_lookup(index):
+    assert index.lookup(index.key("Ну, как купить билет на поезд")) == 0
+    assert index.lookup(index.key("Как купить билет на самолет")) is None
+
+
+def test_close_question_ranks_first(index):
+    bm25, confidence = index.scores(index.key("как купить билеты на поезда"))
+    assert index.top(bm25, 3)[0] == 0
+    assert 0.5 < confidence[0] < 1.0
+    assert confidence[0] == confidence.max()
+
+
+def test_same_question_has_full_confidence(index):
+    _, confidence = index.scores(index.key(QUESTIONS[3]))
+    assert confidence[3] == pytest.approx(1.0, rel=1e-5)
+
+
+def test_top_leaves_out_unrelated_records(index):
+    bm25, _ = index.scores(index.key("щщщ"))
+    assert index.top(bm25, 10) == []
+
+
+def test_empty_texts_keep_their_rows():
+    index = LexicalIndex(["", "билет"])
+    assert index.size == 2
+    assert index.lookup("") is None
+    assert index.lookup("билет") == 1
+
+
+def test_overlay_replaces_removes_and_adds_rows(index):
+    overlay = index.updated({0: "Как оплатить парковку?", 1: "", 5: "Сколько стоит багаж сверх нормы?"}, 6)
+    assert overlay.size == 6
+    assert overlay.lookup(index.key(QUESTIONS[0])) is None
+    assert overlay.lookup(index.key("Как оплатить парковку")) == 0
+    assert overlay.lookup(index.key(QUESTIONS[1])) is None
+    assert overlay.lookup(index.key(QUESTIONS[2])) == 2
+    assert overlay.lookup(index.key("Сколько стоит багаж сверх нормы")) == 5
+
+    bm25, confidence = overlay.scores(index.key(QUESTIONS[1]))
+    assert bm25[1] == 0 and confidence[1] == 0
+
+    bm25, confidence = overlay.scores(index.key("как оплатить парковку"))
+    assert overlay.top(bm25, 1) == [0]
+    assert confidence[0] == pytest.approx(1.0, rel=1e-5)
+
+    _, confidence = overlay.scores(index.key("сколько стоит багаж сверх нормы"))
+    assert int(np.argmax(confidence)) == 5
+    assert confidence[5] == pytest.approx(1.0, rel=1e-5)
+
+
+def test_overlay_leaves_the_base_untouched(index):
+    index.updated({0: "", 2: "Другой вопрос"}, index.size)
+    assert index.lookup(index.key(QUESTIONS[0])) == 0
+    assert index.lookup(index.key(QUESTIONS[2])) == 2
+    assert index.scores(index.key(QUESTIONS[0]))[0].shape == (len(QUESTIONS),)
@@ -0,0 +1,80 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("environs")
+
+from src.rag.local_loader_v1 import QADocument
+from src.rag.metadata_store import (
+    MetadataStore, record_field, record_from_json, record_key, record_text, record_to_json, write_metadata_store,
+)
+
+RECORDS = [
+    {"id": "a", "question": "Как купить билет?", "answer": "На сайте."},
+    "просто текст",
+    {"id": 7, "text": "Ёлка — «ёжик»", "answer": ""},
+    QADocument(id="q1", question="Где багаж?", answer="В камере хранения.", lang="ru", source="faq"),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "metadata.bin"
+    assert write_metadata_store(path, RECORDS) == len(RECORDS)
+    store = MetadataStore(path)
+    yield store
+    store.close()
+
+
+def test_reads_every_record_at_its_offset(store):
+    assert len(store) == len(RECORDS)
+    for idx in (3, 0, 2, 1):
+        assert store[idx] == RECORDS[idx]
+
+
+def test_negative_and_numpy_indices(store):
+    assert store[-1] == RECORDS[-1]
+    assert store[np.int64(1)] == RECORDS[1]
+
+
+def test_out_of_range_raises_index_error(store):
+    with pytest.raises(IndexError):
+        store[len(RECORDS)]
+    with pytest.raises(IndexError):
+        store[-len(RECORDS) - 1]
+
+
+def test_iterates_in_order(store):
+    assert list(store) == RECORDS
+
+
+def test_qa_documents_decode_to_the_dataclass(store):
+    record = store[3]
+    assert isinstance(record, QADocument)
+    assert record_from_json(record_to_json(record)) == record
+
+
+def test_empty_store(tmp_path):
+    path = tmp_path / "empty.bin"
+    write_metadata_store(path, [])
+    store = MetadataStore(path)
+    assert len(store) == 0
+    assert list(store) == []
+    store.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "metadata.bin"
+    path.write_bytes(b"not a store at all")
+    with pytest.raises(ValueError):
+        MetadataStore(path)
+
+
+def test_record_accessors():
+    assert record_text(RECORDS[0]) == "Как купить билет?"
+    assert record_text(RECORDS[1]) == "просто текст"
+    assert record_text(RECORDS[2]) == "Ёлка — «ёжик»"
+    assert record_key(RECORDS[2]) == "7"
+    assert record_key(RECORDS[1]) is None
+    assert record_key(RECORDS[3]) == "q1"
+    assert record_field(RECORDS[3], "answer") == "В камере хранения."
+    assert record_field(RECORDS[0], "lang") is None
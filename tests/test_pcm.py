@@ -0,0 +1,102 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("environs")
+
+from src.audio.pcm import PcmEncoder, encode_g711
+
+
+def _ulaw_reference(sample: int) -> int:
+    """linear2ulaw of the ITU-T G.711 reference implementation (g711.c)"""
+    seg_end = [0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]
+    pcm = sample >> 2
+    if pcm < 0:
+        pcm, mask = -pcm, 0x7F
+    else:
+        mask = 0xFF
+    pcm = min(pcm, 8159) + 0x21
+    seg = next((i for i, end in enumerate(seg_end) if pcm <= end), 8)
+    if seg >= 8:
+        return 0x7F ^ mask
+    return ((seg << 4) | ((pcm >> (seg + 1)) & 0x0F)) ^ mask
+
+
+def _alaw_reference(sample: int) -> int:
+    """linear2alaw of the ITU-T G.711 reference implementation (g711.c)"""
+    seg_end = [0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]
+    pcm = sample >> 3
+    if pcm >= 0:
+        mask = 0xD5
+    else:
+        mask, pcm = 0x55, -pcm - 1
+    seg = next((i for i, end in enumerate(seg_end) if pcm <= end), 8)
+    if seg >= 8:
+        return 0x7F ^ mask
+    value = seg << 4
+    value |= (pcm >> 1 if seg < 2 else pcm >> seg) & 0x0F
+    return value ^ mask
+
+
+@pytest.mark.parametrize("codec, reference", [("mulaw", _ulaw_reference), ("alaw", _alaw_reference)])
+def test_g711_matches_reference_for_every_sample(codec, reference):
+    samples = np.arange(-32768, 32768, dtype=np.int16)
+    expected = bytes(reference(int(sample)) for sample in samples)
+    assert encode_g711(samples, codec) == expected
+
+
+@pytest.mark.parametrize("codec, silence, top, bottom", [("mulaw", 0xFF, 0x80, 0x00), ("alaw", 0xD5, 0xAA, 0x2A)])
+def test_g711_known_codes(codec, silence, top, bottom):
+    samples = np.array([0, 32767, -32768], dtype=np.int16)
+    assert encode_g711(samples, codec) == bytes([silence, top, bottom])
+
+
+def _tone(rate: int, seconds: float = 0.25) -> bytes:
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * 440 * t) * 12000).astype("<i2").tobytes()
+
+
+def _encode_in_chunks(encoder: PcmEncoder, data: bytes, sizes) -> bytes:
+    out, pos, i = [], 0, 0
+    while pos < len(data):
+        size = sizes[i % len(sizes)]
+        out.append(encoder.encode(data[pos:pos + size]))
+        pos += size
+        i += 1
+    return b"".join(out)
+
+
+def test_passthrough_keeps_bytes():
+    data = _tone(8000)
+    assert PcmEncoder(8000, 8000).encode(data) == data
+
+
+def test_odd_chunks_carry_the_split_sample():
+    data = _tone(8000)
+    assert _encode_in_chunks(PcmEncoder(8000, 8000), data, [3, 7, 1, 250]) == data
+
+
+@pytest.mark.parametrize("from_rate, to_rate", [(16000, 8000), (48000, 8000), (8000, 16000), (22050, 8000), (8000, 22050)])
+def test_resampling_chunk_by_chunk_matches_one_piece(from_rate, to_rate):
+    data = _tone(from_rate)
+    whole = PcmEncoder(from_rate, to_rate).encode(data)
+    chunked = _encode_in_chunks(PcmEncoder(from_rate, to_rate), data, [321, 2, 1000, 77])
+    assert chunked == whole
+
+
+def test_resampling_changes_duration():
+    data = _tone(16000)
+    out = PcmEncoder(16000, 8000).encode(data)
+    assert abs(len(out) // 2 - len(data) // 4) <= 1
+
+
+def test_downsampled_g711_has_one_byte_per_sample():
+    data = _tone(16000)
+    linear = PcmEncoder(16000, 8000).encode(data)
+    mulaw = PcmEncoder(16000, 8000, "mulaw").encode(data)
+    assert len(mulaw) == len(linear) // 2
+    assert mulaw == encode_g711(np.frombuffer(linear, dtype="<i2"), "mulaw")
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        PcmEncoder(8000, 8000, "opus")
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("environs")
+
+from src.session import CallSession
+from src.speculation import Speculator
+from src.utils.metrics import MetricsRegistry
+
+
+def counter(registry: MetricsRegistry, line_prefix: str) -> float:
+    for line in registry.render().splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.split()[-1])
+    return 0.0
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def speculator(registry):
+    speculator = Speculator(lambda text: f"ответ на {text}", registry=registry)
+    speculator.stable_ms = 0
+    yield speculator
+    speculator.executor.shutdown(wait=True)
+
+
+def speculate(speculator: Speculator, session: CallSession, text: str):
+    # The second identical partial is already stable with stable_ms = 0
+    speculator.on_partial(session, text)
+    speculator.on_partial(session, text)
+
+
+def test_hit_is_counted(speculator, registry):
+    session = CallSession(audio_recorder=None, play_audio=lambda audio: None)
+    speculate(speculator, session, "как купить билет")
+    assert speculator.resolve(session, "Как купить билет?") == "ответ на как купить билет"
+    assert counter(registry, "voice_speculation_started_total") == 1
+    assert counter(registry, 'voice_speculation_total{result="hit"}') == 1
+    assert counter(registry, 'voice_speculation_total{result="miss"}') == 0
+
+
+def test_miss_is_counted(speculator, registry):
+    session = CallSession(audio_recorder=None, play_audio=lambda audio: None)
+    speculate(speculator, session, "как купить билет")
+    assert speculator.resolve(session, "сколько стоит багаж") is None
+    assert counter(registry, "voice_speculation_started_total") == 1
+    assert counter(registry, 'voice_speculation_total{result="miss"}') == 1
+    assert counter(registry, 'voice_speculation_total{result="hit"}') == 0